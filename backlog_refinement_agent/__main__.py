@@ -0,0 +1,4 @@
+# backlog_refinement_agent/__main__.py
+from .cli import main
+
+main()
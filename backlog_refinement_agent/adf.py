@@ -0,0 +1,184 @@
+# backlog_refinement_agent/adf.py
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Markers pushed on the work stack alongside ADF nodes
+_FLUSH = "flush"
+_ITEM_END = "item_end"
+_CELL_END = "cell_end"
+_ROW_END = "row_end"
+_DONE = object()
+
+# List start used for bullet lists in place of an ordered list's first number
+_BULLET = -1
+
+# Deeper lists keep this indentation so nesting cannot blow up line widths
+_MAX_INDENT = 16
+
+# Inline nodes rendered from one of their attributes
+_INLINE_ATTRS = {
+    "mention": "text",
+    "emoji": "text",
+    "inlineCard": "url",
+    "status": "text",
+    "date": "timestamp",
+}
+
+
+def adf_to_text(document: Any, max_chars: Optional[int] = None) -> str:
+    """
+    Converts an Atlassian Document Format tree to plain text in one pass.
+
+    Walks the tree with an explicit stack, so deeply nested documents cannot
+    hit the recursion limit, and collects output in lists that are joined
+    once. Structure is kept in a light markdown form:
+
+      - headings as ``#`` lines and code blocks as fenced blocks
+      - bullet and ordered lists as ``-`` / ``1.`` items, indented per level
+      - table rows as ``cell | cell`` lines
+      - hard breaks as line breaks
+
+    :param document: ADF document (the ``description`` field of an issue)
+    :param max_chars: Stop once the output reaches this length; 0 or None means no cap
+    """
+    if isinstance(document, str):
+        return document[:max_chars] if max_chars else document
+    if not isinstance(document, dict):
+        return ""
+
+    lines: List[str] = []
+    inline: List[str] = []
+    row_cells: List[str] = []
+    length = 0
+    # Prefix for the next emitted line, set by list items for their marker
+    pending_prefix: Optional[str] = None
+
+    def emit(line: str) -> None:
+        nonlocal length
+        line = line.rstrip()
+        if line.strip():
+            lines.append(line)
+            length += len(line) + 1
+
+    def flush(indent: Optional[str]) -> None:
+        nonlocal pending_prefix
+        if indent is None:
+            # Inside a table cell: blocks run together on one line
+            inline.append(" ")
+            return
+        text = "".join(inline)
+        inline.clear()
+        if not text.strip():
+            return
+        prefix = pending_prefix if pending_prefix is not None else indent
+        pending_prefix = None
+        emit(prefix + text.strip())
+
+    # One frame per open container: (children, indent, exit marker, list start).
+    # Iterating children in place keeps allocations per container, not per node.
+    # An indent of None means "inline only" (inside a table cell).
+    stack: List[Tuple[Iterator[Any], Optional[str], Optional[str], Optional[int]]] = [
+        (iter(document.get("content") or []), "", None, None)
+    ]
+
+    while stack:
+        if max_chars and length >= max_chars:
+            break
+
+        children_iter, indent, exit_marker, list_start = stack[-1]
+        node = next(children_iter, _DONE)
+
+        if node is _DONE:
+            stack.pop()
+            if exit_marker is _FLUSH:
+                flush(indent)
+            elif exit_marker is _ITEM_END:
+                flush(indent)
+                # An empty item must not lend its marker to the next line
+                pending_prefix = None
+            elif exit_marker is _CELL_END:
+                row_cells.append("".join(inline).strip())
+                inline.clear()
+            elif exit_marker is _ROW_END:
+                if any(row_cells):
+                    emit((indent or "") + " | ".join(row_cells))
+                row_cells.clear()
+            continue
+
+        if list_start is not None:
+            # Children of a list frame are (offset, listItem) pairs
+            offset, node = node
+            marker = "- " if list_start == _BULLET else f"{list_start + offset}. "
+            item_children = (node.get("content") or []) if isinstance(node, dict) else []
+            if indent is None:
+                inline.append(" ")
+                child_indent = None
+            else:
+                pending_prefix = indent + marker
+                child_indent = indent + " " * len(marker) if len(indent) < _MAX_INDENT else indent
+            stack.append((iter(item_children), child_indent, _ITEM_END, None))
+            continue
+
+        if not isinstance(node, dict):
+            continue
+
+        node_type = node.get("type")
+        children: List[Dict[str, Any]] = node.get("content") or []
+
+        if node_type == "text":
+            inline.append(node.get("text", ""))
+        elif node_type == "paragraph":
+            if len(children) == 1 and children[0].get("type") == "text" and indent is not None:
+                # Fast path for the common single-run paragraph
+                inline.append(children[0].get("text", ""))
+                flush(indent)
+            else:
+                stack.append((iter(children), indent, _FLUSH, None))
+        elif node_type == "hardBreak":
+            flush(indent)
+        elif node_type in _INLINE_ATTRS:
+            attrs = node.get("attrs") or {}
+            inline.append(str(attrs.get(_INLINE_ATTRS[node_type]) or attrs.get("shortName") or ""))
+        elif node_type == "heading":
+            if indent is not None:
+                flush(indent)
+                level = (node.get("attrs") or {}).get("level", 1)
+                inline.append("#" * int(level) + " ")
+            stack.append((iter(children), indent, _FLUSH, None))
+        elif node_type == "codeBlock":
+            flush(indent)
+            code = "".join(child.get("text", "") for child in children if isinstance(child, dict))
+            if indent is None:
+                inline.append(code.replace("\n", " "))
+                continue
+            language = (node.get("attrs") or {}).get("language") or ""
+            prefix = pending_prefix if pending_prefix is not None else indent
+            pending_prefix = None
+            emit(prefix + "```" + language)
+            for code_line in code.splitlines():
+                emit(indent + code_line)
+            emit(indent + "```")
+        elif node_type in ("bulletList", "orderedList"):
+            flush(indent)
+            start = int((node.get("attrs") or {}).get("order", 1)) if node_type == "orderedList" else _BULLET
+            stack.append((enumerate(children), indent, None, start))
+        elif node_type == "table":
+            flush(indent)
+            stack.append((iter(children), indent, None, None))
+        elif node_type == "tableRow":
+            stack.append((iter(children), indent, _ROW_END, None))
+        elif node_type in ("tableCell", "tableHeader"):
+            stack.append((iter(children), None, _CELL_END, None))
+        elif node_type == "rule":
+            flush(indent)
+            if indent is not None:
+                emit(indent + "---")
+        else:
+            # blockquote, panel, expand and unknown containers
+            stack.append((iter(children), indent, _FLUSH, None))
+
+    flush("")
+
+    text = "\n".join(lines)
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars].rstrip()
+    return text
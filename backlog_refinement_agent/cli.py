@@ -1,14 +1,30 @@
-from typing import List
-import pandas as pd
+import argparse
+import json
+import sys
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
 from .config import settings
-from .jira_client import fetch_issues_from_jira, post_comment_to_jira
-from .slack_client import post_summary_to_slack
-from .refinement import evaluate_story
-
-
-def _load_stories() -> pd.DataFrame:
+from .pipeline import refine_stories
+from .heuristics import prefilter_stats
+from .llm_client import cache_stats, usage
+from .metrics import metrics
+from .rendering import render_adf, render_cache_stats, render_text
+from .state import RefinementState
+from .story import Story
+
+# The Jira and Slack clients pull in requests; they are imported when a
+# run needs them so --dry-run on a local file never loads them
+if TYPE_CHECKING:
+    from .comment_writer import CommentWriter, CommentWriterStats
+    from .history import RefinementHistory
+    from .journal import RunJournal
+    from .scheduler import Scheduler
+    from .slack_summary import SlackSummaryStats
+
+
+def _load_stories(updated_since_minutes: Optional[int] = None) -> Iterable[Story]:
     """
-    Returns a pandas DataFrame with at least:
+    Returns an iterable of stories with at least:
       - id
       - summary
       - description
@@ -17,189 +33,503 @@ def _load_stories() -> pd.DataFrame:
       - present_fields
     """
     if settings.jira.use_jira:
+        from .jira_client import iter_issues_from_jira
+
         print("Fetching issues from Jira...")
-        df = fetch_issues_from_jira()
-        return df
-
-    # Generate present_fields if not present
-    if "present_fields" not in df.columns:
-        present_fields_col = []
-        for _, row in df.iterrows():
-            fields = [
-                col
-                for col in df.columns
-                if str(row[col]) not in ("", "nan", "NaN", None)
-            ]
-            present_fields_col.append(fields)
-        df["present_fields"] = present_fields_col
-
-    return df
-
-
-def main() -> None:
-    df = _load_stories()
-    df.fillna("", inplace=True)
-
-    slack_summary_blocks: List[str] = []
-    flagged_count = 0
-
-    for _, story in df.iterrows():
-        story_id = story.get("id") or story.get("key") or "<unknown>"
-        present_fields = story.get("present_fields", [])
-
-        issues, explanations, ac_suggestion = evaluate_story(story, present_fields)
-
-        # Explicit Missing Component logic based on Jira data
-        components_val = story.get("components", "")
-        has_components = bool(str(components_val).strip())
-
-        if not has_components:
-            # Components truly missing → ensure it's flagged
-            if "Missing Component" not in issues:
-                issues.append("Missing Component")
-                explanations.setdefault(
-                    "Missing Component",
-                    "No Jira component is set for this story. "
-                    "Please assign an appropriate component for better traceability.",
-                )
-        else:
-            # Components are present 
-            if "Missing Component" in issues:
-                issues = [i for i in issues if i != "Missing Component"]
-                explanations.pop("Missing Component", None)
+        # Stream page by page so refinement starts with the first page
+        return iter_issues_from_jira(updated_since_minutes=updated_since_minutes)
 
-        # Skip if nothing was flagged and no AC suggestion was generated
-        if not issues and not ac_suggestion:
+    from .sources import iter_stories_from_file
+
+    print(f"Loading stories from {settings.jira.local_file}...")
+    return iter_stories_from_file(settings.jira.local_file)
+
+
+def _skip_unchanged(
+    stories: Iterable[Story],
+    state: RefinementState,
+    skipped: List[str],
+) -> Iterator[Story]:
+    for story in stories:
+        if state.is_unchanged(story):
+            skipped.append(story.get("id"))
             continue
+        yield story
+
+
+def _record_when_posted(
+    state: Optional[RefinementState],
+    journal: Optional["RunJournal"],
+    story: Story,
+    findings: str,
+) -> Callable[[bool], None]:
+    def on_done(posted: bool) -> None:
+        if not posted:
+            return
+        if state is not None:
+            state.record(story, findings)
+        if journal is not None:
+            journal.record_posted(story)
+    return on_done
+
+
+def open_journal(path: str, resume: bool) -> Optional["RunJournal"]:
+    """
+    Opens the run journal at ``path``, replaying it with ``resume``. None
+    when journaling is disabled (empty path).
+    """
+    if not path:
+        return None
 
+    from .journal import RunJournal
 
-        flagged_count += 1
-
-        print("Explanations:", explanations)
-        if ac_suggestion:
-            print("Suggested AC:\n", ac_suggestion)
-
-        reporter_name = story.get("reporter", "")
-        account_id = story.get("account_id", "")
-
-
-        # Jira comment
-        comment_lines: List[str] = []
-
-        comment_lines.append("Backlog Refinement Summary")
-        header_line = f"- {story_id}"
-        if reporter_name:
-            header_line += f" (reported by {reporter_name})"
-        comment_lines.append(header_line)
-
-    
-        for issue in issues:
-            comment_lines.append(f"  - {issue}")
-
-            issue_lower = issue.lower()
-            exp = None
-
-            # Map issue to explanation keys
-            if issue_lower.startswith("summary"):
-                exp = explanations.get("summary")
-            elif issue_lower.startswith("acceptance"):
-                exp = explanations.get("description")
-            else:
-                exp = explanations.get(issue_lower) or explanations.get(issue)
-
-            # Render explanation (if present)
-            if exp:
-                if isinstance(exp, dict):
-                    for k, v in exp.items():
-                        comment_lines.append(f"      {k}: {v}")
-                else:
-                    for line in str(exp).splitlines():
-                        comment_lines.append(f"      {line}")
-            else:
-                comment_lines.append("      (no explanation available)")
-
-            # Add Suggested acceptance criteria
-            if issue_lower.startswith("acceptance") and ac_suggestion:
-                comment_lines.append("      Suggested Acceptance Criteria:")
-                for line in str(ac_suggestion).splitlines():
-                    line = line.strip()
-                    if not line:
-                        continue
-                    # Skip headings like "Suggested Acceptance Criteria"
-                    if line.lower().startswith("suggested acceptance criteria"):
-                        continue
-                    if line.startswith("-"):
-                        comment_lines.append(f"         {line}")
-                    else:
-                        comment_lines.append(f"         - {line}")
-
-            # Add blank line between issues
-            comment_lines.append("")
-
-
-            comment_lines.append("")  # blank line between issues
-
-        # Post to Jira
-        post_comment_to_jira(
-            issue_key=story_id,
-            comment_lines=comment_lines,
-            reporter_name=reporter_name,
-            account_id=account_id,
-        )
+    journal = RunJournal(
+        path,
+        resume=resume,
+        flush_records=settings.refinement.journal_flush_records,
+        flush_seconds=settings.refinement.journal_flush_seconds,
+    )
+    if resume:
+        print(f"Resuming: {journal.replayed} evaluated stories replayed from {path}")
+    return journal
 
-        #Slack Summary
-        slack_lines: List[str] = []
 
-        first_line = f"- {story_id}"
-        if reporter_name:
-            first_line += f" (reported by @{reporter_name})"
-        slack_lines.append(first_line)
+def open_history(path: str, name: str = "") -> Optional["RefinementHistory"]:
+    """
+    Opens the refinement history at ``path`` for a new run named ``name``.
+    None when history is disabled (empty path).
+    """
+    if not path:
+        return None
+
+    from .history import RefinementHistory
+
+    # Flushed as often as the journal, so results a resumed run replays
+    # (and doesn't record again) are already in the history
+    return RefinementHistory(
+        path,
+        name,
+        flush_records=settings.refinement.journal_flush_records,
+        flush_seconds=settings.refinement.journal_flush_seconds,
+    )
+
+
+def collect_run_metrics(comment_stats: Optional["CommentWriterStats"]) -> None:
+    """
+    Folds the per-module totals (comments, cache, LLM usage, pre-filter
+    and retries) into the run metrics.
+    """
+    if comment_stats is not None:
+        metrics.set("comments_created", comment_stats.created)
+        metrics.set("comments_updated", comment_stats.updated)
+        metrics.set("comments_failed", comment_stats.failed)
+
+    stats = cache_stats()
+    metrics.set("llm_cache_hits", stats["hits"])
+    metrics.set("llm_cache_misses", stats["misses"])
+
+    stats = render_cache_stats()
+    metrics.set("render_cache_hits", stats["hits"])
+    metrics.set("render_cache_misses", stats["misses"])
+
+    totals = usage.totals()
+    metrics.set("llm_calls", totals.calls)
+    metrics.set("llm_prompt_tokens", totals.prompt_tokens)
+    metrics.set("llm_completion_tokens", totals.completion_tokens)
+    metrics.set("llm_cost_usd", round(usage.cost_usd(totals), 6))
+    metrics.set("prefilter_decided", sum(prefilter_stats.decided.values()))
+
+    # Retries only exist if a transport was used; don't import one just to ask
+    transport = sys.modules.get(f"{__package__}.transport")
+    if transport is not None:
+        for name, retries in transport.retry_counts().items():
+            metrics.set(f"{name}_retries", retries)
+
+
+def write_run_report(announce: bool = True) -> None:
+    """
+    Writes the JSON report (RUN_REPORT_PATH) and Prometheus textfile
+    (PROMETHEUS_TEXTFILE).
+
+    :param announce: Print where the report went, e.g. not for the daemon's periodic writes
+    """
+    if settings.metrics.report_path:
+        metrics.write_json(settings.metrics.report_path)
+        if announce:
+            print(f"Run report written to {settings.metrics.report_path}")
+    if settings.metrics.prometheus_textfile:
+        metrics.write_prometheus(settings.metrics.prometheus_textfile)
+
+
+def incremental_stories(
+    load: Callable[[Optional[int]], Iterable[Story]],
+    state_file: str,
+    skipped: List[str],
+) -> Tuple[RefinementState, Iterable[Story]]:
+    """
+    Loads the incremental state and returns it with the stories that
+    changed since the last run.
 
-        for issue in issues:
-            slack_lines.append(f"  - {issue}")
+    :param load: Returns stories updated within the given minutes (None for all)
+    """
+    state = RefinementState.load(state_file)
+    updated_since = state.updated_since_minutes(settings.refinement.overlap_minutes)
+    if updated_since is not None:
+        print(f"Incremental mode: stories updated in the last {updated_since} minutes")
+    return state, _skip_unchanged(load(updated_since), state, skipped)
+
+
+def scheduled_stories(
+    stories: Iterable[Story],
+    state: Optional[RefinementState],
+    deadline_seconds: Optional[float] = None,
+    max_llm_calls: Optional[int] = None,
+    deadline_at: Optional[float] = None,
+) -> Tuple[Optional["Scheduler"], Iterable[Story]]:
+    """
+    Ranks the stories with a ``Scheduler`` when REFINEMENT_PRIORITIZE, a
+    deadline or an LLM call budget is set; otherwise returns them as they are.
 
-            issue_lower = issue.lower()
-            exp = None
+    :param deadline_seconds: Overrides REFINEMENT_DEADLINE_SECONDS
+    :param max_llm_calls: Overrides REFINEMENT_MAX_LLM_CALLS
+    :param deadline_at: Absolute ``time.time()`` deadline; overrides ``deadline_seconds``
+    """
+    refinement = settings.refinement
+    deadline_seconds = refinement.deadline_seconds if deadline_seconds is None else deadline_seconds
+    max_llm_calls = refinement.max_llm_calls if max_llm_calls is None else max_llm_calls
+    if not (refinement.prioritize or deadline_seconds or max_llm_calls or deadline_at is not None):
+        return None, stories
+
+    from .scheduler import Scheduler
+
+    scheduler = Scheduler(deadline_seconds, max_llm_calls, state, deadline_at=deadline_at)
+    return scheduler, scheduler.schedule(stories)
+
+
+def refine_and_post(
+    stories: Iterable[Story],
+    writer: Optional["CommentWriter"],
+    slack: Any,
+    state: Optional[RefinementState] = None,
+    journal: Optional["RunJournal"] = None,
+    scheduler: Optional["Scheduler"] = None,
+    history: Optional["RefinementHistory"] = None,
+) -> int:
+    """
+    Evaluates stories and hands every flagged one to the Jira comment
+    writer and the Slack summary. With incremental state, a comment whose
+    findings match the one last posted on the story is not posted again.
+
+    Stories whose LLM checks were skipped (budget reached) or failed are
+    neither commented on nor recorded in the state, so the next run
+    evaluates them again. Returns how many there were.
+
+    With a journal, each result and accepted comment is journaled, and
+    stories already in a resumed journal reuse their result instead of
+    being evaluated, and are not commented on twice.
+
+    :param writer: Comment writer; None prints the comments instead (dry run)
+    :param slack: Anything with ``add(refinement)``, e.g. ``SlackSummaryStream`` or ``DigestCounts``
+    :param state: Incremental state to record evaluated stories in
+    :param journal: Run journal to record progress in and resume from
+    :param scheduler: Scheduler the stories come from, told as stories are submitted and evaluated
+    :param history: Refinement history every evaluated story is recorded in
+    """
+    known = journal.result_for if journal is not None else None
+    on_submitted = scheduler.submitted if scheduler is not None else None
+    on_evaluated = scheduler.evaluated if scheduler is not None else None
+    not_evaluated = 0
+    for refinement in refine_stories(stories, known, on_submitted, on_evaluated):
+        story = refinement.story
+        metrics.incr("stories")
+
+        if not refinement.evaluated:
+            not_evaluated += 1
+            metrics.incr("not_evaluated")
+            continue
 
-            # Map issue to explanation key
-            if issue_lower.startswith("summary"):
-                exp = explanations.get("summary")
-            elif issue_lower.startswith("acceptance"):
-                exp = explanations.get("description")
-            else:
-                exp = explanations.get(issue_lower) or explanations.get(issue)
+        # Only real verdicts are journaled, so a resumed run retries the rest
+        resumed = False
+        if journal is not None:
+            result = (refinement.issues, refinement.explanations, refinement.ac_suggestion)
+            resumed = journal.record_evaluated(story, result)
+            if resumed:
+                metrics.incr("resumed")
 
-            if exp:
-                if isinstance(exp, dict):
-                    for k, v in exp.items():
-                        slack_lines.append(f"      {k}: {v}")
-                else:
-                    for line in str(exp).splitlines():
-                        slack_lines.append(f"      {line}")
+        # A replayed result was recorded by the run that produced it
+        if history is not None and not resumed:
+            history.add(refinement)
 
-                # AC suggestion note ONLY under Acceptance Criteria Analysis
-                if issue_lower.startswith("acceptance") and ac_suggestion:
-                    slack_lines.append(
-                        "      Acceptance criteria suggestion added in Jira ticket's comment."
-                    )
-            else:
-                slack_lines.append("      (no explanation available)")
+        # Skip if nothing was flagged and no AC suggestion was generated
+        if not refinement.flagged:
+            if state is not None:
+                state.record(story)
+            continue
 
+        metrics.incr("flagged")
 
-            slack_lines.append("")
+        print("Explanations:", refinement.explanations)
+        if refinement.ac_suggestion:
+            print("Suggested AC:\n", refinement.ac_suggestion)
 
+        findings = refinement.findings()
 
-        slack_summary_blocks.append("\n".join(slack_lines))
+        if writer is None:
+            print(render_text(findings))
+            continue
 
-    if not slack_summary_blocks:
-        post_summary_to_slack("No issues flagged in the backlog refinement run.")
+        if journal is not None and journal.was_posted(story):
+            metrics.incr("comments_resumed")
+            if state is not None:
+                state.record(story, findings.digest)
+        elif state is not None and state.findings_unchanged(story, findings.digest):
+            metrics.incr("comments_unchanged")
+            state.record(story, findings.digest)
+        else:
+            with metrics.timer("render_comment"):
+                payload = render_adf(findings)
+
+            # Queue for the Jira writers
+            writer.submit_payload(
+                story.id,
+                payload,
+                on_done=_record_when_posted(state, journal, story, findings.digest),
+            )
+
+        # Streamed to Slack in size-bounded chunks
+        if slack is not None:
+            slack.add(refinement)
+
+    if not_evaluated:
+        print(f"{not_evaluated} stories could not be evaluated by the LLM; they will be retried next run")
+    return not_evaluated
+
+
+def print_comment_stats(comment_stats: "CommentWriterStats") -> None:
+    print(
+        f"Jira comments: {comment_stats.created} created, {comment_stats.updated} updated, "
+        f"{comment_stats.failed} failed in {comment_stats.elapsed_seconds:.1f}s "
+        f"({comment_stats.per_second:.1f}/s)"
+    )
+
+
+def print_slack_stats(slack_stats: "SlackSummaryStats") -> None:
+    print(
+        f"Slack summary: {slack_stats.flagged} flagged stories, {slack_stats.streamed} listed, "
+        f"{slack_stats.messages} messages sent, {slack_stats.failed} failed"
+    )
+
+
+def print_run_stats() -> None:
+    stats = cache_stats()
+    print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+    print(usage.summary_line())
+    print(
+        f"Rule-based pre-filter: {sum(prefilter_stats.decided.values())} of "
+        f"{prefilter_stats.total} checks decided without the LLM "
+        f"({prefilter_stats.avoided_fraction:.0%})"
+    )
+
+
+def _parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="backlog_refinement_agent",
+        description="Reviews backlog stories and posts refinement feedback to Jira and Slack.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Evaluate stories and print the comments without posting to Jira or Slack",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from its journal (REFINEMENT_JOURNAL_FILE) "
+             "instead of starting over",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="Rank stories and start no new evaluation after SECONDS; the rest are deferred "
+             "(defaults to REFINEMENT_DEADLINE_SECONDS)",
+    )
+    parser.add_argument(
+        "--max-llm-calls",
+        type=int,
+        metavar="N",
+        help="Rank stories and stop before the run needs more than N completions "
+             "(defaults to REFINEMENT_MAX_LLM_CALLS)",
+    )
+    parser.add_argument(
+        "--projects",
+        help="Comma-separated Jira project keys to refine in parallel worker processes "
+             "(defaults to JIRA_PROJECT_KEYS)",
+    )
+    parser.add_argument(
+        "--jql",
+        action="append",
+        default=[],
+        help="A JQL shard to refine in its own worker process; may be repeated",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes for --projects/--jql (defaults to REFINEMENT_WORKERS)",
+    )
+
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    daemon = commands.add_parser(
+        "daemon",
+        help="Refine stories as Jira issue created/updated webhooks arrive",
+    )
+    daemon.add_argument("--host", help="Interface to listen on (defaults to DAEMON_HOST)")
+    daemon.add_argument("--port", type=int, help="Port to listen on (defaults to DAEMON_PORT)")
+    daemon.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="Refine the webhook payloads recorded in FILE (one JSON object per line) and exit",
+    )
+    daemon.add_argument("--record", metavar="FILE", help="Append every received webhook payload to FILE")
+    daemon.add_argument(
+        "--dry-run",
+        action="store_true",
+        default=argparse.SUPPRESS,
+        help="Print the comments instead of posting them to Jira",
+    )
+
+    report = commands.add_parser(
+        "report",
+        help="Show flag-rate trends from the refinement history without calling Jira or the LLM",
+    )
+    report.add_argument(
+        "--by",
+        choices=("component", "reporter", "project", "issue"),
+        default="component",
+        help="What to break the flag rate down by (default: component)",
+    )
+    report.add_argument(
+        "--period",
+        choices=("day", "week", "month"),
+        default="week",
+        help="Length of each trend period (default: week)",
+    )
+    report.add_argument("--since", type=int, default=90, metavar="DAYS", help="Days of history to include (default: 90)")
+    report.add_argument("--top", type=int, default=10, metavar="N", help="Only show the N busiest keys; 0 shows all")
+    report.add_argument("--json", action="store_true", help="Print the rows as JSON")
+    report.add_argument("--history", metavar="FILE", help="History database (defaults to REFINEMENT_HISTORY_FILE)")
+    return parser.parse_args(argv)
+
+
+def print_report(args: argparse.Namespace) -> None:
+    """
+    Answers a ``report`` command from the local refinement history.
+    """
+    from .history import print_trend, trend
+
+    path = args.history or settings.refinement.history_file
+    try:
+        rows = trend(path, args.by, args.period, args.since, args.top)
+    except FileNotFoundError as e:
+        print(e)
+        return
+    if args.json:
+        print(json.dumps([
+            {"period": row.period, args.by: row.key, "stories": row.stories, "flagged": row.flagged, "rate": row.rate}
+            for row in rows
+        ], indent=2))
     else:
-        slack_message = (
-            "*Backlog Refinement Summary*\n"
-            f"Flagged Stories: {flagged_count}\n\n"
-            + "\n\n".join(slack_summary_blocks)
+        print_trend(rows, args.by, args.period, args.since)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = _parse_args(argv)
+
+    if args.command == "daemon":
+        from .daemon import run_daemon
+
+        run_daemon(host=args.host, port=args.port, replay=args.replay, record=args.record, dry_run=args.dry_run)
+        return
+
+    if args.command == "report":
+        print_report(args)
+        return
+
+    projects = [key.strip() for key in (args.projects or settings.jira.project_keys).split(",") if key.strip()]
+    if projects or args.jql:
+        from .multiproject import Shard, run_shards
+
+        shards = [Shard(name=key, project_key=key) for key in projects]
+        shards += [Shard(name=f"jql-{i + 1}", jql=jql) for i, jql in enumerate(args.jql)]
+        run_shards(
+            shards,
+            workers=args.workers,
+            dry_run=args.dry_run,
+            resume=args.resume,
+            deadline_seconds=args.deadline,
+            max_llm_calls=args.max_llm_calls,
         )
-        post_summary_to_slack(slack_message)
+        print("\nBacklog refinement run complete.")
+        return
+
+    run_started = time.time()
+    state: Optional[RefinementState] = None
+    skipped: List[str] = []
+
+    if args.dry_run:
+        print("Dry run: nothing will be posted to Jira or Slack")
+
+    if settings.refinement.incremental and not args.dry_run:
+        state, stories = incremental_stories(_load_stories, settings.refinement.state_file, skipped)
+    else:
+        stories = _load_stories()
+
+    scheduler, stories = scheduled_stories(stories, state, args.deadline, args.max_llm_calls)
+
+    writer = slack = journal = history = None
+    if not args.dry_run:
+        from .comment_writer import CommentWriter
+        from .slack_summary import SlackSummaryStream
+
+        writer = CommentWriter()
+        slack = SlackSummaryStream()
+        journal = open_journal(settings.refinement.journal_file, args.resume)
+        history = open_history(settings.refinement.history_file)
+
+    completed = False
+    try:
+        not_evaluated = refine_and_post(stories, writer, slack, state, journal, scheduler, history)
+
+        comment_stats = None
+        if writer is not None and slack is not None:
+            comment_stats = writer.close()
+            print_comment_stats(comment_stats)
+            print_slack_stats(slack.close())
+        completed = True
+    finally:
+        # An interrupted run keeps its journal for --resume
+        if journal is not None:
+            journal.close(completed=completed)
+        if history is not None:
+            history.close(metrics.report(), completed=completed)
+
+    deferred = False
+    if scheduler is not None:
+        scheduler.report()
+        deferred = bool(scheduler.stats.deferred)
+
+    if state is not None:
+        # Deferred and unevaluated stories, and stories whose comment failed,
+        # were not updated since the last watermark either; keeping it makes
+        # the next run fetch them again
+        failed_comments = comment_stats.failed if comment_stats is not None else 0
+        state.save(watermark=None if deferred or not_evaluated or failed_comments else run_started)
+        print(f"Incremental mode: skipped {len(skipped)} unchanged stories")
+        metrics.set("skipped_unchanged", len(skipped))
+
+    print_run_stats()
+    collect_run_metrics(comment_stats)
+    write_run_report()
 
     print("\nBacklog refinement run complete.")
 
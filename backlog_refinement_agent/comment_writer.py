@@ -0,0 +1,193 @@
+# backlog_refinement_agent/comment_writer.py
+import queue
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from .config import settings
+from .jira_client import (
+    create_comment_in_jira,
+    find_agent_comment_id,
+    update_comment_in_jira,
+)
+from .metrics import metrics
+
+# Locks striped by issue key, serialising the look-up-then-create of a
+# comment across processes that may write to the same issue
+_issue_locks: Optional[Sequence[Any]] = None
+
+
+def install_issue_locks(locks: Sequence[Any]) -> None:
+    """
+    Makes every ``CommentWriter`` in this process hold ``locks[crc32(key) % len(locks)]``
+    while writing an issue's comment, e.g. multiprocessing locks shared by
+    shard workers whose queries overlap. Must be called before writing.
+    """
+    global _issue_locks
+    _issue_locks = locks
+
+
+def _issue_lock(issue_key: str) -> Any:
+    if not _issue_locks:
+        return None
+    return _issue_locks[zlib.crc32(issue_key.encode("utf-8")) % len(_issue_locks)]
+
+
+@dataclass
+class CommentJob:
+    issue_key: str
+    payload: Dict[str, Any]
+    on_done: Optional[Callable[[bool], None]] = None
+
+
+@dataclass
+class CommentWriterStats:
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    deduplicated: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def written(self) -> int:
+        return self.created + self.updated
+
+    @property
+    def per_second(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.written / self.elapsed_seconds
+
+
+class CommentWriter:
+    """
+    Drains refinement comments to Jira from a bounded queue with a pool of
+    writer threads, so evaluation never waits on a comment POST.
+
+    Comments are de-duplicated per issue: a second submission for an issue
+    that is still queued replaces the first, and with ``update_existing`` the
+    agent's previous refinement comment is edited in place instead of a new
+    one being appended. An issue is only ever written by one writer thread
+    at a time, so the look-up of the previous comment and the create that
+    may follow it can't interleave with another write to the same issue.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        update_existing: Optional[bool] = None,
+    ) -> None:
+        """
+        :param workers: Writer threads (defaults to JIRA_COMMENT_WORKERS)
+        :param queue_size: Queued issues before ``submit_payload`` blocks (defaults to JIRA_COMMENT_QUEUE_SIZE)
+        :param update_existing: Edit the agent's earlier comment (defaults to JIRA_UPDATE_EXISTING_COMMENTS)
+        """
+        self.workers = max(1, workers or settings.jira.comment_workers)
+        self.update_existing = (
+            settings.jira.update_existing_comments if update_existing is None else update_existing
+        )
+        self.stats = CommentWriterStats()
+
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(
+            maxsize=queue_size or settings.jira.comment_queue_size
+        )
+        self._pending: Dict[str, CommentJob] = {}
+        # Issues a writer thread is writing; their next job waits in _pending
+        self._writing: Set[str] = set()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"jira-comment-writer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit_payload(
+        self,
+        issue_key: str,
+        payload: Dict[str, Any],
+        on_done: Optional[Callable[[bool], None]] = None,
+    ) -> None:
+        """
+        Queues a comment payload for the issue. Blocks while the queue is full.
+
+        :param on_done: Called with True once the comment is written, or with
+            False if writing failed or a later submission replaced it
+        """
+        job = CommentJob(issue_key, payload, on_done)
+        with self._lock:
+            replaced = self._pending.get(issue_key)
+            self._pending[issue_key] = job
+            if replaced is not None:
+                self.stats.deduplicated += 1
+            # The writer holding the issue picks the job up when it finishes
+            queued = replaced is not None or issue_key in self._writing
+        if replaced is not None and replaced.on_done is not None:
+            replaced.on_done(False)
+        if not queued:
+            self._queue.put(issue_key)
+
+    def close(self) -> CommentWriterStats:
+        """
+        Waits for every queued comment to be written and stops the writers.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.stats.elapsed_seconds = time.monotonic() - self._started
+        return self.stats
+
+    def _run(self) -> None:
+        while True:
+            issue_key = self._queue.get()
+            if issue_key is None:
+                return
+
+            with self._lock:
+                job: Optional[CommentJob] = self._pending.pop(issue_key)
+                self._writing.add(issue_key)
+
+            while job is not None:
+                with metrics.timer("jira_post"):
+                    outcome = self._write(job)
+                with self._lock:
+                    if outcome == "created":
+                        self.stats.created += 1
+                    elif outcome == "updated":
+                        self.stats.updated += 1
+                    else:
+                        self.stats.failed += 1
+                    # A submission that arrived meanwhile is written next, by this thread
+                    next_job = self._pending.pop(issue_key, None)
+                    if next_job is None:
+                        self._writing.discard(issue_key)
+
+                if job.on_done is not None:
+                    job.on_done(outcome != "failed")
+                job = next_job
+
+    def _write(self, job: CommentJob) -> str:
+        lock = _issue_lock(job.issue_key)
+        try:
+            if lock is not None:
+                lock.acquire()
+            try:
+                if self.update_existing:
+                    comment_id = find_agent_comment_id(job.issue_key)
+                    if comment_id:
+                        ok = update_comment_in_jira(job.issue_key, comment_id, job.payload)
+                        return "updated" if ok else "failed"
+
+                ok = create_comment_in_jira(job.issue_key, job.payload)
+                return "created" if ok else "failed"
+            finally:
+                if lock is not None:
+                    lock.release()
+        except Exception as e:
+            print(f"Failed to write comment to {job.issue_key}:", e)
+            return "failed"
@@ -1,37 +1,187 @@
 # backlog_refinement_agent/config.py
 
 import os
+import threading
 from dataclasses import dataclass, field
-from dotenv import load_dotenv
+from typing import Any, Optional
 
-# Load .env file from project root
-load_dotenv()
+# Defaults are read from the environment when a Settings object is built,
+# not at import, so importing the package stays cheap and .env is only
+# loaded by ``get_settings``.
+
+
+def _env_str(name: str, default: str) -> Any:
+    return field(default_factory=lambda: os.getenv(name, default))
+
+
+def _env_bool(name: str, default: str) -> Any:
+    return field(default_factory=lambda: os.getenv(name, default) == "1")
+
+
+def _env_int(name: str, default: str) -> Any:
+    return field(default_factory=lambda: int(os.getenv(name, default)))
+
+
+def _env_float(name: str, default: str) -> Any:
+    return field(default_factory=lambda: float(os.getenv(name, default)))
 
 
 @dataclass
 class JiraConfig:
-    use_jira: bool = os.getenv("USE_JIRA", "1") == "1"
-    base_url: str = os.getenv("JIRA_BASE_URL", "")
-    email: str = os.getenv("JIRA_EMAIL", "")
-    api_token: str = os.getenv("JIRA_API_TOKEN", "")
-    project_key: str = os.getenv("JIRA_PROJECT_KEY", "")
-    max_results: int = int(os.getenv("JIRA_MAX_RESULTS", "50"))
-    local_file: str = os.getenv("LOCAL_FILE", "backlog.csv")
+    use_jira: bool = _env_bool("USE_JIRA", "1")
+    base_url: str = _env_str("JIRA_BASE_URL", "")
+    email: str = _env_str("JIRA_EMAIL", "")
+    api_token: str = _env_str("JIRA_API_TOKEN", "")
+    project_key: str = _env_str("JIRA_PROJECT_KEY", "")
+    # Comma-separated projects refined in parallel worker processes
+    project_keys: str = _env_str("JIRA_PROJECT_KEYS", "")
+    max_results: int = _env_int("JIRA_MAX_RESULTS", "50")
+    max_issues: int = _env_int("JIRA_MAX_ISSUES", "0")
+    local_file: str = _env_str("LOCAL_FILE", "backlog.csv")
+    rate_limit_per_sec: float = _env_float("JIRA_RATE_LIMIT_PER_SEC", "10")
+    rate_limit_burst: int = _env_int("JIRA_RATE_LIMIT_BURST", "10")
+    comment_workers: int = _env_int("JIRA_COMMENT_WORKERS", "4")
+    comment_queue_size: int = _env_int("JIRA_COMMENT_QUEUE_SIZE", "100")
+    update_existing_comments: bool = _env_bool("JIRA_UPDATE_EXISTING_COMMENTS", "1")
 
 
 @dataclass
 class SlackConfig:
-    webhook_url: str = os.getenv("SLACK_WEBHOOK_URL", "")
+    webhook_url: str = _env_str("SLACK_WEBHOOK_URL", "")
+    rate_limit_per_sec: float = _env_float("SLACK_RATE_LIMIT_PER_SEC", "1")
+    # "stream" sends chunked messages as stories are flagged, "digest" sends
+    # only counts, "auto" streams until digest_threshold stories are flagged
+    mode: str = _env_str("SLACK_MODE", "auto")
+    digest_threshold: int = _env_int("SLACK_DIGEST_THRESHOLD", "50")
+    max_message_chars: int = _env_int("SLACK_MAX_MESSAGE_CHARS", "12000")
+
+@dataclass
+class HttpConfig:
+    max_retries: int = _env_int("HTTP_MAX_RETRIES", "5")
+    backoff_seconds: float = _env_float("HTTP_BACKOFF_SECONDS", "0.5")
+    backoff_max_seconds: float = _env_float("HTTP_BACKOFF_MAX_SECONDS", "30")
+    pool_size: int = _env_int("HTTP_POOL_SIZE", "16")
+    timeout_seconds: float = _env_float("HTTP_TIMEOUT_SECONDS", "30")
 
 @dataclass
 class OpenAIConfig:
-    api_key: str = os.getenv("OPENAI_API_KEY", "")
+    api_key: str = _env_str("OPENAI_API_KEY", "")
+    model: str = _env_str("OPENAI_MODEL", "gpt-3.5-turbo")
+    # Alternative API endpoint, e.g. a proxy or the benchmark stub server
+    base_url: str = _env_str("OPENAI_BASE_URL", "")
+    max_concurrency: int = _env_int("LLM_CONCURRENCY", "8")
+    batch_size: int = _env_int("LLM_BATCH_SIZE", "1")
+    # Evaluate summary, acceptance criteria and suggested AC in one JSON completion
+    combined: bool = _env_bool("LLM_COMBINED", "0")
+    max_description_chars: int = _env_int("LLM_MAX_DESCRIPTION_CHARS", "20000")
+    max_input_tokens: int = _env_int("LLM_MAX_INPUT_TOKENS", "3000")
+    prompt_price_per_1k: float = _env_float("LLM_PROMPT_PRICE_PER_1K", "0.0005")
+    completion_price_per_1k: float = _env_float("LLM_COMPLETION_PRICE_PER_1K", "0.0015")
+    max_run_tokens: int = _env_int("LLM_MAX_RUN_TOKENS", "0")
+    max_run_cost_usd: float = _env_float("LLM_MAX_RUN_COST_USD", "0")
+
+@dataclass
+class CacheConfig:
+    enabled: bool = _env_bool("LLM_CACHE_ENABLED", "1")
+    path: str = _env_str("LLM_CACHE_PATH", ".llm_cache.sqlite")
+    ttl_seconds: int = _env_int("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))
+    max_entries: int = _env_int("LLM_CACHE_MAX_ENTRIES", "50000")
+
+@dataclass
+class HeuristicsConfig:
+    enabled: bool = _env_bool("HEURISTICS_ENABLED", "1")
+    pass_threshold: float = _env_float("HEURISTICS_PASS_THRESHOLD", "0.85")
+    flag_threshold: float = _env_float("HEURISTICS_FLAG_THRESHOLD", "0.15")
+
+@dataclass
+class RefinementConfig:
+    incremental: bool = _env_bool("REFINEMENT_INCREMENTAL", "0")
+    state_file: str = _env_str("REFINEMENT_STATE_FILE", ".refinement_state.json")
+    overlap_minutes: int = _env_int("REFINEMENT_OVERLAP_MINUTES", "5")
+    dedup_enabled: bool = _env_bool("DEDUP_ENABLED", "1")
+    dedup_threshold: float = _env_float("DEDUP_THRESHOLD", "0.8")
+    workers: int = _env_int("REFINEMENT_WORKERS", "4")
+    # Rendered comment bodies kept per findings hash
+    render_cache_size: int = _env_int("RENDER_CACHE_SIZE", "4096")
+    # Progress journal for --resume; empty disables it
+    journal_file: str = _env_str("REFINEMENT_JOURNAL_FILE", ".refinement_journal.jsonl")
+    journal_flush_records: int = _env_int("REFINEMENT_JOURNAL_FLUSH_RECORDS", "100")
+    journal_flush_seconds: float = _env_float("REFINEMENT_JOURNAL_FLUSH_SECONDS", "2")
+    # Rank stories before evaluating them; implied by a deadline or call budget
+    prioritize: bool = _env_bool("REFINEMENT_PRIORITIZE", "0")
+    deadline_seconds: float = _env_float("REFINEMENT_DEADLINE_SECONDS", "0")
+    max_llm_calls: int = _env_int("REFINEMENT_MAX_LLM_CALLS", "0")
+    deferred_file: str = _env_str("REFINEMENT_DEFERRED_FILE", "deferred_stories.json")
+    # Per-story results kept across runs for the report command; empty disables it
+    history_file: str = _env_str("REFINEMENT_HISTORY_FILE", ".refinement_history.sqlite")
+
+@dataclass
+class DaemonConfig:
+    host: str = _env_str("DAEMON_HOST", "127.0.0.1")
+    port: int = _env_int("DAEMON_PORT", "8080")
+    webhook_path: str = _env_str("DAEMON_WEBHOOK_PATH", "/webhook")
+    # Jira webhook secret; requests must carry a matching X-Hub-Signature
+    webhook_secret: str = _env_str("DAEMON_WEBHOOK_SECRET", "")
+    # Comma-separated issue types refined; other webhook events are ignored
+    issue_types: str = _env_str("DAEMON_ISSUE_TYPES", "Story")
+    debounce_seconds: float = _env_float("DAEMON_DEBOUNCE_SECONDS", "30")
+    queue_size: int = _env_int("DAEMON_QUEUE_SIZE", "1000")
+    workers: int = _env_int("DAEMON_WORKERS", "4")
+    state_file: str = _env_str("DAEMON_STATE_FILE", ".refinement_daemon_state.json")
+    state_save_seconds: float = _env_float("DAEMON_STATE_SAVE_SECONDS", "60")
+    # LLM_MAX_RUN_TOKENS / LLM_MAX_RUN_COST_USD apply per window of this length (0 = never reset)
+    budget_window_seconds: float = _env_float("DAEMON_BUDGET_WINDOW_SECONDS", str(24 * 3600))
+
+@dataclass
+class MetricsConfig:
+    report_path: str = _env_str("RUN_REPORT_PATH", "run_report.json")
+    prometheus_textfile: str = _env_str("PROMETHEUS_TEXTFILE", "")
 
 @dataclass
 class Settings:
     jira: JiraConfig = field(default_factory=JiraConfig)
     slack: SlackConfig = field(default_factory=SlackConfig)
+    http: HttpConfig = field(default_factory=HttpConfig)
     openai: OpenAIConfig = field(default_factory=OpenAIConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    heuristics: HeuristicsConfig = field(default_factory=HeuristicsConfig)
+    refinement: RefinementConfig = field(default_factory=RefinementConfig)
+    daemon: DaemonConfig = field(default_factory=DaemonConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+
+
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """
+    Returns the process-wide settings, loading .env and reading the
+    environment on first use.
+    """
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                from dotenv import load_dotenv
+
+                # Load .env file from project root
+                load_dotenv()
+                _settings = Settings()
+    return _settings
+
+
+class _LazySettings:
+    """
+    Stand-in for ``Settings`` that resolves ``get_settings()`` on first
+    attribute access, so modules can import ``settings`` at import time.
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
 
 
-settings = Settings()
+settings: Settings = _LazySettings()  # type: ignore[assignment]
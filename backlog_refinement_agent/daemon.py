@@ -0,0 +1,553 @@
+# backlog_refinement_agent/daemon.py
+import hashlib
+import hmac
+import json
+import queue
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+from .metrics import metrics
+from .pipeline import refine_story
+from .rendering import render_adf, render_text
+from .state import RefinementState
+from .story import Story
+
+if TYPE_CHECKING:
+    from .comment_writer import CommentWriter
+    from .history import RefinementHistory
+
+_EVENTS = ("jira:issue_created", "jira:issue_updated")
+
+# Largest webhook body accepted; Jira issue payloads are far smaller
+_MAX_BODY_BYTES = 1024 * 1024
+
+_RETRY_AFTER_SECONDS = 5
+
+
+@dataclass
+class DaemonStats:
+    received: int = 0
+    ignored: int = 0
+    debounced: int = 0
+    rejected: int = 0
+    evaluated: int = 0
+    unchanged: int = 0
+    flagged: int = 0
+    failed: int = 0
+
+
+class Debouncer:
+    """
+    Holds the latest version of each story until no webhook has arrived for
+    it for ``delay`` seconds, then hands it to ``on_ready``. A burst of
+    edits to one issue is evaluated once, in its final state.
+    """
+
+    def __init__(
+        self,
+        delay: float,
+        on_ready: Callable[[Story], None],
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param delay: Quiet seconds before a story is handed over
+        :param on_ready: Receives each story once it is due
+        :param clock: Monotonic time source, e.g. a fake one in tests
+        """
+        self.delay = delay
+        self._on_ready = on_ready
+        self._clock = clock
+        # Ordered by last update, so the first entry is always due first
+        self._pending: "OrderedDict[str, Tuple[Story, float]]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="webhook-debouncer", daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def __contains__(self, issue_key: str) -> bool:
+        with self._condition:
+            return issue_key in self._pending
+
+    def offer(self, story: Story) -> bool:
+        """
+        Schedules the story, replacing a pending version of it. Returns True
+        if an earlier version was still pending.
+        """
+        with self._condition:
+            replaced = self._pending.pop(story.id, None) is not None
+            self._pending[story.id] = (story, self._clock() + self.delay)
+            self._condition.notify()
+        return replaced
+
+    def release_due(self) -> int:
+        """
+        Hands over the stories whose quiet period has passed, as the
+        background thread does when they fall due. Returns how many.
+        """
+        with self._condition:
+            ready = self._pop_due_locked()
+        for story in ready:
+            self._on_ready(story)
+        return len(ready)
+
+    def flush(self) -> None:
+        """
+        Hands over every pending story now, e.g. at the end of a replay.
+        """
+        with self._condition:
+            ready = [story for story, _ in self._pending.values()]
+            self._pending.clear()
+        for story in ready:
+            self._on_ready(story)
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        self.flush()
+
+    def _pop_due_locked(self) -> List[Story]:
+        now = self._clock()
+        ready: List[Story] = []
+        while self._pending:
+            story, due = next(iter(self._pending.values()))
+            if due > now:
+                break
+            self._pending.popitem(last=False)
+            ready.append(story)
+        return ready
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                ready: List[Story] = []
+                while not self._closed:
+                    ready = self._pop_due_locked()
+                    if ready:
+                        break
+                    if self._pending:
+                        self._condition.wait(next(iter(self._pending.values()))[1] - self._clock())
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+            for story in ready:
+                self._on_ready(story)
+
+
+class RefinementDaemon:
+    """
+    Refines stories as Jira reports them through issue created/updated
+    webhooks, instead of re-scanning the backlog.
+
+    Webhooks are debounced per issue, then queued for a pool of worker
+    threads that evaluate the story and hand its comment to the
+    ``CommentWriter``. Edits that don't touch the refined fields, and
+    findings that match the comment already posted, are skipped using the
+    same ``RefinementState`` as incremental runs. When debounced and queued
+    stories reach ``queue_size``, new issues are refused with a 503 and a
+    Retry-After so Jira redelivers them later.
+    """
+
+    def __init__(
+        self,
+        writer: Optional["CommentWriter"],
+        state: RefinementState,
+        debounce_seconds: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        history: Optional["RefinementHistory"] = None,
+    ) -> None:
+        """
+        :param writer: Comment writer; None prints the comments instead (dry run)
+        :param state: Fingerprints and posted findings per story
+        :param debounce_seconds: Quiet time before an issue is evaluated (defaults to DAEMON_DEBOUNCE_SECONDS)
+        :param queue_size: Stories pending before webhooks are refused (defaults to DAEMON_QUEUE_SIZE)
+        :param workers: Worker threads (defaults to DAEMON_WORKERS)
+        :param history: Refinement history every evaluated story is recorded in
+        """
+        daemon_settings = settings.daemon
+        self.writer = writer
+        self.state = state
+        self.history = history
+        self.queue_size = max(1, queue_size or daemon_settings.queue_size)
+        self.workers = max(1, workers or daemon_settings.workers)
+        self.issue_types = {t.strip().lower() for t in daemon_settings.issue_types.split(",") if t.strip()}
+        project_keys = settings.jira.project_keys or settings.jira.project_key
+        self.project_keys = {key.strip() for key in project_keys.split(",") if key.strip()}
+        self.stats = DaemonStats()
+
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Story]]" = queue.Queue(maxsize=self.queue_size)
+        self._debouncer = Debouncer(
+            daemon_settings.debounce_seconds if debounce_seconds is None else debounce_seconds,
+            self._queue.put,
+        )
+        # Summary checks run alongside description checks, as in batch runs
+        self._check_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="daemon-check")
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._run, name=f"daemon-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._debouncer) + self._queue.qsize()
+
+    def handle(self, payload: Dict[str, Any]) -> Tuple[int, str]:
+        """
+        Accepts one webhook payload. Returns the HTTP status and message to
+        answer with: 202 when scheduled, 200 when ignored, 503 when full.
+        """
+        with self._lock:
+            self.stats.received += 1
+        metrics.incr("webhooks_received")
+
+        story = self._story_from(payload)
+        if story is None:
+            with self._lock:
+                self.stats.ignored += 1
+            return 200, "ignored"
+
+        with self._lock:
+            # A newer version of a pending issue never adds load
+            if story.id not in self._debouncer and self.pending >= self.queue_size:
+                self.stats.rejected += 1
+                metrics.incr("webhooks_rejected")
+                return 503, "queue full"
+            if self._debouncer.offer(story):
+                self.stats.debounced += 1
+        return 202, "scheduled"
+
+    def _story_from(self, payload: Dict[str, Any]) -> Optional[Story]:
+        if payload.get("webhookEvent") not in _EVENTS:
+            return None
+        issue = payload.get("issue")
+        if not isinstance(issue, dict) or not issue.get("key"):
+            return None
+
+        issue_fields = issue.get("fields") or {}
+        issue_type = str((issue_fields.get("issuetype") or {}).get("name", "")).lower()
+        if self.issue_types and issue_type not in self.issue_types:
+            return None
+        project = str((issue_fields.get("project") or {}).get("key", "")) or str(issue["key"]).rsplit("-", 1)[0]
+        if self.project_keys and project not in self.project_keys:
+            return None
+
+        with metrics.timer("parse"):
+            return Story.from_jira_issue(issue)
+
+    def drain(self) -> None:
+        """
+        Evaluates everything still debounced or queued and waits for it.
+        """
+        self._debouncer.flush()
+        self._queue.join()
+
+    def close(self) -> None:
+        """
+        Finishes pending stories and stops the workers.
+        """
+        self._debouncer.close()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._check_pool.shutdown()
+
+    def save_state(self) -> None:
+        with self._state_lock:
+            self.state.save()
+
+    def _run(self) -> None:
+        while True:
+            story = self._queue.get()
+            try:
+                if story is None:
+                    return
+                self._refine(story)
+            except Exception as e:
+                with self._lock:
+                    self.stats.failed += 1
+                print(f"Failed to refine {story.id}:", e)
+            finally:
+                self._queue.task_done()
+
+    def _refine(self, story: Story) -> None:
+        with self._state_lock:
+            unchanged = self.state.is_unchanged(story)
+        if unchanged:
+            # e.g. a status change or a comment; nothing refined has changed
+            with self._lock:
+                self.stats.unchanged += 1
+            return
+
+        refinement = refine_story(story, self._check_pool)
+        with self._lock:
+            self.stats.evaluated += 1
+        metrics.incr("stories")
+        if not refinement.evaluated:
+            # Left out of the state, so the next webhook for it is evaluated again
+            metrics.incr("not_evaluated")
+            return
+        if self.history is not None:
+            self.history.add(refinement)
+
+        if not refinement.flagged:
+            with self._state_lock:
+                self.state.record(story)
+            return
+
+        with self._lock:
+            self.stats.flagged += 1
+        metrics.incr("flagged")
+
+        findings = refinement.findings()
+        with self._state_lock:
+            if self.state.findings_unchanged(story, findings.digest):
+                metrics.incr("comments_unchanged")
+                self.state.record(story, findings.digest)
+                return
+
+        if self.writer is None:
+            print(render_text(findings))
+            return
+
+        with metrics.timer("render_comment"):
+            payload = render_adf(findings)
+
+        def on_done(posted: bool) -> None:
+            if posted:
+                with self._state_lock:
+                    self.state.record(story, findings.digest)
+
+        self.writer.submit_payload(story.id, payload, on_done=on_done)
+
+
+def _valid_signature(secret: str, body: bytes, header: str) -> bool:
+    # Jira sends "sha256=<hex HMAC of the body>" when the webhook has a secret
+    expected = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header or "")
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server: "WebhookServer"
+
+    def do_GET(self) -> None:
+        if self.path != "/healthz":
+            self._reply(404, {"error": "not found"})
+            return
+        daemon = self.server.daemon
+        self._reply(200, {"pending": daemon.pending, **asdict(daemon.stats)})
+
+    def do_POST(self) -> None:
+        if self.path.split("?", 1)[0] != settings.daemon.webhook_path:
+            self._reply(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > _MAX_BODY_BYTES:
+            self._reply(413, {"error": "payload too large"})
+            return
+        body = self.rfile.read(length)
+
+        secret = settings.daemon.webhook_secret
+        if secret and not _valid_signature(secret, body, self.headers.get("X-Hub-Signature", "")):
+            self._reply(401, {"error": "invalid signature"})
+            return
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._reply(400, {"error": "invalid JSON"})
+            return
+        if not isinstance(payload, dict):
+            self._reply(400, {"error": "expected a JSON object"})
+            return
+
+        if self.server.recorder is not None:
+            self.server.recorder.write(payload)
+
+        status, message = self.server.daemon.handle(payload)
+        headers = {"Retry-After": str(_RETRY_AFTER_SECONDS)} if status == 503 else {}
+        self._reply(status, {"status": message}, headers)
+
+    def _reply(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Every webhook would otherwise be logged to stderr
+        pass
+
+
+class _Recorder:
+    """Appends received webhook payloads to a JSON-lines file for replay."""
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(payload) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], daemon: RefinementDaemon, recorder: Optional[_Recorder] = None) -> None:
+        super().__init__(address, _WebhookHandler)
+        self.daemon = daemon
+        self.recorder = recorder
+
+
+def replay_payloads(path: str, daemon: RefinementDaemon) -> int:
+    """
+    Feeds recorded webhook payloads (one JSON object per line, as written
+    with ``--record``) through the daemon, then waits for them to be
+    refined. Debouncing applies as if they had arrived at once. Returns the
+    number of payloads replayed.
+    """
+    replayed = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            payload = json.loads(line)
+            # Honour backpressure the way Jira's redelivery would
+            while daemon.handle(payload)[0] == 503:
+                daemon.drain()
+            replayed += 1
+    daemon.drain()
+    return replayed
+
+
+def _print_daemon_stats(stats: DaemonStats) -> None:
+    print(
+        f"Webhooks: {stats.received} received, {stats.ignored} ignored, {stats.debounced} debounced, "
+        f"{stats.rejected} refused; stories: {stats.evaluated} evaluated, {stats.unchanged} unchanged, "
+        f"{stats.flagged} flagged, {stats.failed} failed"
+    )
+
+
+def run_daemon(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    replay: Optional[str] = None,
+    record: Optional[str] = None,
+    dry_run: bool = False,
+) -> None:
+    """
+    Serves the webhook endpoint until interrupted (SIGINT or SIGTERM), or
+    with ``replay`` refines recorded payloads and exits.
+
+    Every DAEMON_STATE_SAVE_SECONDS the state is saved and the run report
+    rewritten, and the LLM run ceilings start over each
+    DAEMON_BUDGET_WINDOW_SECONDS so a spent budget doesn't stop refinement
+    until a restart.
+
+    :param host: Interface to listen on (defaults to DAEMON_HOST)
+    :param port: Port to listen on (defaults to DAEMON_PORT)
+    :param replay: JSON-lines file of recorded webhook payloads to replay
+    :param record: Append every received payload to this JSON-lines file
+    :param dry_run: Print comments instead of posting them; the state file is left untouched
+    """
+    from .cli import collect_run_metrics, open_history, print_comment_stats, print_run_stats, write_run_report
+    from .llm_client import usage
+
+    state = RefinementState.load(settings.daemon.state_file)
+    writer = history = None
+    if not dry_run:
+        from .comment_writer import CommentWriter
+
+        writer = CommentWriter()
+        history = open_history(settings.refinement.history_file, "daemon")
+
+    daemon = RefinementDaemon(writer, state, history=history)
+    stop = threading.Event()
+
+    def maintain_periodically() -> None:
+        # Saves progress and the run report, and restarts the LLM budget window
+        window_started = time.monotonic()
+        while not stop.wait(settings.daemon.state_save_seconds):
+            if not dry_run:
+                daemon.save_state()
+            if history is not None:
+                history.flush()
+            window = settings.daemon.budget_window_seconds
+            if window and time.monotonic() - window_started >= window:
+                usage.start_budget_window()
+                window_started = time.monotonic()
+            collect_run_metrics(writer.stats if writer is not None else None)
+            write_run_report(announce=False)
+
+    maintainer = threading.Thread(target=maintain_periodically, name="daemon-maintenance", daemon=True)
+    maintainer.start()
+
+    try:
+        if replay:
+            print(f"Replaying webhook payloads from {replay}...")
+            print(f"Replayed {replay_payloads(replay, daemon)} payloads")
+        else:
+            recorder = _Recorder(record) if record else None
+            server = WebhookServer(
+                (host or settings.daemon.host, port or settings.daemon.port), daemon, recorder
+            )
+
+            def shut_down(signum: int, frame: Any) -> None:
+                # shutdown() waits for serve_forever, so it can't run on this thread
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+            signal.signal(signal.SIGTERM, shut_down)
+            address, bound_port = server.server_address[:2]
+            print(f"Listening for Jira webhooks on http://{address}:{bound_port}{settings.daemon.webhook_path}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+                if recorder is not None:
+                    recorder.close()
+            print("Shutting down; finishing pending stories...")
+    finally:
+        stop.set()
+        daemon.close()
+        comment_stats = writer.close() if writer is not None else None
+        if not dry_run:
+            daemon.save_state()
+        if history is not None:
+            history.close(metrics.report(), completed=True)
+
+        _print_daemon_stats(daemon.stats)
+        if comment_stats is not None:
+            print_comment_stats(comment_stats)
+        print_run_stats()
+        collect_run_metrics(comment_stats)
+        write_run_report()
@@ -0,0 +1,134 @@
+# backlog_refinement_agent/dedup.py
+import hashlib
+import random
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_WORD = re.compile(r"[a-z0-9]+")
+_MASK64 = (1 << 64) - 1
+
+# Only the start of long descriptions is needed to recognise a copy
+_MAX_TEXT_CHARS = 4000
+
+
+def shingles(text: str, size: int = 3) -> List[int]:
+    """
+    Hashes the overlapping word ``size``-grams of the normalised text.
+
+    The hash is stable across processes (unlike the salted built-in ``hash``),
+    so signatures from different shards or runs are comparable.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return []
+    if len(words) <= size:
+        return [_shingle_hash(words)]
+    return [_shingle_hash(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def _shingle_hash(words: List[str]) -> int:
+    digest = hashlib.blake2b(" ".join(words).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class DuplicateIndex:
+    """
+    MinHash/LSH index that spots near-duplicate stories as they are added.
+
+    Signatures use one-permutation hashing: every shingle is hashed once and
+    lands in one of ``num_hashes`` bins, so building a signature is linear in
+    the text length. Signatures are split into ``bands`` and stories sharing
+    a band are only compared with each other, which keeps lookups roughly
+    constant per story instead of comparing against the whole backlog.
+
+    Only cluster representatives (the first story of each group) are indexed,
+    and ``add`` reports later near-copies against them.
+    """
+
+    def __init__(self, threshold: float = 0.9, num_hashes: int = 64, bands: int = 16, seed: int = 1) -> None:
+        """
+        :param threshold: Minimum estimated Jaccard similarity to report a duplicate
+        :param num_hashes: Signature length; must be divisible by ``bands``
+        :param bands: LSH bands; more bands find lower similarities
+        """
+        if num_hashes % bands:
+            raise ValueError("num_hashes must be divisible by bands")
+        self.threshold = threshold
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.rows = num_hashes // bands
+        self._salt = random.Random(seed).getrandbits(64)
+        self._buckets: List[Dict[Tuple[int, ...], List[str]]] = [defaultdict(list) for _ in range(bands)]
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        hashes = shingles(text[:_MAX_TEXT_CHARS])
+        if not hashes:
+            return None
+
+        bins: List[Optional[int]] = [None] * self.num_hashes
+        for value in hashes:
+            value = ((value ^ self._salt) * 0x9E3779B97F4A7C15) & _MASK64
+            slot = value % self.num_hashes
+            rest = value // self.num_hashes
+            current = bins[slot]
+            if current is None or rest < current:
+                bins[slot] = rest
+
+        # Densify: empty bins borrow from the next filled bin to the right,
+        # offset by the distance so they do not collide with that bin itself.
+        # Walking the ring backwards twice reaches every empty bin.
+        if None in bins:
+            original = list(bins)
+            n = self.num_hashes
+            next_value, distance = None, 0
+            for step in range(2 * n - 1, -1, -1):
+                i = step % n
+                if original[i] is not None:
+                    next_value, distance = original[i], 0
+                    continue
+                distance += 1
+                if step < n and next_value is not None:
+                    bins[i] = (next_value * 31 + distance) & _MASK64
+        return tuple(bins)  # type: ignore[arg-type]
+
+    @staticmethod
+    def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+        return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+    def add(self, story_id: str, text: str) -> Optional[str]:
+        """
+        Indexes a story and returns the id of the representative it
+        duplicates, or None if it starts a new cluster.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+
+        bands = [
+            signature[band * self.rows:(band + 1) * self.rows]
+            for band in range(self.bands)
+        ]
+
+        best_id, best_score = None, self.threshold
+        seen = set()
+        for band, key in enumerate(bands):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                score = self.similarity(signature, self._signatures[candidate])
+                if score >= best_score:
+                    best_id, best_score = candidate, score
+
+        if best_id is not None:
+            return best_id
+
+        self._signatures[story_id] = signature
+        for band, key in enumerate(bands):
+            self._buckets[band][key].append(story_id)
+        return None
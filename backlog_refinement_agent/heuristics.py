@@ -0,0 +1,185 @@
+# backlog_refinement_agent/heuristics.py
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .config import settings
+
+_ACTION_VERBS = frozenset({
+    "add", "allow", "archive", "build", "calculate", "change", "configure",
+    "create", "delete", "deprecate", "disable", "display", "download",
+    "edit", "enable", "export", "filter", "generate", "hide", "implement",
+    "import", "integrate", "introduce", "limit", "list", "log", "migrate",
+    "move", "notify", "persist", "prevent", "provide", "publish", "record",
+    "redirect", "refactor", "remove", "rename", "replace", "request",
+    "reset", "restrict", "retry", "return", "save", "schedule", "search",
+    "send", "set", "show", "sort", "store", "support", "sync", "track",
+    "update", "upgrade", "upload", "validate", "verify",
+})
+
+_VAGUE_TERMS = re.compile(
+    r"\b(stuff|things?|misc|miscellaneous|various|etc|tbd|todo|fix (?:it|issues?|bugs?)|"
+    r"improve(?:ments?)?|enhancements?|changes|updates|cleanup|tweaks?|asap)\b",
+    re.IGNORECASE,
+)
+_USER_STORY = re.compile(r"^\s*as an? .+?\bi (?:want|need|would like)\b", re.IGNORECASE)
+_GIVEN = re.compile(r"\bgiven\b", re.IGNORECASE)
+_WHEN = re.compile(r"\bwhen\b", re.IGNORECASE)
+_THEN = re.compile(r"\bthen\b", re.IGNORECASE)
+_AC_HEADING = re.compile(r"acceptance criteria|definition of done", re.IGNORECASE)
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+\S", re.MULTILINE)
+_MODAL = re.compile(r"\b(?:should|must|shall|can|will)\b", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"\b(?:tbd|todo|to be defined|fill in|lorem ipsum)\b", re.IGNORECASE)
+
+
+@dataclass
+class HeuristicScore:
+    """
+    Rule-based quality estimate: 1.0 looks clearly fine, 0.0 clearly flagged.
+    """
+
+    score: float
+    reasons: List[str]
+
+
+def _clamp(value: float) -> float:
+    return max(0.0, min(1.0, value))
+
+
+def score_summary(summary: str) -> HeuristicScore:
+    text = summary.strip()
+    words = re.findall(r"[A-Za-z][A-Za-z'-]*", text)
+    score = 0.5
+    reasons: List[str] = []
+
+    if len(words) < 3:
+        score -= 0.4
+        reasons.append(f"it has only {len(words)} word(s)")
+    elif 4 <= len(words) <= 15:
+        score += 0.15
+    elif len(words) > 25:
+        score -= 0.15
+        reasons.append("it is long enough to read as a description")
+
+    if _USER_STORY.search(text):
+        score += 0.3
+        reasons.append("it follows the 'As a ..., I want ...' template")
+    elif words and words[0].lower() in _ACTION_VERBS and len(words) >= 3:
+        score += 0.25
+        reasons.append("it starts with an action verb followed by an object")
+
+    vague = _VAGUE_TERMS.findall(text)
+    if vague:
+        score -= 0.3
+        reasons.append(f"it uses vague terms ({', '.join(sorted(set(v.lower() for v in vague)))})")
+
+    if text.isupper() and len(words) > 1:
+        score -= 0.1
+
+    return HeuristicScore(_clamp(score), reasons)
+
+
+def score_description(description: str) -> HeuristicScore:
+    text = description.strip()
+    score = 0.5
+    reasons: List[str] = []
+
+    bullets = len(_BULLET.findall(text))
+    has_gherkin = bool(_GIVEN.search(text) and _WHEN.search(text) and _THEN.search(text))
+    has_heading = bool(_AC_HEADING.search(text))
+
+    if has_gherkin:
+        score += 0.35
+        reasons.append("it contains Given/When/Then scenarios")
+    if has_heading and bullets >= 2:
+        score += 0.3
+        reasons.append(f"it has an acceptance criteria section with {bullets} bullet points")
+    elif has_heading:
+        score += 0.1
+    if bullets >= 3 and len(_MODAL.findall(text)) >= 2:
+        score += 0.1
+
+    if len(text) < 40:
+        score -= 0.4
+        reasons.append("it is only a sentence or two")
+    elif len(text) < 200 and not bullets and not has_gherkin and not has_heading:
+        score -= 0.3
+        reasons.append("it has no bullet points, scenarios or acceptance criteria section")
+
+    if _PLACEHOLDER.search(text):
+        score -= 0.3
+        reasons.append("it contains placeholder text such as TBD or TODO")
+
+    return HeuristicScore(_clamp(score), reasons)
+
+
+class PrefilterStats:
+    """
+    Counts how many checks the rules decided versus how many reached the LLM.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.decided: Dict[str, int] = {"summary": 0, "description": 0}
+        self.sent: Dict[str, int] = {"summary": 0, "description": 0}
+
+    def record(self, kind: str, decided: bool) -> None:
+        with self._lock:
+            (self.decided if decided else self.sent)[kind] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.decided.values()) + sum(self.sent.values())
+
+    @property
+    def avoided_fraction(self) -> float:
+        return sum(self.decided.values()) / self.total if self.total else 0.0
+
+
+prefilter_stats = PrefilterStats()
+
+
+def _decide(
+    kind: str,
+    result: HeuristicScore,
+    labels: Tuple[str, str],
+    subject: str,
+) -> Optional[Tuple[bool, str]]:
+    good_label, bad_label = labels
+    if result.score >= settings.heuristics.pass_threshold:
+        flagged, label = False, good_label
+    elif result.score <= settings.heuristics.flag_threshold:
+        flagged, label = True, bad_label
+    else:
+        prefilter_stats.record(kind, decided=False)
+        return None
+
+    prefilter_stats.record(kind, decided=True)
+    reasons = "; ".join(result.reasons) or "it matches the usual shape of a well-formed story"
+    return flagged, (
+        f"Classification: {label}\n"
+        f"Explanation: {subject} looks {label.lower()} because {reasons} (rule-based check)."
+    )
+
+
+def prefilter_summary(summary: str) -> Optional[Tuple[bool, str]]:
+    """
+    Returns ``(is_vague, explanation)`` when the rules are confident about
+    the summary, or None if it should go to the LLM.
+    """
+    if not settings.heuristics.enabled:
+        return None
+    return _decide("summary", score_summary(summary), ("Clear", "Vague"), "The summary")
+
+
+def prefilter_description(description: str) -> Optional[Tuple[bool, str]]:
+    """
+    Returns ``(is_incomplete, explanation)`` when the rules are confident
+    about the acceptance criteria, or None if it should go to the LLM.
+    """
+    if not settings.heuristics.enabled:
+        return None
+    return _decide(
+        "description", score_description(description), ("Complete", "Incomplete"), "The description"
+    )
@@ -0,0 +1,301 @@
+# backlog_refinement_agent/history.py
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .pipeline import Refinement
+
+# What ``trend`` can group evaluations by
+DIMENSIONS = ("component", "reporter", "project", "issue")
+PERIODS = ("day", "week", "month")
+
+_NONE = "(none)"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS runs ("
+    " run_id INTEGER PRIMARY KEY,"
+    " name TEXT NOT NULL,"
+    " started_at REAL NOT NULL,"
+    " finished_at REAL,"
+    " stories INTEGER NOT NULL DEFAULT 0,"
+    " flagged INTEGER NOT NULL DEFAULT 0,"
+    " completed INTEGER NOT NULL DEFAULT 0,"
+    " timings TEXT)",
+    # One row per evaluated story; ``day`` counts days since the epoch (UTC)
+    "CREATE TABLE IF NOT EXISTS results ("
+    " run_id INTEGER NOT NULL,"
+    " day INTEGER NOT NULL,"
+    " evaluated_at REAL NOT NULL,"
+    " story_id TEXT NOT NULL,"
+    " project TEXT NOT NULL,"
+    " reporter TEXT NOT NULL,"
+    " flagged INTEGER NOT NULL,"
+    " issue_count INTEGER NOT NULL,"
+    " ac_suggested INTEGER NOT NULL,"
+    " findings_key TEXT)",
+    # One row per component of each evaluated story ("" when it has none)
+    "CREATE TABLE IF NOT EXISTS result_components ("
+    " run_id INTEGER NOT NULL,"
+    " day INTEGER NOT NULL,"
+    " story_id TEXT NOT NULL,"
+    " component TEXT NOT NULL,"
+    " flagged INTEGER NOT NULL)",
+    # One row per issue flagged on each evaluated story
+    "CREATE TABLE IF NOT EXISTS result_issues ("
+    " run_id INTEGER NOT NULL,"
+    " day INTEGER NOT NULL,"
+    " story_id TEXT NOT NULL,"
+    " issue TEXT NOT NULL)",
+    # Trend queries scan a day range and group by one column; these indexes
+    # cover them, so the tables themselves are never read
+    "CREATE INDEX IF NOT EXISTS results_reporter ON results (day, reporter, flagged)",
+    "CREATE INDEX IF NOT EXISTS results_project ON results (day, project, flagged)",
+    "CREATE INDEX IF NOT EXISTS results_story ON results (story_id, day)",
+    "CREATE INDEX IF NOT EXISTS result_components_day ON result_components (day, component, flagged)",
+    "CREATE INDEX IF NOT EXISTS result_issues_day ON result_issues (day, issue)",
+)
+
+# Per-day counts grouped by one column: (day, key, stories, flagged)
+_TREND_QUERIES = {
+    "component": "SELECT day, component, COUNT(*), SUM(flagged) FROM result_components"
+                 " WHERE day >= ? GROUP BY day, component",
+    "reporter": "SELECT day, reporter, COUNT(*), SUM(flagged) FROM results"
+                " WHERE day >= ? GROUP BY day, reporter",
+    "project": "SELECT day, project, COUNT(*), SUM(flagged) FROM results"
+               " WHERE day >= ? GROUP BY day, project",
+}
+_ISSUE_QUERY = "SELECT day, issue, COUNT(*) FROM result_issues WHERE day >= ? GROUP BY day, issue"
+_STORIES_QUERY = "SELECT day, COUNT(*) FROM results WHERE day >= ? GROUP BY day"
+
+
+def _period_label(day: int, period: str) -> str:
+    date = datetime.date(1970, 1, 1) + datetime.timedelta(days=day)
+    if period == "week":
+        # Weeks start on Monday and are labelled by that date
+        return (date - datetime.timedelta(days=date.weekday())).isoformat()
+    if period == "month":
+        return date.strftime("%Y-%m")
+    return date.isoformat()
+
+
+@dataclass(frozen=True, slots=True)
+class TrendRow:
+    """
+    Evaluations in one period for one component, reporter, project or issue.
+
+    ``stories`` counts evaluations, so a story evaluated in two runs counts
+    twice. For issues, ``stories`` is every evaluation in the period and
+    ``flagged`` those that raised the issue.
+    """
+
+    period: str
+    key: str
+    stories: int
+    flagged: int
+
+    @property
+    def rate(self) -> float:
+        return self.flagged / self.stories if self.stories else 0.0
+
+
+class RefinementHistory:
+    """
+    Local store of every evaluated story's result, kept across runs so
+    trends can be queried without Jira or the LLM.
+
+    Each run gets a row in ``runs`` with its stage timings once it closes;
+    each evaluation is a row in ``results`` with the story's project,
+    reporter, whether it was flagged and the findings hash, plus one row per
+    component and per flagged issue. Rows only carry the day they were
+    evaluated on and are indexed by it, so a trend over months reads a few
+    index ranges and never the explanations themselves.
+
+    Rows are buffered and inserted in one transaction per ``flush_records``
+    stories or ``flush_seconds``, whichever comes first. Shard workers and
+    the daemon may share the file.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str = "",
+        flush_records: int = 500,
+        flush_seconds: float = 30.0,
+    ) -> None:
+        """
+        :param path: SQLite database file
+        :param name: Recorded with the run, e.g. the shard or "daemon"
+        :param flush_records: Buffered results that trigger a write
+        :param flush_seconds: Longest time a result stays buffered (checked on add)
+        """
+        self.path = path
+        self.name = name
+        self.flush_records = max(1, flush_records)
+        self.flush_seconds = flush_seconds
+        self.stories = 0
+        self.flagged = 0
+
+        self._lock = threading.Lock()
+        self._results: List[Tuple[Any, ...]] = []
+        self._components: List[Tuple[Any, ...]] = []
+        self._issues: List[Tuple[Any, ...]] = []
+        self._last_flush = time.monotonic()
+        # Worker processes may share the file; wait for their writes instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self.run_id = self._conn.execute(
+            "INSERT INTO runs (name, started_at) VALUES (?, ?)", (name, time.time())
+        ).lastrowid
+        self._conn.commit()
+
+    def add(self, refinement: "Refinement") -> None:
+        """
+        Buffers the result of one evaluated story, flagged or not.
+        """
+        story = refinement.story
+        now = time.time()
+        day = int(now // 86400)
+        story_id = str(story.id)
+        flagged = int(refinement.flagged)
+        components = [c.strip() for c in str(story.components or "").split(",") if c.strip()] or [""]
+        # Hashes the issues and explanations; equal keys mean identical findings
+        findings_key = refinement.findings().key if flagged else None
+
+        with self._lock:
+            self.stories += 1
+            self.flagged += flagged
+            self._results.append((
+                self.run_id,
+                day,
+                now,
+                story_id,
+                story_id.rsplit("-", 1)[0] if "-" in story_id else "",
+                story.reporter or "",
+                flagged,
+                len(refinement.issues),
+                int(bool(refinement.ac_suggestion)),
+                findings_key,
+            ))
+            self._components.extend((self.run_id, day, story_id, c, flagged) for c in components)
+            self._issues.extend((self.run_id, day, story_id, issue) for issue in refinement.issues)
+            if len(self._results) >= self.flush_records or \
+                    time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._results:
+            return
+        with self._conn:
+            self._conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._results)
+            self._conn.executemany("INSERT INTO result_components VALUES (?, ?, ?, ?, ?)", self._components)
+            self._conn.executemany("INSERT INTO result_issues VALUES (?, ?, ?, ?)", self._issues)
+        self._results.clear()
+        self._components.clear()
+        self._issues.clear()
+
+    def close(self, report: Optional[Dict[str, Any]] = None, completed: bool = False) -> None:
+        """
+        Writes what is buffered and finishes the run's row.
+
+        :param report: ``metrics.report()``; its stage timings are kept with the run
+        :param completed: Whether the run finished rather than failing halfway
+        """
+        with self._lock:
+            self._flush_locked()
+            timings = json.dumps(report.get("stages", {}), sort_keys=True) if report else None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE runs SET finished_at = ?, stories = ?, flagged = ?, completed = ?, timings = ?"
+                    " WHERE run_id = ?",
+                    (time.time(), self.stories, self.flagged, int(completed), timings, self.run_id),
+                )
+            self._conn.close()
+
+
+def trend(
+    path: str,
+    by: str,
+    period: str = "week",
+    since_days: int = 90,
+    top: int = 0,
+) -> List[TrendRow]:
+    """
+    Flag rates per period over the last ``since_days`` days, oldest first
+    and highest rate first within a period.
+
+    :param path: History database written by ``RefinementHistory``
+    :param by: One of ``DIMENSIONS``
+    :param period: One of ``PERIODS``
+    :param top: Only keep the keys with the most evaluations overall (0 = all)
+    """
+    if by not in DIMENSIONS:
+        raise ValueError(f"Unknown trend dimension: {by}")
+    if period not in PERIODS:
+        raise ValueError(f"Unknown trend period: {period}")
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No refinement history at {path}")
+
+    first_day = int(time.time() // 86400) - max(0, since_days) + 1
+    conn = sqlite3.connect(path)
+    try:
+        if by == "issue":
+            day_stories = conn.execute(_STORIES_QUERY, (first_day,)).fetchall()
+            rows = [(day, issue, 0, count) for day, issue, count in conn.execute(_ISSUE_QUERY, (first_day,))]
+        else:
+            rows = conn.execute(_TREND_QUERIES[by], (first_day,)).fetchall()
+    finally:
+        conn.close()
+
+    # Roll the per-day groups up into periods
+    totals: Dict[Tuple[str, str], List[int]] = {}
+    for day, key, stories_count, flagged in rows:
+        counts = totals.setdefault((_period_label(day, period), key or _NONE), [0, 0])
+        counts[0] += stories_count
+        counts[1] += flagged or 0
+
+    if by == "issue":
+        # An issue's rate is out of every evaluation in the period
+        period_stories: Dict[str, int] = {}
+        for day, count in day_stories:
+            label = _period_label(day, period)
+            period_stories[label] = period_stories.get(label, 0) + count
+        for (label, _), counts in totals.items():
+            counts[0] = period_stories.get(label, 0)
+
+    result = [TrendRow(label, key, counts[0], counts[1]) for (label, key), counts in totals.items()]
+    if top:
+        volume: Dict[str, int] = {}
+        for row in result:
+            volume[row.key] = volume.get(row.key, 0) + (row.flagged if by == "issue" else row.stories)
+        kept = set(sorted(volume, key=volume.__getitem__, reverse=True)[:top])
+        result = [row for row in result if row.key in kept]
+    result.sort(key=lambda row: (row.period, -row.rate, row.key))
+    return result
+
+
+def print_trend(rows: Sequence[TrendRow], by: str, period: str, since_days: int) -> None:
+    """
+    Prints trend rows as a table.
+    """
+    print(f"Flag rate by {by} per {period}, last {since_days} days")
+    if not rows:
+        print("No evaluations recorded in that time.")
+        return
+    width = max(len(by), *(len(row.key) for row in rows))
+    print(f"{period:<10}  {by:<{width}}  {'stories':>8}  {'flagged':>8}  {'rate':>6}")
+    for row in rows:
+        print(f"{row.period:<10}  {row.key:<{width}}  {row.stories:>8}  {row.flagged:>8}  {row.rate:>6.1%}")
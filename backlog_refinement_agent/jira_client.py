@@ -1,97 +1,202 @@
 # backlog_refinement_agent/jira_client.py
-from typing import List, Dict, Any, Optional
-import requests
-from requests.auth import HTTPBasicAuth
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional
 from .config import settings
 import json
-import pandas as pd
-from .refinement import extract_full_description
+import re
+from .metrics import metrics
+from .rendering import COMMENT_TITLE
+from .story import Story, stories_to_dataframe
+from .transport import get_jira_transport
 
-def post_comment_to_jira(issue_key: str, comment_lines: list[str], reporter_name: str = "", account_id: str = "") -> None: 
-    """
-    Posts a comment to the given Jira issue with optional user mention using accountId.
+if TYPE_CHECKING:
+    import pandas as pd
 
-    :param issue_key: The Jira ticket ID (e.g., DEV-1234)
-    :param comment_lines: List of lines to include in the comment
-    :param reporter_name: Display name of the user (for @mention text only)
-    :param account_id: Jira accountId of the user (used for actual tagging)
-    """
+COMMENT_MARKER = COMMENT_TITLE
 
-    content_blocks = []
-
-    # Add @mention block if reporter's account ID is available
-    if account_id:
-        content_blocks.append({
-            "type": "paragraph",
-            "content": [
-                {
-                    "type": "mention",
-                    "attrs": {
-                        "id": account_id,
-                        "text": f"@{reporter_name}" if reporter_name else "@reporter"
-                    }
-                },
-                {"type": "text", "text": ", Please review the following issues identified during backlog refinement:"}
-            ]
-        })
-
-    # Add main comment content
-    for line in comment_lines:
-        content_blocks.append({
-            "type": "paragraph",
-            "content": [{"type": "text", "text": line}]
-        })
 
-    payload = {
-        "body": {
-            "type": "doc",
-            "version": 1,
-            "content": content_blocks
-        }
-    }
+def create_comment_in_jira(issue_key: str, payload: Dict[str, Any]) -> bool:
+    """
+    Adds a new comment to the issue.
 
+    :param issue_key: The Jira ticket ID (e.g., DEV-1234)
+    :param payload: Comment payload from ``rendering.render_adf``
+    :return: True if Jira accepted the comment
+    """
     url = f"{settings.jira.base_url}/rest/api/3/issue/{issue_key}/comment"
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json"
     }
-    auth = HTTPBasicAuth(settings.jira.email, settings.jira.api_token)
 
-    response = requests.post(url, headers=headers, json=payload, auth=auth)
+    response = get_jira_transport().post(url, headers=headers, json=payload)
 
     if response.status_code == 201:
         print(f"Comment posted to Jira ticket: {issue_key}")
-    else:
-        print(f"Failed to post comment to {issue_key}")
-        print(f"Status: {response.status_code}")
-        print("Response:", response.text)
+        return True
 
+    print(f"Failed to post comment to {issue_key}")
+    print(f"Status: {response.status_code}")
+    print("Response:", response.text)
+    return False
 
-    
-def fetch_issues_from_jira(
-    project_key: Optional[str] = None,
-    max_results: Optional[int] = None,
-) -> pd.DataFrame:
 
+_current_account_id: Optional[str] = None
 
-    project_key = project_key or settings.jira.project_key
-    max_results =max_results or settings.jira.max_results
 
-    if not project_key:
-        raise ValueError("JIRA_PROJECT_KEY is not set in .env")
- 
-    jql_query = (
-        f"project = {project_key} AND issuetype = Story "
-        f"AND Sprint is EMPTY ORDER BY created DESC"
+def get_current_account_id() -> str:
+    """
+    Returns the accountId of the Jira user the agent authenticates as.
+    """
+    global _current_account_id
+    if _current_account_id is None:
+        url = f"{settings.jira.base_url}/rest/api/3/myself"
+        response = get_jira_transport().get(url, headers={"Accept": "application/json"})
+        if response.status_code != 200:
+            raise Exception(
+                f"Failed to fetch current Jira user: {response.status_code} - {response.text}"
+            )
+        _current_account_id = response.json().get("accountId", "")
+    return _current_account_id
+
+
+def find_agent_comment_id(issue_key: str) -> Optional[str]:
+    """
+    Returns the id of the most recent refinement comment the agent left on
+    the issue, or None if there is none.
+
+    :param issue_key: The Jira ticket ID (e.g., DEV-1234)
+    """
+    account_id = get_current_account_id()
+    url = f"{settings.jira.base_url}/rest/api/3/issue/{issue_key}/comment"
+    response = get_jira_transport().get(
+        url,
+        headers={"Accept": "application/json"},
+        params={"orderBy": "-created", "maxResults": 100},
     )
+    if response.status_code != 200:
+        raise Exception(
+            f"Failed to fetch comments for {issue_key}: {response.status_code} - {response.text}"
+        )
 
-    url = f"{settings.jira.base_url}/rest/api/3/search/jql"
+    for comment in response.json().get("comments", []):
+        author = comment.get("author") or {}
+        if author.get("accountId") != account_id:
+            continue
+        if COMMENT_MARKER in json.dumps(comment.get("body", {})):
+            return str(comment.get("id"))
+    return None
+
+
+def update_comment_in_jira(issue_key: str, comment_id: str, payload: Dict[str, Any]) -> bool:
+    """
+    Replaces the body of an existing comment.
+
+    :param issue_key: The Jira ticket ID (e.g., DEV-1234)
+    :param comment_id: Id of the comment to edit
+    :param payload: Comment payload from ``rendering.render_adf``
+    :return: True if Jira accepted the edit
+    """
+    url = f"{settings.jira.base_url}/rest/api/3/issue/{issue_key}/comment/{comment_id}"
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json"
+    }
+
+    response = get_jira_transport().put(url, headers=headers, json=payload)
+
+    if response.status_code == 200:
+        print(f"Comment updated on Jira ticket: {issue_key}")
+        return True
+
+    print(f"Failed to update comment {comment_id} on {issue_key}")
+    print(f"Status: {response.status_code}")
+    print("Response:", response.text)
+    return False
+
+
+_ORDER_BY = re.compile(r"\s+ORDER\s+BY\s.*$", re.IGNORECASE | re.DOTALL)
+
+
+def _fetch_page(
+    url: str,
+    payload: Dict[str, Any],
+    next_page_token: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Fetches a single page of search results.
+
+    :param url: The Jira search endpoint
+    :param payload: The search payload shared by every page
+    :param next_page_token: Token returned by the previous page, if any
+    """
+    page_payload = dict(payload)
+    if next_page_token:
+        page_payload["nextPageToken"] = next_page_token
 
     headers = {
         "Accept": "application/json",
         "Content-Type": "application/json",
     }
-    auth = HTTPBasicAuth(settings.jira.email, settings.jira.api_token)
+
+    with metrics.timer("fetch"):
+        # A search: read-only, so safe to retry even though it is a POST
+        response = get_jira_transport().post(url, headers=headers, json=page_payload, idempotent=True)
+        data = response.json() if response.status_code == 200 else None
+
+    if data is None:
+        raise Exception(
+            f"Failed to fetch issues: {response.status_code} - {response.text}"
+        )
+
+    return data
+
+
+def iter_issues_from_jira(
+    project_key: Optional[str] = None,
+    max_results: Optional[int] = None,
+    max_issues: Optional[int] = None,
+    updated_since_minutes: Optional[int] = None,
+    jql: Optional[str] = None,
+) -> Iterator[Story]:
+    """
+    Yields parsed stories page by page, following ``nextPageToken``
+    until Jira reports the last page.
+
+    The next page is requested in the background as soon as the current
+    page arrives, so callers can evaluate one page while the following one
+    is in flight. Only two pages are ever held in memory.
+
+    :param project_key: Jira project to search (defaults to JIRA_PROJECT_KEY)
+    :param max_results: Page size sent as ``maxResults`` (defaults to JIRA_MAX_RESULTS)
+    :param max_issues: Stop after this many issues; 0 or None means no limit
+    :param updated_since_minutes: Only return stories updated within this many minutes
+    :param jql: Search with this query instead of the project's refinement query
+    """
+    project_key = project_key or settings.jira.project_key
+    max_results = max_results or settings.jira.max_results
+    max_issues = settings.jira.max_issues if max_issues is None else max_issues
+
+    if not project_key and not jql:
+        raise ValueError("JIRA_PROJECT_KEY is not set in .env")
+
+    updated_filter = ""
+    if updated_since_minutes is not None:
+        updated_filter = f'AND updated >= "-{updated_since_minutes}m" '
+
+    if jql:
+        # Keep a caller's ORDER BY outside the parenthesised filter
+        order_by = _ORDER_BY.search(jql)
+        where = jql[:order_by.start()] if order_by else jql
+        order = order_by.group(0).strip() if order_by else ""
+        jql_query = f"({where.strip()}) {updated_filter}{order}".strip()
+    else:
+        jql_query = (
+            f"project = {project_key} AND issuetype = Story "
+            f"AND Sprint is EMPTY {updated_filter}ORDER BY created DESC"
+        )
+
+    url = f"{settings.jira.base_url}/rest/api/3/search/jql"
 
     payload = {
         "jql": jql_query,
@@ -102,57 +207,49 @@ def fetch_issues_from_jira(
             "fixVersions",
             "components",
             "reporter",
+            "updated",
+            "priority",
+            "created",
         ],
         "fieldsByKeys": False,
     }
 
-    response = requests.post(url, headers=headers, auth=auth, json=payload)
-    
-    if response.status_code != 200:
-        raise Exception(
-            f"Failed to fetch issues: {response.status_code} - {response.text}"
-        )
+    yielded = 0
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        pending = prefetcher.submit(_fetch_page, url, payload)
 
-    data = response.json()
-    total = data.get("total")
-    
-    parsed_issues = []
+        while pending is not None:
+            data = pending.result()
+            issues = data.get("issues", [])
 
-    # For the new endpoint, issues are still under "issues"x
-    for issue in data.get("issues", []):
-        fields = issue.get("fields", {})
+            next_page_token = data.get("nextPageToken")
+            is_last = data.get("isLast", not next_page_token)
 
-        issue_id = issue.get("key")
-        summary = fields.get("summary", "") or ""
-        description_block = fields.get("description")
-        description = (
-            extract_full_description(description_block) if description_block else ""
-        )
-
-        fix_versions = fields.get("fixVersions") or []
-        components = fields.get("components") or []
-        reporter = fields.get("reporter") or {}
-
-        fix_version_names = [fv.get("name") for fv in fix_versions if fv.get("name")]
-        component_names = [c.get("name") for c in components if c.get("name")]
+            # Request the next page before handing this one to the caller
+            if issues and next_page_token and not is_last:
+                pending = prefetcher.submit(_fetch_page, url, payload, next_page_token)
+            else:
+                pending = None
 
-        reporter_display_name = reporter.get("displayName", "")
-        reporter_account_id = reporter.get("accountId", "")
+            for issue in issues:
+                with metrics.timer("parse"):
+                    story = Story.from_jira_issue(issue)
+                yield story
+                yielded += 1
+                if max_issues and yielded >= max_issues:
+                    if pending is not None:
+                        pending.cancel()
+                    return
 
-        row = {
-            "id": issue_id,
-            "summary": summary,
-            "description": description,
-            "fixVersions": ", ".join(fix_version_names) if fix_version_names else "",
-            "components": ", ".join(component_names) if component_names else "",
-            "reporter": reporter_display_name,
-            "account_id": reporter_account_id,
-        }
 
-        present_fields = [k for k, v in row.items() if v not in ("", None)]
-        row["present_fields"] = present_fields
-
-        parsed_issues.append(row)
+def fetch_issues_from_jira(
+    project_key: Optional[str] = None,
+    max_results: Optional[int] = None,
+) -> "pd.DataFrame":
+    """
+    Fetches every matching story into a single DataFrame. Requires pandas.
 
-    df = pd.DataFrame(parsed_issues)
-    return df
\ No newline at end of file
+    Prefer ``iter_issues_from_jira`` for large projects; this loads the
+    whole backlog into memory before returning.
+    """
+    return stories_to_dataframe(iter_issues_from_jira(project_key, max_results))
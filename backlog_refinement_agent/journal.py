@@ -0,0 +1,158 @@
+# backlog_refinement_agent/journal.py
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .refinement import NOT_EVALUATED, EvaluationResult
+from .state import RefinementState
+
+
+class RunJournal:
+    """
+    Append-only JSON-lines record of a run's progress, so a run that dies
+    halfway can be resumed without paying for the same LLM calls or posting
+    the same comments again.
+
+    Every evaluated story gets an ``evaluated`` record with its result and a
+    fingerprint of the fields it was evaluated on, and every comment Jira
+    accepted gets a ``posted`` record. Records are buffered and written in
+    batches of ``flush_records`` or every ``flush_seconds``, whichever comes
+    first, so the journal never waits on the disk per story. A crash loses
+    at most the last unflushed batch; those stories are simply redone, and
+    with JIRA_UPDATE_EXISTING_COMMENTS their comments are edited in place
+    rather than duplicated.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        resume: bool = False,
+        flush_records: int = 100,
+        flush_seconds: float = 2.0,
+    ) -> None:
+        """
+        :param path: Journal file
+        :param resume: Replay an existing journal and append to it instead of starting over
+        :param flush_records: Buffered records that trigger a write
+        :param flush_seconds: Longest time a record stays buffered (checked on append)
+        """
+        self.path = path
+        self.flush_records = max(1, flush_records)
+        self.flush_seconds = flush_seconds
+
+        self._results: Dict[str, Tuple[str, EvaluationResult]] = {}
+        self._posted: Set[str] = set()
+        torn = resume and self._replay()
+
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        if torn:
+            # Terminate the torn line so the next record starts on its own
+            self._file.write("\n")
+
+    @property
+    def replayed(self) -> int:
+        return len(self._results)
+
+    def _replay(self) -> bool:
+        """
+        Loads the existing journal. Returns True if its last line is torn.
+        """
+        if not os.path.exists(self.path):
+            return False
+
+        line = ""
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from the crash; everything before it is intact
+                    continue
+                story_id = str(record.get("id"))
+                if record.get("event") == "evaluated" and NOT_EVALUATED not in record["explanations"]:
+                    result = (record["issues"], record["explanations"], record["ac_suggestion"])
+                    self._results[story_id] = (record["fingerprint"], result)
+                elif record.get("event") == "posted":
+                    self._posted.add(story_id)
+        return bool(line) and not line.endswith("\n")
+
+    def result_for(self, story: Dict[str, Any]) -> Optional[EvaluationResult]:
+        """
+        The journaled result for the story, or None if it was not evaluated
+        or its fields have changed since.
+        """
+        entry = self._results.get(str(story.get("id")))
+        if entry is None or entry[0] != RefinementState.fingerprint(story):
+            return None
+        issues, explanations, ac_suggestion = entry[1]
+        return list(issues), dict(explanations), ac_suggestion
+
+    def was_posted(self, story: Dict[str, Any]) -> bool:
+        return str(story.get("id")) in self._posted and self.result_for(story) is not None
+
+    def record_evaluated(self, story: Dict[str, Any], result: EvaluationResult) -> bool:
+        """
+        Journals the story's result. Returns True if it was replayed from
+        the journal instead, and so is already on disk. Results whose LLM
+        checks were skipped or failed are not journaled, so that resuming
+        evaluates those stories again.
+        """
+        issues, explanations, ac_suggestion = result
+        if NOT_EVALUATED in explanations:
+            return False
+
+        story_id = str(story.get("id"))
+        fingerprint = RefinementState.fingerprint(story)
+        entry = self._results.get(story_id)
+        if entry is not None and entry[0] == fingerprint:
+            return True
+
+        self._append({
+            "event": "evaluated",
+            "id": story_id,
+            "fingerprint": fingerprint,
+            "issues": issues,
+            "explanations": explanations,
+            "ac_suggestion": ac_suggestion,
+        })
+        return False
+
+    def record_posted(self, story: Dict[str, Any]) -> None:
+        self._append({"event": "posted", "id": str(story.get("id"))})
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_records or \
+                    time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer or self._file.closed:
+            return
+        self._file.write("".join(self._buffer))
+        self._buffer.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self, completed: bool = False) -> None:
+        """
+        Flushes and closes the journal. A completed run has nothing left to
+        resume, so its journal is removed.
+        """
+        with self._lock:
+            self._flush_locked()
+            self._file.close()
+        if completed:
+            os.remove(self.path)
@@ -0,0 +1,128 @@
+# backlog_refinement_agent/llm_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class LLMCache:
+    """
+    On-disk cache of LLM completions keyed by a hash of model, prompts and
+    request parameters.
+
+    Entries expire after ``ttl_seconds`` and the least recently used entries
+    are evicted once the cache holds more than ``max_entries`` rows.
+    """
+
+    # Only check the size limit every N writes to keep inserts cheap
+    _EVICTION_INTERVAL = 100
+
+    def __init__(self, path: str, ttl_seconds: int = 0, max_entries: int = 0) -> None:
+        """
+        :param path: SQLite database file (":memory:" for a throwaway cache)
+        :param ttl_seconds: Entry lifetime; 0 disables expiry
+        :param max_entries: Maximum number of rows kept; 0 disables eviction
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._writes = 0
+        # Worker processes may share the file; wait for their writes instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)"
+        )
+        self._purge_expired()
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str, **params: Any) -> str:
+        material = json.dumps(
+            {
+                "model": model,
+                "system": system_prompt,
+                "user": user_prompt,
+                "params": params,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or self._is_expired(row[1], now):
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE completions SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % self._EVICTION_INTERVAL == 0:
+                self._purge_expired()
+                self._evict_over_limit()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict_over_limit()
+            self._conn.commit()
+            self._conn.close()
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and created_at + self.ttl_seconds < now
+
+    def _purge_expired(self) -> None:
+        if self.ttl_seconds:
+            self._conn.execute(
+                "DELETE FROM completions WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+
+    def _evict_over_limit(self) -> None:
+        if not self.max_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                " SELECT key FROM completions ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
@@ -1,10 +1,204 @@
-from typing import Tuple
-from openai import OpenAI
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from .config import settings
+from .llm_cache import LLMCache
+from .llm_usage import LLMBudgetExceeded, UsageTracker
+from .metrics import metrics
+from .tokens import truncate_to_budget
 
 
-client = OpenAI(api_key=settings.openai.api_key)
+# Built on first use by ``get_client``; benchmarks may assign a stub here
+client: Optional[Any] = None
+_client_lock = threading.Lock()
+
+# Caps the number of completions in flight across all evaluation threads;
+# sized from LLM_CONCURRENCY on first use unless one is installed
+_llm_slots: Optional[Any] = None
+_configured = False
+
+# Prices and run ceilings are applied from settings on first use
+usage = UsageTracker()
+
+
+class Unevaluated(str):
+    """
+    Stands in for a verdict or suggestion the LLM did not give, because the
+    run's budget was reached or the call failed. Callers check for it with
+    ``isinstance`` so such stories are not treated as evaluated.
+    """
+
+
+_BUDGET_EXPLANATION = Unevaluated("LLM evaluation skipped: the LLM budget for this run has been reached.")
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_client() -> Any:
+    """
+    Returns the shared OpenAI client, importing the SDK and building the
+    client on first use.
+    """
+    global client
+    if client is None:
+        with _client_lock:
+            if client is None:
+                from openai import OpenAI
+
+                client = OpenAI(api_key=settings.openai.api_key, base_url=settings.openai.base_url or None)
+    return client
+
+
+def install_llm_slots(slots: Any) -> None:
+    """
+    Caps completions with ``slots`` instead of a per-process semaphore,
+    e.g. a multiprocessing semaphore shared by worker processes.
+    Must be called before the first completion.
+    """
+    global _llm_slots
+    with _client_lock:
+        _llm_slots = slots
+
+
+def _setup() -> Any:
+    """
+    Applies the run's LLM settings on first use: the concurrency cap and
+    the prices and ceilings used by ``usage``.
+    """
+    global _llm_slots, _configured
+    if not _configured:
+        with _client_lock:
+            if not _configured:
+                usage.configure(
+                    prompt_price_per_1k=settings.openai.prompt_price_per_1k,
+                    completion_price_per_1k=settings.openai.completion_price_per_1k,
+                    max_run_tokens=settings.openai.max_run_tokens,
+                    max_run_cost_usd=settings.openai.max_run_cost_usd,
+                )
+                if _llm_slots is None:
+                    _llm_slots = threading.BoundedSemaphore(max(1, settings.openai.max_concurrency))
+                _configured = True
+    return _llm_slots
+
+
+def get_cache() -> Optional[LLMCache]:
+    """
+    Returns the shared completion cache, opening it on first use.
+    Returns None when LLM_CACHE_ENABLED is off.
+    """
+    global _cache
+    if not settings.cache.enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                settings.cache.path,
+                ttl_seconds=settings.cache.ttl_seconds,
+                max_entries=settings.cache.max_entries,
+            )
+    return _cache
+
+
+def cache_stats() -> Dict[str, int]:
+    cache = _cache
+    if cache is None:
+        return {"hits": 0, "misses": 0}
+    return {"hits": cache.hits, "misses": cache.misses}
+
+
+def _create_completion(**kwargs: Any) -> Any:
+    with _setup():
+        return get_client().chat.completions.create(**kwargs)
+
+
+def _limit_input(text: str, max_tokens: Optional[int] = None) -> str:
+    budget = settings.openai.max_input_tokens if max_tokens is None else max_tokens
+    return truncate_to_budget(text, budget, settings.openai.model)
+
+
+def _complete(
+    system_prompt: str,
+    user_prompt: str,
+    max_tokens: int,
+    temperature: float,
+    kind: str,
+    json_output: bool = False,
+    validate: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """
+    Returns the completion text for the given prompts, serving repeats from
+    the on-disk cache. Failed calls raise and are never cached.
+
+    With ``json_output`` the model is asked for a JSON object through
+    ``response_format``. With ``validate``, only completions it accepts are
+    cached or served from the cache, so retrying a malformed response asks
+    the model again instead of replaying it.
+
+    Uncached calls are recorded under ``kind`` in ``usage`` and raise
+    ``LLMBudgetExceeded`` once the run's spend ceiling is reached.
+    """
+    model = settings.openai.model
+    cache = get_cache()
+    key = None
+
+    extra: Dict[str, Any] = {}
+    if json_output:
+        extra["response_format"] = {"type": "json_object"}
+
+    if cache is not None:
+        key = LLMCache.make_key(
+            model,
+            system_prompt,
+            user_prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **extra,
+        )
+        cached = cache.get(key)
+        if cached is not None and (validate is None or validate(cached)):
+            return cached
+
+    _setup()
+    usage.check_budget()
+    # Build the client before timing so its first-use import is not counted as latency
+    get_client()
+    started = time.perf_counter()
+    response = _create_completion(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=temperature,
+        **extra
+    )
+    latency = time.perf_counter() - started
+    usage.record(kind, getattr(response, "usage", None), latency)
+    metrics.observe(f"llm_{kind}", latency)
+
+    content = response.choices[0].message.content.strip()
+
+    if cache is not None and (validate is None or validate(content)):
+        cache.set(key, content)
+    return content
+
+
+_CLASSIFICATION = re.compile(r"^\s*\**classification\**\s*:\s*\**\s*([A-Za-z]+)", re.IGNORECASE | re.MULTILINE)
+
+
+def _classification(content: str) -> Optional[str]:
+    """
+    Returns the label from a "Classification: X" line, capitalised, or None.
+    """
+    match = _CLASSIFICATION.search(content)
+    return match.group(1).capitalize() if match else None
+
 
 def is_vague_summary_with_llm(summary: str) -> tuple[bool, str]:
     if not summary or not isinstance(summary, str) or len(summary.strip()) < 5:
@@ -22,24 +216,27 @@ def is_vague_summary_with_llm(summary: str) -> tuple[bool, str]:
 
         user_prompt = f"Summary: {summary.strip()}"
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+        content = _complete(
+            system_prompt,
+            user_prompt,
             max_tokens=150,
-            temperature=0
+            temperature=0,
+            kind="summary",
         )
 
-        content = response.choices[0].message.content.strip()
-
-        is_vague = any(keyword in content.lower() for keyword in ["vague", "unclear", "misleading"])
+        label = _classification(content)
+        if label in ("Vague", "Clear"):
+            is_vague = label == "Vague"
+        else:
+            is_vague = any(keyword in content.lower() for keyword in ["vague", "unclear", "misleading"])
         return is_vague, content
 
+    except LLMBudgetExceeded:
+        return False, _BUDGET_EXPLANATION
     except Exception as e:
+        metrics.incr("llm_errors")
         print("⚠️ LLM summary evaluation failed:", e)
-        return False, "LLM evaluation failed due to an error."    
+        return False, Unevaluated("LLM evaluation failed due to an error.")
 
 
 def is_valid_acceptance_criteria_with_llm(description: str) -> tuple[bool, str]:
@@ -56,26 +253,29 @@ def is_valid_acceptance_criteria_with_llm(description: str) -> tuple[bool, str]:
     "Explanation: [1 to 2 line reasoning]"
         )
 
-        user_prompt = f"Description: {description.strip()}"
+        user_prompt = f"Description: {_limit_input(description.strip())}"
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+        content = _complete(
+            system_prompt,
+            user_prompt,
             max_tokens=100,
-            temperature=0
+            temperature=0,
+            kind="description",
         )
 
-        content = response.choices[0].message.content.strip()
-
-        is_incomplete = any(term in content.lower() for term in ["incomplete", "missing", "unclear", "does not", "not present"])
+        label = _classification(content)
+        if label in ("Complete", "Incomplete"):
+            is_incomplete = label == "Incomplete"
+        else:
+            is_incomplete = any(term in content.lower() for term in ["incomplete", "missing", "unclear", "does not", "not present"])
         return is_incomplete, content
 
+    except LLMBudgetExceeded:
+        return False, _BUDGET_EXPLANATION
     except Exception as e:
+        metrics.incr("llm_errors")
         print("LLM description evaluation failed:", e)
-        return False, "LLM evaluation failed."
+        return False, Unevaluated("LLM evaluation failed.")
 
 
 def suggest_acceptance_criteria_with_llm(summary: str, description: str) -> str:
@@ -92,22 +292,326 @@ def suggest_acceptance_criteria_with_llm(summary: str, description: str) -> str:
         user_prompt = f"""
 Summary: {summary.strip()}
 
-Description: {description.strip()}
+Description: {_limit_input(description.strip())}
 """
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+        content = _complete(
+            system_prompt,
+            user_prompt,
             max_tokens=200,
-            temperature=0.2
+            temperature=0.2,
+            kind="suggestion",
         )
-
-        content = response.choices[0].message.content.strip()
         return content
 
+    except LLMBudgetExceeded:
+        return _BUDGET_EXPLANATION
     except Exception as e:
+        metrics.incr("llm_errors")
         print("LLM acceptance criteria suggestion failed:", e)
-        return "(Suggestion failed due to LLM error)"
+        return Unevaluated("(Suggestion failed due to LLM error)")
+
+
+_SUMMARY_BATCH_PROMPT = (
+    "You are a senior product manager conducting a backlog refinement session. "
+    "Your task is to evaluate each Jira story summary below and determine whether it is clear, specific, and actionable "
+    "based on standard Agile Product Development practices. "
+    "The input is a JSON array of objects with an \"id\" and a \"text\". "
+    "Respond with only a JSON array containing one object per input item, in the form:\n\n"
+    "{\"id\": \"<id>\", \"classification\": \"Vague\" or \"Clear\", \"explanation\": \"<1 to 2 line reasoning>\"}"
+)
+
+_DESCRIPTION_BATCH_PROMPT = (
+    "You are a senior product manager reviewing Jira story descriptions. "
+    "Your task is to evaluate whether each description below contains clear and testable acceptance criteria, "
+    "as typically required in Agile Product Development. "
+    "The input is a JSON array of objects with an \"id\" and a \"text\". "
+    "Respond with only a JSON array containing one object per input item, in the form:\n\n"
+    "{\"id\": \"<id>\", \"classification\": \"Complete\" or \"Incomplete\", \"explanation\": \"<1 to 2 line reasoning>\"}"
+)
+
+# Completion tokens reserved per item in a batch response
+_BATCH_TOKENS_PER_ITEM = 80
+_BATCH_MAX_ATTEMPTS = 2
+
+
+def _strip_code_fence(content: str) -> str:
+    text = content.strip()
+    if text.startswith("```"):
+        # Tolerate a fenced code block around the JSON
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    return text
+
+
+def _parse_batch_response(
+    content: str,
+    expected_ids: List[str],
+    labels: Dict[str, bool],
+) -> Dict[str, Tuple[bool, str, str]]:
+    """
+    Validates a batch response and returns ``{id: (flagged, classification, explanation)}``
+    for every well-formed item. Malformed or unknown items are left out.
+    """
+    try:
+        items = json.loads(_strip_code_fence(content))
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    expected = set(expected_ids)
+    parsed: Dict[str, Tuple[bool, str, str]] = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id = str(item.get("id", ""))
+        classification = str(item.get("classification", "")).strip().capitalize()
+        explanation = item.get("explanation")
+        if item_id not in expected or classification not in labels:
+            continue
+        if not isinstance(explanation, str) or not explanation.strip():
+            continue
+        parsed[item_id] = (labels[classification], classification, explanation.strip())
+    return parsed
+
+
+def _classify_batch(
+    texts: Dict[str, str],
+    system_prompt: str,
+    labels: Dict[str, bool],
+    batch_size: int,
+    kind: str,
+) -> Tuple[Dict[str, Tuple[bool, str]], List[str]]:
+    """
+    Classifies ``texts`` in chunks of ``batch_size`` per completion.
+
+    Items that fail to parse are retried in a smaller follow-up batch; the
+    ids still unresolved after ``_BATCH_MAX_ATTEMPTS`` are returned so the
+    caller can fall back to one request per item.
+    """
+    model = settings.openai.model
+    cache = get_cache()
+    results: Dict[str, Tuple[bool, str]] = {}
+    keys: Dict[str, str] = {}
+    pending: List[str] = []
+
+    # Share the input budget across the items packed into one prompt
+    item_budget = settings.openai.max_input_tokens // batch_size
+    if settings.openai.max_input_tokens:
+        item_budget = max(item_budget, 256)
+    texts = {item_id: _limit_input(text.strip(), item_budget) for item_id, text in texts.items()}
+
+    for item_id, text in texts.items():
+        if cache is not None:
+            keys[item_id] = LLMCache.make_key(model, system_prompt, text.strip(), batch=True)
+            cached = cache.get(keys[item_id])
+            if cached is not None:
+                record = json.loads(cached)
+                results[item_id] = (record["flagged"], record["content"])
+                continue
+        pending.append(item_id)
+
+    for _ in range(_BATCH_MAX_ATTEMPTS):
+        if not pending:
+            break
+
+        failed: List[str] = []
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            user_prompt = json.dumps(
+                [{"id": item_id, "text": texts[item_id].strip()} for item_id in chunk]
+            )
+
+            try:
+                content = _complete(
+                    system_prompt,
+                    user_prompt,
+                    max_tokens=_BATCH_TOKENS_PER_ITEM * len(chunk),
+                    temperature=0,
+                    kind=f"{kind}_batch",
+                    # Only fully parsed responses are cached, so retrying the
+                    # same chunk reaches the model instead of the bad reply
+                    validate=lambda content: len(_parse_batch_response(content, chunk, labels)) == len(chunk),
+                )
+            except LLMBudgetExceeded:
+                failed.extend(chunk)
+                continue
+            except Exception as e:
+                metrics.incr("llm_errors")
+                print("LLM batch classification failed:", e)
+                failed.extend(chunk)
+                continue
+
+            parsed = _parse_batch_response(content, chunk, labels)
+            for item_id in chunk:
+                if item_id not in parsed:
+                    failed.append(item_id)
+                    continue
+                flagged, classification, explanation = parsed[item_id]
+                item_content = f"Classification: {classification}\nExplanation: {explanation}"
+                results[item_id] = (flagged, item_content)
+                if cache is not None:
+                    cache.set(keys[item_id], json.dumps({"flagged": flagged, "content": item_content}))
+
+        pending = failed
+
+    return results, pending
+
+
+def classify_summaries_batch(
+    summaries: Dict[str, str],
+    batch_size: Optional[int] = None,
+) -> Dict[str, Tuple[bool, str]]:
+    """
+    Batch counterpart of ``is_vague_summary_with_llm``.
+
+    Packs up to ``batch_size`` summaries into each completion and returns
+    ``{id: (is_vague, explanation)}`` for every input id.
+    """
+    batch_size = max(1, batch_size or settings.openai.batch_size)
+    results: Dict[str, Tuple[bool, str]] = {}
+    to_classify: Dict[str, str] = {}
+
+    for item_id, summary in summaries.items():
+        if not summary or not isinstance(summary, str) or len(summary.strip()) < 5:
+            results[item_id] = (True, "Summary is too short to evaluate clearly.")
+        else:
+            to_classify[item_id] = summary
+
+    classified, unresolved = _classify_batch(
+        to_classify, _SUMMARY_BATCH_PROMPT, {"Vague": True, "Clear": False}, batch_size, "summary"
+    )
+    results.update(classified)
+    for item_id in unresolved:
+        results[item_id] = is_vague_summary_with_llm(to_classify[item_id])
+    return results
+
+
+def classify_descriptions_batch(
+    descriptions: Dict[str, str],
+    batch_size: Optional[int] = None,
+) -> Dict[str, Tuple[bool, str]]:
+    """
+    Batch counterpart of ``is_valid_acceptance_criteria_with_llm``.
+
+    Packs up to ``batch_size`` descriptions into each completion and returns
+    ``{id: (is_incomplete, explanation)}`` for every input id.
+    """
+    batch_size = max(1, batch_size or settings.openai.batch_size)
+    results: Dict[str, Tuple[bool, str]] = {}
+    to_classify: Dict[str, str] = {}
+
+    for item_id, description in descriptions.items():
+        if not description or not isinstance(description, str) or len(description.strip()) < 10:
+            results[item_id] = (True, "Description is too short to contain meaningful acceptance criteria.")
+        else:
+            to_classify[item_id] = description
+
+    classified, unresolved = _classify_batch(
+        to_classify, _DESCRIPTION_BATCH_PROMPT, {"Incomplete": True, "Complete": False}, batch_size, "description"
+    )
+    results.update(classified)
+    for item_id in unresolved:
+        results[item_id] = is_valid_acceptance_criteria_with_llm(to_classify[item_id])
+    return results
+
+
+_COMBINED_PROMPT = (
+    "You are a senior product manager conducting a backlog refinement session. "
+    "Review the Jira story below based on standard Agile Product Development practices:\n"
+    "1. Is the summary clear, specific, and actionable?\n"
+    "2. Does the description contain clear and testable acceptance criteria?\n"
+    "3. If the acceptance criteria are incomplete, suggest clear, specific, and testable acceptance criteria.\n\n"
+    "Respond with only a JSON object in the form:\n"
+    "{\"summary\": {\"classification\": \"Vague\" or \"Clear\", \"explanation\": \"<1 to 2 line reasoning>\"}, "
+    "\"acceptance_criteria\": {\"classification\": \"Complete\" or \"Incomplete\", \"explanation\": \"<1 to 2 line reasoning>\"}, "
+    "\"suggested_acceptance_criteria\": [\"<criterion>\", ...]}\n"
+    "Leave suggested_acceptance_criteria empty when the acceptance criteria are complete."
+)
+
+_COMBINED_MAX_ATTEMPTS = 2
+
+CombinedEvaluation = Tuple[Tuple[bool, str], Tuple[bool, str], str]
+
+
+def _parse_verdict(value: Any, labels: Dict[str, bool]) -> Optional[Tuple[bool, str]]:
+    if not isinstance(value, dict):
+        return None
+    classification = str(value.get("classification", "")).strip().capitalize()
+    explanation = value.get("explanation")
+    if classification not in labels or not isinstance(explanation, str) or not explanation.strip():
+        return None
+    return labels[classification], f"Classification: {classification}\nExplanation: {explanation.strip()}"
+
+
+def _parse_combined_response(content: str) -> Optional[CombinedEvaluation]:
+    """
+    Validates a combined evaluation and returns
+    ``((is_vague, explanation), (is_incomplete, explanation), suggestion)``,
+    or None if any part is missing or malformed.
+    """
+    try:
+        data = json.loads(_strip_code_fence(content))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    summary = _parse_verdict(data.get("summary"), {"Vague": True, "Clear": False})
+    criteria = _parse_verdict(data.get("acceptance_criteria"), {"Incomplete": True, "Complete": False})
+    if summary is None or criteria is None:
+        return None
+
+    suggested = data.get("suggested_acceptance_criteria") or []
+    if isinstance(suggested, str):
+        suggested = suggested.splitlines()
+    if not isinstance(suggested, list):
+        return None
+    items = [str(item).strip().lstrip("-*• ").strip() for item in suggested if str(item).strip()]
+
+    suggestion = ""
+    if items:
+        suggestion = "Suggested Acceptance Criteria\n\n" + "\n".join(f"- {item}" for item in items)
+    return summary, criteria, suggestion
+
+
+def evaluate_story_with_llm(summary: str, description: str) -> Optional[CombinedEvaluation]:
+    """
+    Evaluates summary and acceptance criteria and drafts criteria in one
+    completion with a JSON response, instead of three separate calls.
+
+    Returns ``((is_vague, explanation), (is_incomplete, explanation), suggestion)``,
+    or None when no valid JSON came back after retrying, so the caller can
+    fall back to the separate checks.
+    """
+    user_prompt = json.dumps({
+        "summary": (summary or "").strip(),
+        "description": _limit_input((description or "").strip()),
+    })
+
+    for _ in range(_COMBINED_MAX_ATTEMPTS):
+        try:
+            content = _complete(
+                _COMBINED_PROMPT,
+                user_prompt,
+                max_tokens=400,
+                temperature=0,
+                kind="combined",
+                json_output=True,
+                validate=lambda content: _parse_combined_response(content) is not None,
+            )
+        except LLMBudgetExceeded:
+            # The suggestion too: a rule-based verdict may already have flagged the description
+            return (False, _BUDGET_EXPLANATION), (False, _BUDGET_EXPLANATION), _BUDGET_EXPLANATION
+        except Exception as e:
+            metrics.incr("llm_errors")
+            print("LLM combined evaluation failed:", e)
+            return None
+
+        parsed = _parse_combined_response(content)
+        if parsed is not None:
+            return parsed
+        metrics.incr("llm_invalid_json")
+    return None
@@ -0,0 +1,167 @@
+# backlog_refinement_agent/llm_usage.py
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import Reservoir, percentile
+
+
+class LLMBudgetExceeded(Exception):
+    """Raised instead of making a completion once the run's spend ceiling is reached."""
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latencies: Reservoir = field(default_factory=Reservoir)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class UsageTracker:
+    """
+    Per-run accounting of completions, grouped by call kind.
+
+    Token counts come from ``response.usage``. Cost is estimated from the
+    configured per-1k-token prices and checked against the run ceilings
+    before every uncached completion. The ceilings count from the start of
+    the run, or from the last ``start_budget_window`` in a process that
+    runs indefinitely such as the daemon; the totals always cover the run.
+    """
+
+    def __init__(
+        self,
+        prompt_price_per_1k: float = 0.0,
+        completion_price_per_1k: float = 0.0,
+        max_run_tokens: int = 0,
+        max_run_cost_usd: float = 0.0,
+    ) -> None:
+        self.prompt_price_per_1k = prompt_price_per_1k
+        self.completion_price_per_1k = completion_price_per_1k
+        self.max_run_tokens = max_run_tokens
+        self.max_run_cost_usd = max_run_cost_usd
+        self.max_run_calls = 0
+        self.by_kind: Dict[str, CallStats] = {}
+        self.budget_exhausted = False
+        # (calls, prompt tokens, completion tokens) when the budget window started
+        self._window_start: Tuple[int, int, int] = (0, 0, 0)
+        self._lock = threading.Lock()
+
+    def configure(
+        self,
+        prompt_price_per_1k: float,
+        completion_price_per_1k: float,
+        max_run_tokens: int,
+        max_run_cost_usd: float,
+    ) -> None:
+        """
+        Sets prices and ceilings after construction, e.g. once settings are loaded.
+        """
+        with self._lock:
+            self.prompt_price_per_1k = prompt_price_per_1k
+            self.completion_price_per_1k = completion_price_per_1k
+            self.max_run_tokens = max_run_tokens
+            self.max_run_cost_usd = max_run_cost_usd
+
+    def limit_calls(self, max_run_calls: int) -> None:
+        """
+        Caps the number of completions this run, e.g. for a scheduler's call budget.
+        """
+        with self._lock:
+            self.max_run_calls = max_run_calls
+
+    def record(self, kind: str, usage: Any, latency: float) -> None:
+        """
+        :param kind: Call type, e.g. "summary" or "suggestion"
+        :param usage: ``response.usage`` from the OpenAI client (may be None)
+        :param latency: Wall-clock seconds spent on the call
+        """
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        with self._lock:
+            stats = self.by_kind.setdefault(kind, CallStats())
+            stats.calls += 1
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.latencies.add(latency)
+
+    def totals(self) -> CallStats:
+        with self._lock:
+            total = CallStats()
+            for stats in self.by_kind.values():
+                total.calls += stats.calls
+                total.prompt_tokens += stats.prompt_tokens
+                total.completion_tokens += stats.completion_tokens
+                total.latencies.merge(stats.latencies)
+        return total
+
+    def calls(self) -> int:
+        """
+        Completions made this run; cheaper than ``totals`` when only the count matters.
+        """
+        with self._lock:
+            return sum(stats.calls for stats in self.by_kind.values())
+
+    def start_budget_window(self) -> None:
+        """
+        Counts the run ceilings afresh from now, lifting an exhausted budget.
+        """
+        with self._lock:
+            self._window_start = self._spent_locked()
+            exhausted = self.budget_exhausted
+            self.budget_exhausted = False
+        if exhausted:
+            print("LLM budget window restarted; resuming LLM calls.")
+
+    def _spent_locked(self) -> Tuple[int, int, int]:
+        return (
+            sum(stats.calls for stats in self.by_kind.values()),
+            sum(stats.prompt_tokens for stats in self.by_kind.values()),
+            sum(stats.completion_tokens for stats in self.by_kind.values()),
+        )
+
+    def cost_usd(self, stats: Optional[CallStats] = None) -> float:
+        stats = stats or self.totals()
+        return (
+            stats.prompt_tokens / 1000 * self.prompt_price_per_1k
+            + stats.completion_tokens / 1000 * self.completion_price_per_1k
+        )
+
+    def check_budget(self) -> None:
+        """
+        Raises ``LLMBudgetExceeded`` once any run ceiling has been reached.
+        """
+        if self.budget_exhausted:
+            raise LLMBudgetExceeded("LLM budget for this run has been reached")
+        if not self.max_run_tokens and not self.max_run_cost_usd and not self.max_run_calls:
+            return
+
+        with self._lock:
+            spent = self._spent_locked()
+            totals = CallStats(*(now - start for now, start in zip(spent, self._window_start)))
+        over_tokens = self.max_run_tokens and totals.total_tokens >= self.max_run_tokens
+        over_cost = self.max_run_cost_usd and self.cost_usd(totals) >= self.max_run_cost_usd
+        over_calls = self.max_run_calls and totals.calls >= self.max_run_calls
+        if over_tokens or over_cost or over_calls:
+            with self._lock:
+                first = not self.budget_exhausted
+                self.budget_exhausted = True
+            if first:
+                print(
+                    f"LLM budget reached ({totals.total_tokens} tokens, "
+                    f"${self.cost_usd(totals):.2f}); skipping further LLM calls this run."
+                )
+            raise LLMBudgetExceeded("LLM budget for this run has been reached")
+
+    def summary_line(self) -> str:
+        totals = self.totals()
+        p50 = percentile(totals.latencies.values, 0.50)
+        return (
+            f"LLM usage: {totals.calls} calls, {totals.prompt_tokens} prompt + "
+            f"{totals.completion_tokens} completion tokens, ~${self.cost_usd(totals):.4f}, "
+            f"p50 latency {p50 * 1000:.0f} ms"
+        )
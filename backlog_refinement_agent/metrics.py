@@ -0,0 +1,211 @@
+# backlog_refinement_agent/metrics.py
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Sequence
+
+_PROMETHEUS_PREFIX = "backlog_refinement"
+
+# Durations kept per stage for percentiles; enough for ~1% accuracy at p95
+_SAMPLE_SIZE = 10_000
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of ``values``; 0.0 for an empty sequence.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class Reservoir:
+    """
+    Uniform sample of at most ``size`` values from a stream, with the exact
+    count, total and maximum, so a long-running process keeps percentiles
+    without keeping every value. Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, size: int = _SAMPLE_SIZE) -> None:
+        self.size = size
+        self.values: List[float] = []
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if len(self.values) < self.size:
+            self.values.append(value)
+            return
+        # Algorithm R: the n-th value replaces a sample with probability size/n
+        slot = random.randrange(self.count)
+        if slot < self.size:
+            self.values[slot] = value
+
+    def merge(self, other: "Reservoir") -> None:
+        """
+        Adds another reservoir's values, keeping each side in proportion to its count.
+        """
+        count = self.count + other.count
+        if len(self.values) + len(other.values) <= self.size:
+            self.values = self.values + other.values
+        elif count:
+            own = min(len(self.values), round(self.size * self.count / count))
+            theirs = min(len(other.values), self.size - own)
+            self.values = random.sample(self.values, own) + random.sample(other.values, theirs)
+        self.count = count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def export(self) -> Dict[str, Any]:
+        return {"values": list(self.values), "count": self.count, "total": self.total, "max": self.max}
+
+    @classmethod
+    def from_export(cls, exported: Dict[str, Any]) -> "Reservoir":
+        reservoir = cls()
+        reservoir.values = list(exported["values"])
+        reservoir.count = exported["count"]
+        reservoir.total = exported["total"]
+        reservoir.max = exported["max"]
+        return reservoir
+
+
+class Metrics:
+    """
+    Process-wide timings and counters for one refinement run.
+
+    Stages are timed with ``timer`` (or ``observe`` for durations measured
+    elsewhere) and summarised as count, total, p50, p95 and max; the
+    percentiles come from a bounded ``Reservoir`` per stage, so memory stays
+    flat in the daemon. Counters are plain numbers. Both are safe to update
+    from worker threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.timings: Dict[str, Reservoir] = defaultdict(Reservoir)
+        self.counters: Dict[str, float] = defaultdict(int)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[stage].add(seconds)
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def incr(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters[name] = value
+
+    def export(self) -> Dict[str, Any]:
+        """
+        Returns the raw timings and counters, e.g. to send from a worker
+        process to ``merge`` in the parent.
+        """
+        with self._lock:
+            return {
+                "timings": {stage: samples.export() for stage, samples in self.timings.items()},
+                "counters": dict(self.counters),
+            }
+
+    def merge(self, exported: Dict[str, Any]) -> None:
+        """
+        Adds another process's ``export()`` to these metrics.
+        """
+        with self._lock:
+            for stage, samples in exported.get("timings", {}).items():
+                self.timings[stage].merge(Reservoir.from_export(samples))
+            for name, value in exported.get("counters", {}).items():
+                self.counters[name] += value
+
+    def stage_summary(self, stage: str) -> Dict[str, float]:
+        with self._lock:
+            samples = self.timings.get(stage) or Reservoir()
+            count, total, longest = samples.count, samples.total, samples.max
+            values = list(samples.values)
+        return {
+            "count": count,
+            "total_seconds": total,
+            "p50_seconds": percentile(values, 0.50),
+            "p95_seconds": percentile(values, 0.95),
+            "max_seconds": longest,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = sorted(self.timings)
+            counters = dict(sorted(self.counters.items()))
+        return {
+            "started_at": self.started,
+            "duration_seconds": time.time() - self.started,
+            "stages": {stage: self.stage_summary(stage) for stage in stages},
+            "counters": counters,
+        }
+
+    def write_json(self, path: str) -> None:
+        """
+        Writes ``report()`` to ``path``, replacing any previous report.
+        """
+        _write_atomically(path, json.dumps(self.report(), indent=2, sort_keys=True) + "\n")
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Writes the report in the Prometheus text format, for the node
+        exporter's textfile collector.
+        """
+        report = self.report()
+        name = f"{_PROMETHEUS_PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent per pipeline stage in the last run.",
+            f"# TYPE {name} summary",
+        ]
+        for stage, summary in report["stages"].items():
+            label = f'stage="{stage}"'
+            lines.append(f'{name}{{{label},quantile="0.5"}} {summary["p50_seconds"]:.6f}')
+            lines.append(f'{name}{{{label},quantile="0.95"}} {summary["p95_seconds"]:.6f}')
+            lines.append(f"{name}_sum{{{label}}} {summary['total_seconds']:.6f}")
+            lines.append(f"{name}_count{{{label}}} {summary['count']}")
+
+        for counter, value in report["counters"].items():
+            metric = f"{_PROMETHEUS_PREFIX}_{counter}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        lines.append(f"# TYPE {_PROMETHEUS_PREFIX}_run_duration_seconds gauge")
+        lines.append(f"{_PROMETHEUS_PREFIX}_run_duration_seconds {report['duration_seconds']:.3f}")
+        lines.append(f"# TYPE {_PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{_PROMETHEUS_PREFIX}_last_run_timestamp_seconds {report['started_at']:.0f}")
+        _write_atomically(path, "\n".join(lines) + "\n")
+
+
+def _write_atomically(path: str, text: str) -> None:
+    # Readers such as the textfile collector must never see a partial file
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+metrics = Metrics()
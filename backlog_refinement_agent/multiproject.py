@@ -0,0 +1,254 @@
+# backlog_refinement_agent/multiproject.py
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .cli import (
+    collect_run_metrics,
+    incremental_stories,
+    open_history,
+    open_journal,
+    print_slack_stats,
+    refine_and_post,
+    scheduled_stories,
+    write_run_report,
+)
+from .config import settings
+from .metrics import metrics
+from .slack_summary import DigestCounts
+from .story import Story
+
+
+@dataclass
+class Shard:
+    """
+    One slice of the backlog refined by a single worker process: either a
+    project's refinement query or an explicit JQL query.
+    """
+
+    name: str
+    project_key: Optional[str] = None
+    jql: Optional[str] = None
+
+
+@dataclass
+class ShardResult:
+    name: str
+    stories: int = 0
+    flagged: int = 0
+    comments_written: int = 0
+    comments_failed: int = 0
+    skipped_unchanged: int = 0
+    deferred: int = 0
+    not_evaluated: int = 0
+    elapsed_seconds: float = 0.0
+    digest: DigestCounts = field(default_factory=DigestCounts)
+    # The worker's ``metrics.export()``, merged into the combined report
+    metrics: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def _shard_file(path: str, shard: Shard) -> str:
+    if not path:
+        return path
+    base, extension = os.path.splitext(path)
+    return f"{base}.{re.sub(r'[^A-Za-z0-9_-]+', '_', shard.name)}{extension}"
+
+
+# Locks striped by issue key so shards whose queries overlap don't both
+# create a comment on the same issue
+_ISSUE_LOCK_STRIPES = 64
+
+
+def _init_worker(jira_rate_limiter: Any, llm_slots: Any, issue_locks: Sequence[Any]) -> None:
+    from .comment_writer import install_issue_locks
+    from .llm_client import install_llm_slots
+    from .transport import install_rate_limiter
+
+    install_rate_limiter("jira", jira_rate_limiter)
+    install_llm_slots(llm_slots)
+    install_issue_locks(issue_locks)
+
+
+def _run_shard(
+    shard: Shard,
+    dry_run: bool,
+    resume: bool = False,
+    deadline_at: Optional[float] = None,
+    max_llm_calls: Optional[int] = None,
+) -> ShardResult:
+    """
+    Fetches, evaluates and comments on one shard. Runs in a worker process;
+    Slack delivery is left to the parent, which merges every shard's digest.
+
+    :param deadline_at: The run's ``time.time()`` deadline; a shard that starts
+        after it defers all its stories
+    """
+    from .jira_client import iter_issues_from_jira
+
+    started = time.monotonic()
+    run_started = time.time()
+    result = ShardResult(shard.name)
+
+    def load(updated_since_minutes: Optional[int]) -> Iterable[Story]:
+        return iter_issues_from_jira(
+            project_key=shard.project_key,
+            jql=shard.jql,
+            updated_since_minutes=updated_since_minutes,
+        )
+
+    try:
+        state = None
+        skipped: List[str] = []
+        if settings.refinement.incremental and not dry_run:
+            state, stories = incremental_stories(
+                load, _shard_file(settings.refinement.state_file, shard), skipped
+            )
+        else:
+            stories = load(None)
+
+        # The parent resolved the deadline into deadline_at
+        scheduler, stories = scheduled_stories(stories, state, 0, max_llm_calls, deadline_at)
+
+        writer = journal = history = None
+        if not dry_run:
+            from .comment_writer import CommentWriter
+
+            writer = CommentWriter()
+            journal = open_journal(_shard_file(settings.refinement.journal_file, shard), resume)
+            # Shards share one history; each records its own run
+            history = open_history(settings.refinement.history_file, shard.name)
+
+        completed = False
+        try:
+            result.not_evaluated = refine_and_post(stories, writer, result.digest, state, journal, scheduler, history)
+            completed = True
+        finally:
+            comment_stats = writer.close() if writer is not None else None
+            if journal is not None:
+                journal.close(completed=completed)
+            if history is not None:
+                history.close(metrics.report(), completed=completed)
+
+        deferred = False
+        if scheduler is not None:
+            scheduler.report(_shard_file(settings.refinement.deferred_file, shard))
+            deferred = bool(scheduler.stats.deferred)
+            result.deferred = len(scheduler.stats.deferred)
+
+        if state is not None:
+            # Failed comments are left out of the state; keeping the watermark refetches them
+            failed_comments = comment_stats.failed if comment_stats is not None else 0
+            state.save(watermark=None if deferred or result.not_evaluated or failed_comments else run_started)
+            metrics.set("skipped_unchanged", len(skipped))
+            result.skipped_unchanged = len(skipped)
+
+        collect_run_metrics(comment_stats)
+        if comment_stats is not None:
+            result.comments_written = comment_stats.written
+            result.comments_failed = comment_stats.failed
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+
+    result.stories = int(metrics.counters.get("stories", 0))
+    result.flagged = int(metrics.counters.get("flagged", 0))
+    result.elapsed_seconds = time.monotonic() - started
+    result.metrics = metrics.export()
+    return result
+
+
+def run_shards(
+    shards: Sequence[Shard],
+    workers: Optional[int] = None,
+    dry_run: bool = False,
+    resume: bool = False,
+    deadline_seconds: Optional[float] = None,
+    max_llm_calls: Optional[int] = None,
+) -> List[ShardResult]:
+    """
+    Refines every shard in a pool of worker processes and merges the
+    results into one run report and one Slack digest.
+
+    Each worker runs fetch → evaluate → post on its own. Jira requests from
+    all workers draw from one shared JIRA_RATE_LIMIT_PER_SEC bucket, and
+    completions in flight are capped by LLM_CONCURRENCY across all workers.
+    LLM run budgets (LLM_MAX_RUN_TOKENS / LLM_MAX_RUN_COST_USD) apply per
+    worker. In incremental mode each shard keeps its own state file, and
+    each shard journals its progress to its own file for ``resume``. A
+    deadline counts from when the run starts and is shared by every shard,
+    so shards still queued when it passes defer all their stories; an LLM
+    call budget applies per shard.
+
+    :param shards: Projects or JQL queries to refine
+    :param workers: Worker processes (defaults to REFINEMENT_WORKERS)
+    :param dry_run: Evaluate without posting to Jira or Slack
+    :param resume: Continue each shard from its journal
+    :param deadline_seconds: Overrides REFINEMENT_DEADLINE_SECONDS
+    :param max_llm_calls: Overrides REFINEMENT_MAX_LLM_CALLS
+    """
+    from .transport import SharedTokenBucket
+
+    workers = max(1, min(len(shards), workers or settings.refinement.workers))
+    deadline_seconds = settings.refinement.deadline_seconds if deadline_seconds is None else deadline_seconds
+    deadline_at = time.time() + deadline_seconds if deadline_seconds else None
+    # Fresh interpreters: no inherited threads or locks, and per-run module
+    # state (metrics, usage, caches) starts empty for every shard
+    context = multiprocessing.get_context("spawn")
+    jira_rate_limiter = SharedTokenBucket(
+        settings.jira.rate_limit_per_sec, settings.jira.rate_limit_burst, context
+    )
+    llm_slots = context.BoundedSemaphore(max(1, settings.openai.max_concurrency))
+    issue_locks = [context.Lock() for _ in range(_ISSUE_LOCK_STRIPES)]
+
+    slack = None
+    if not dry_run:
+        from .slack_summary import SlackSummaryStream
+
+        slack = SlackSummaryStream(mode="digest")
+
+    print(f"Refining {len(shards)} shards with {workers} worker processes...")
+    results: List[ShardResult] = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(jira_rate_limiter, llm_slots, issue_locks),
+        max_tasks_per_child=1,
+    ) as pool:
+        futures = {pool.submit(_run_shard, shard, dry_run, resume, deadline_at, max_llm_calls): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died, e.g. killed or out of memory
+                result = ShardResult(shard.name, error=f"{type(e).__name__}: {e}")
+
+            results.append(result)
+            metrics.merge(result.metrics)
+            if slack is not None:
+                slack.merge(result.digest)
+
+            status = f"failed: {result.error}" if result.error else "done"
+            print(
+                f"[{result.name}] {status} - {result.stories} stories, {result.flagged} flagged, "
+                f"{result.comments_written} comments, {result.deferred} deferred in {result.elapsed_seconds:.1f}s"
+            )
+
+    failed = [result for result in results if result.error]
+    metrics.set("shards", len(results))
+    metrics.set("shards_failed", len(failed))
+    print(
+        f"Shards: {len(results) - len(failed)} of {len(results)} succeeded, "
+        f"{sum(r.stories for r in results)} stories, {sum(r.flagged for r in results)} flagged"
+    )
+
+    if slack is not None:
+        print_slack_stats(slack.close())
+
+    write_run_report()
+    return results
@@ -0,0 +1,105 @@
+# backlog_refinement_agent/pipeline.py
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .refinement import NOT_EVALUATED, EvaluationResult, evaluate_stories, evaluate_story
+from .rendering import Findings, build_findings, render_slack
+from .story import Story
+
+
+@dataclass(slots=True)
+class Refinement:
+    """
+    Evaluation outcome for one story, ready to be rendered and posted.
+    """
+
+    story: Story
+    issues: List[str]
+    explanations: Dict[str, Any]
+    ac_suggestion: str
+    _findings: Optional[Findings] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.issues or self.ac_suggestion)
+
+    @property
+    def evaluated(self) -> bool:
+        """
+        False when an LLM check was skipped or failed, so the findings are
+        incomplete and the story should be evaluated again.
+        """
+        return NOT_EVALUATED not in self.explanations
+
+    def findings(self) -> Findings:
+        """
+        The findings model behind every rendering, built on first use.
+        """
+        if self._findings is None:
+            self._findings = build_findings(self)
+        return self._findings
+
+
+def _apply_component_check(
+    story: Story,
+    issues: List[str],
+    explanations: Dict[str, Any],
+) -> List[str]:
+    # Explicit Missing Component logic based on Jira data
+    has_components = bool(str(story.components).strip())
+
+    if not has_components:
+        # Components truly missing → ensure it's flagged
+        if "Missing Component" not in issues:
+            issues.append("Missing Component")
+            explanations.setdefault(
+                "Missing Component",
+                "No Jira component is set for this story. "
+                "Please assign an appropriate component for better traceability.",
+            )
+    else:
+        # Components are present
+        if "Missing Component" in issues:
+            issues = [i for i in issues if i != "Missing Component"]
+            explanations.pop("Missing Component", None)
+
+    return issues
+
+
+def refine_story(story: Story, executor: Optional[Executor] = None) -> Refinement:
+    """
+    Evaluates a single story, e.g. one received by webhook.
+
+    :param executor: Runs the summary check alongside the description check
+    """
+    issues, explanations, ac_suggestion = evaluate_story(story, story.get("present_fields", []), executor)
+    issues = _apply_component_check(story, issues, explanations)
+    return Refinement(story, issues, explanations, ac_suggestion)
+
+
+def refine_stories(
+    stories: Iterable[Story],
+    known: Optional[Callable[[Story], Optional[EvaluationResult]]] = None,
+    on_submitted: Optional[Callable[[int], None]] = None,
+    on_evaluated: Optional[Callable[[int], None]] = None,
+) -> Iterator[Refinement]:
+    """
+    Evaluates stories as they stream in and yields one ``Refinement`` per
+    story, flagged or not, in input order.
+
+    :param known: Returns an earlier result for a story to reuse instead of evaluating it
+    :param on_submitted: Called as stories are handed to the evaluation workers
+    :param on_evaluated: Called from worker threads as evaluations finish
+    """
+    evaluated = evaluate_stories(stories, known=known, on_submitted=on_submitted, on_evaluated=on_evaluated)
+    for story, (issues, explanations, ac_suggestion) in evaluated:
+        issues = _apply_component_check(story, issues, explanations)
+        yield Refinement(story, issues, explanations, ac_suggestion)
+
+
+def render_slack_block(refinement: Refinement) -> str:
+    """
+    Renders the Slack summary entry for a flagged story as escaped mrkdwn.
+    """
+    return render_slack(refinement.findings())
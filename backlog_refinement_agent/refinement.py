@@ -1,51 +1,90 @@
-from typing import Dict, Any, List, Tuple
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
+from .adf import adf_to_text
+from .config import settings
+from .dedup import DuplicateIndex
+from .heuristics import prefilter_description, prefilter_summary
 from .llm_client import (
+    classify_descriptions_batch,
+    classify_summaries_batch,
+    evaluate_story_with_llm,
     is_vague_summary_with_llm,
     is_valid_acceptance_criteria_with_llm,
     suggest_acceptance_criteria_with_llm,
+    Unevaluated,
 )
+from .metrics import metrics
 
 
-def extract_full_description(description_block):
-    def extract_text_from_node(node):
-        text = ""
-        if "text" in node:
-            text += node["text"]
-        if "content" in node:
-            for child in node["content"]:
-                text += extract_text_from_node(child)
-        return text
-
-    description = ""
-    if isinstance(description_block, dict) and "content" in description_block:
-        for block in description_block["content"]:
-            block_text = extract_text_from_node(block)
-            if block.get("type") == "bulletList":
-                # Add bullets for bullet list items
-                for item in block.get("content", []):
-                    item_text = extract_text_from_node(item).strip()
-                    if item_text:
-                        description += f"- {item_text}\n"
-            else:
-                if block_text.strip():
-                    description += block_text + "\n"
+def extract_full_description(description_block, max_chars: Optional[int] = None):
+    """
+    Flattens an ADF description to text for the LLM prompts.
+
+    :param max_chars: Output cap (defaults to LLM_MAX_DESCRIPTION_CHARS; 0 disables it)
+    """
+    if max_chars is None:
+        max_chars = settings.openai.max_description_chars
+    return adf_to_text(description_block, max_chars=max_chars)
+
+
+EvaluationResult = Tuple[List[str], Dict[str, str], str]
+
+# Explanation key set when an LLM check was skipped (budget reached) or
+# failed. Such results are not verdicts: the story is neither commented on
+# nor recorded as evaluated, so the next run evaluates it again.
+NOT_EVALUATED = "not evaluated"
+
+
+def _needs_summary_check(story: Dict[str, Any], present_fields: List[str]) -> bool:
+    return "summary" in present_fields and bool(story.get("summary", "").strip())
+
+
+def _needs_description_check(story: Dict[str, Any], present_fields: List[str]) -> bool:
+    return "description" in present_fields and bool(story.get("description", "").strip())
+
 
-    return description.strip()
+def _check_summary(summary: str) -> Tuple[bool, str]:
+    verdict = prefilter_summary(summary)
+    if verdict is not None:
+        return verdict
+    return is_vague_summary_with_llm(summary)
 
 
-def evaluate_story(story: Dict[str, Any], present_fields: List[str]) -> Tuple[List[str], Dict[str, str], str]:
+def _check_description(description: str) -> Tuple[bool, str]:
+    verdict = prefilter_description(description)
+    if verdict is not None:
+        return verdict
+    return is_valid_acceptance_criteria_with_llm(description)
+
+
+def _build_result(
+    story: Dict[str, Any],
+    present_fields: List[str],
+    summary_result: Optional[Tuple[bool, str]],
+    description_result: Optional[Tuple[bool, str]],
+    ac_suggestion: str,
+) -> EvaluationResult:
+    """
+    Turns the LLM verdicts for one story into ``(issues, explanations, ac_suggestion)``.
+    """
     issues = []
     explanations = {}
-    ac_suggestion = ""
+
+    for check in (summary_result, description_result):
+        if check is not None and isinstance(check[1], Unevaluated):
+            explanations[NOT_EVALUATED] = str(check[1])
+    if isinstance(ac_suggestion, Unevaluated):
+        explanations[NOT_EVALUATED] = str(ac_suggestion)
+        ac_suggestion = ""
 
     # Summary analysis
     if "summary" in present_fields:
-        summary = story.get("summary", "")
-        if not summary.strip():
+        if summary_result is None:
             explanations["summary"] = "Summary is empty or only whitespace."
         else:
-            is_vague, explanation = is_vague_summary_with_llm(summary)
+            is_vague, explanation = summary_result
             if is_vague:
             
                 issues.append("Summary Analysis")
@@ -53,23 +92,17 @@ def evaluate_story(story: Dict[str, Any], present_fields: List[str]) -> Tuple[Li
 
     # Description analysis
     if "description" in present_fields:
-        description = story.get("description", "")
-        if not description.strip():
+        if description_result is None:
             # issues.append("Vague or unclear description")
             issues.append("Description Analysis")
             explanations["description"] = "Description is empty or only whitespace."
         else:
-            is_incomplete, explanation = is_valid_acceptance_criteria_with_llm(description)
+            is_incomplete, explanation = description_result
     
             if is_incomplete:
                 issues.append("Acceptance Criteria Analysis")
                 explanations["description"] = explanation
 
-                # Generate Suggested AC only when description is flagged
-                summary = story.get("summary", "")
-                ac_suggestion = suggest_acceptance_criteria_with_llm(summary, description)
-        
-
     # Fix version check
     if "fixVersions" in present_fields:
         fixVersions = story.get("fixVersions", "")
@@ -83,3 +116,356 @@ def evaluate_story(story: Dict[str, Any], present_fields: List[str]) -> Tuple[Li
             issues.append("Missing Component")
 
     return issues, explanations, ac_suggestion    
+
+
+def _suggest_if_incomplete(
+    story: Dict[str, Any],
+    description_result: Optional[Tuple[bool, str]],
+) -> str:
+    # Generate Suggested AC only when description is flagged
+    if description_result is None or not description_result[0]:
+        return ""
+    return suggest_acceptance_criteria_with_llm(
+        story.get("summary", ""), story.get("description", "")
+    )
+
+
+def _evaluate_story_combined(
+    story: Dict[str, Any],
+    present_fields: List[str],
+    executor: Optional[Executor] = None,
+) -> EvaluationResult:
+    """
+    Evaluates one story with a single JSON completion. Rule-based verdicts
+    still take precedence, and the LLM is skipped when they settle every
+    check. Falls back to the separate checks if no valid JSON comes back.
+    """
+    summary_result = None
+    needs_summary = _needs_summary_check(story, present_fields)
+    if needs_summary:
+        summary_result = prefilter_summary(story.get("summary", ""))
+
+    description_result = None
+    needs_description = _needs_description_check(story, present_fields)
+    if needs_description:
+        description_result = prefilter_description(story.get("description", ""))
+
+    needs_llm = (needs_summary and summary_result is None) or (
+        needs_description and (description_result is None or description_result[0])
+    )
+    if not needs_llm:
+        return _build_result(story, present_fields, summary_result, description_result, "")
+
+    combined = evaluate_story_with_llm(story.get("summary", ""), story.get("description", ""))
+    if combined is None:
+        return _evaluate_story_separately(story, present_fields, executor)
+
+    llm_summary, llm_description, ac_suggestion = combined
+    if needs_summary and summary_result is None:
+        summary_result = llm_summary
+    if needs_description and description_result is None:
+        description_result = llm_description
+
+    if description_result is None or not description_result[0]:
+        ac_suggestion = ""
+    return _build_result(story, present_fields, summary_result, description_result, ac_suggestion)
+
+
+def evaluate_story(
+    story: Dict[str, Any],
+    present_fields: List[str],
+    executor: Optional[Executor] = None,
+) -> EvaluationResult:
+    """
+    Runs the summary and acceptance criteria checks for one story.
+
+    With LLM_COMBINED set, both checks and the AC suggestion come from one
+    completion. Otherwise, when an executor is given, the summary check is
+    submitted to it so it runs alongside the description check instead of
+    before it.
+    """
+    if settings.openai.combined:
+        return _evaluate_story_combined(story, present_fields, executor)
+    return _evaluate_story_separately(story, present_fields, executor)
+
+
+def _evaluate_story_separately(
+    story: Dict[str, Any],
+    present_fields: List[str],
+    executor: Optional[Executor] = None,
+) -> EvaluationResult:
+    summary_check: Optional[Future] = None
+    if _needs_summary_check(story, present_fields):
+        summary = story.get("summary", "")
+        if executor is not None:
+            summary_check = executor.submit(_check_summary, summary)
+        else:
+            summary_check = _completed(_check_summary(summary))
+
+    description_result = None
+    if _needs_description_check(story, present_fields):
+        description_result = _check_description(story.get("description", ""))
+
+    ac_suggestion = _suggest_if_incomplete(story, description_result)
+    summary_result = summary_check.result() if summary_check is not None else None
+
+    return _build_result(story, present_fields, summary_result, description_result, ac_suggestion)
+
+
+def evaluate_stories_batch(
+    stories: List[Dict[str, Any]],
+    executor: Optional[Executor] = None,
+    batch_size: Optional[int] = None,
+) -> List[EvaluationResult]:
+    """
+    Evaluates a list of stories with batched classification requests.
+
+    Summaries and descriptions are each packed ``batch_size`` per completion
+    (defaults to LLM_BATCH_SIZE). AC suggestions are still requested per
+    flagged story. Results are returned in the order of ``stories``.
+    """
+    present = [story.get("present_fields", []) for story in stories]
+
+    # Rule-based verdicts first; only the ambiguous stories are batched
+    prefiltered_summaries: Dict[str, Tuple[bool, str]] = {}
+    prefiltered_descriptions: Dict[str, Tuple[bool, str]] = {}
+    summaries: Dict[str, str] = {}
+    descriptions: Dict[str, str] = {}
+
+    for i, story in enumerate(stories):
+        if _needs_summary_check(story, present[i]):
+            summary = story.get("summary", "")
+            verdict = prefilter_summary(summary)
+            if verdict is not None:
+                prefiltered_summaries[str(i)] = verdict
+            else:
+                summaries[str(i)] = summary
+        if _needs_description_check(story, present[i]):
+            description = story.get("description", "")
+            verdict = prefilter_description(description)
+            if verdict is not None:
+                prefiltered_descriptions[str(i)] = verdict
+            else:
+                descriptions[str(i)] = description
+
+    if executor is not None:
+        summary_batch = executor.submit(classify_summaries_batch, summaries, batch_size)
+    else:
+        summary_batch = _completed(classify_summaries_batch(summaries, batch_size))
+    description_results = classify_descriptions_batch(descriptions, batch_size)
+    description_results.update(prefiltered_descriptions)
+
+    def suggest(i: int) -> str:
+        return _suggest_if_incomplete(stories[i], description_results.get(str(i)))
+
+    if executor is not None:
+        suggestions = list(executor.map(suggest, range(len(stories))))
+    else:
+        suggestions = [suggest(i) for i in range(len(stories))]
+
+    summary_results = summary_batch.result()
+    summary_results.update(prefiltered_summaries)
+    return [
+        _build_result(
+            story,
+            present[i],
+            summary_results.get(str(i)),
+            description_results.get(str(i)),
+            suggestions[i],
+        )
+        for i, story in enumerate(stories)
+    ]
+
+
+def _completed(value: Any) -> Future:
+    future: Future = Future()
+    future.set_result(value)
+    return future
+
+
+DUPLICATE_ISSUE = "Possible Duplicate"
+
+
+def _reuse_result(
+    story: Dict[str, Any],
+    original_result: EvaluationResult,
+    original_id: str,
+) -> EvaluationResult:
+    """
+    Builds a near-duplicate's result from its cluster representative's LLM
+    verdicts. Field checks are redone against the duplicate's own fields.
+    """
+    original_issues, original_explanations, ac_suggestion = original_result
+    present_fields = story.get("present_fields", [])
+
+    summary_result = None
+    if _needs_summary_check(story, present_fields):
+        summary_result = (
+            "Summary Analysis" in original_issues,
+            original_explanations.get("summary", ""),
+        )
+    description_result = None
+    if _needs_description_check(story, present_fields):
+        description_result = (
+            "Acceptance Criteria Analysis" in original_issues,
+            original_explanations.get("description", ""),
+        )
+
+    issues, explanations, ac_suggestion = _build_result(
+        story, present_fields, summary_result, description_result, ac_suggestion
+    )
+    if NOT_EVALUATED in original_explanations:
+        explanations[NOT_EVALUATED] = original_explanations[NOT_EVALUATED]
+    issues.append(DUPLICATE_ISSUE)
+    explanations[DUPLICATE_ISSUE.lower()] = (
+        f"Possible duplicate of {original_id}. "
+        "Its summary and description closely match that story; consider linking or closing one of them."
+    )
+    return issues, explanations, ac_suggestion
+
+
+class _Slot:
+    """A story waiting in the evaluation window."""
+
+    __slots__ = ("story", "future", "index", "duplicate_of")
+
+    def __init__(self, story: Dict[str, Any], duplicate_of: Optional[str]) -> None:
+        self.story = story
+        self.future: Optional[Future] = None
+        self.index: Optional[int] = None
+        self.duplicate_of = duplicate_of
+
+
+def evaluate_stories(
+    stories: Iterable[Dict[str, Any]],
+    concurrency: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    dedup: Optional[bool] = None,
+    known: Optional[Callable[[Dict[str, Any]], Optional[EvaluationResult]]] = None,
+    on_submitted: Optional[Callable[[int], None]] = None,
+    on_evaluated: Optional[Callable[[int], None]] = None,
+) -> Iterator[Tuple[Dict[str, Any], EvaluationResult]]:
+    """
+    Evaluates many stories concurrently and yields ``(story, result)`` pairs
+    in the same order the stories were given.
+
+    At most ``concurrency`` stories are evaluated at once and only a small
+    window of stories is read ahead, so a streaming source is never drained
+    into memory. The number of completions in flight is further capped by
+    LLM_CONCURRENCY inside ``llm_client``. With a ``batch_size`` above 1
+    (defaults to LLM_BATCH_SIZE), stories are grouped and classified with
+    ``evaluate_stories_batch`` instead. LLM_COMBINED already needs only one
+    completion per story, so it takes precedence over batching. A story
+    (or batch) whose evaluation raises is yielded with a ``NOT_EVALUATED``
+    result instead of ending the stream.
+
+    With ``dedup`` (defaults to DEDUP_ENABLED) a ``DuplicateIndex`` is built
+    as stories arrive. Near-duplicates are not sent to the LLM; they reuse
+    the verdicts of the first story in their cluster and get a
+    "Possible Duplicate" finding.
+
+    :param stories: Story records, e.g. from ``iter_issues_from_jira``
+    :param concurrency: Stories evaluated in parallel (defaults to LLM_CONCURRENCY)
+    :param batch_size: Stories classified per completion (defaults to LLM_BATCH_SIZE)
+    :param dedup: Detect near-duplicate stories (defaults to DEDUP_ENABLED)
+    :param known: Returns a result from an earlier attempt, e.g. a resumed
+        run's journal, to use instead of evaluating the story
+    :param on_submitted: Called with a story count as stories are handed to
+        the workers; stories in a partial batch are held back until it fills
+        or the source runs out
+    :param on_evaluated: Called with a story count as evaluations finish,
+        from worker threads and before the results are yielded
+    """
+    concurrency = max(1, concurrency or settings.openai.max_concurrency)
+    batch_size = max(1, batch_size or settings.openai.batch_size)
+    if settings.openai.combined:
+        batch_size = 1
+    dedup = settings.refinement.dedup_enabled if dedup is None else dedup
+
+    index = DuplicateIndex(threshold=settings.refinement.dedup_threshold) if dedup else None
+    # Results of cluster representatives, reused by their duplicates
+    representative_results: Dict[str, EvaluationResult] = {}
+
+    # Summary checks get their own pool so a story task never waits on
+    # work queued behind other story tasks
+    with ThreadPoolExecutor(max_workers=concurrency) as story_pool, \
+            ThreadPoolExecutor(max_workers=concurrency) as check_pool:
+        window: deque = deque()
+        chunk: List[_Slot] = []
+
+        def submit_chunk() -> None:
+            if not chunk:
+                return
+            if on_submitted is not None:
+                on_submitted(len(chunk))
+            if batch_size > 1:
+                future = story_pool.submit(
+                    evaluate_stories_batch, [slot.story for slot in chunk], check_pool, batch_size
+                )
+                for i, slot in enumerate(chunk):
+                    slot.future, slot.index = future, i
+            else:
+                future = chunk[0].future = story_pool.submit(
+                    evaluate_story, chunk[0].story, chunk[0].story.get("present_fields", []), check_pool
+                )
+            if on_evaluated is not None:
+                count = len(chunk)
+                future.add_done_callback(lambda _: on_evaluated(count))
+            chunk.clear()
+
+        def drain_head() -> Tuple[Dict[str, Any], EvaluationResult]:
+            slot = window.popleft()
+            if slot.duplicate_of is not None:
+                # The representative came earlier in the stream, so it has
+                # already been drained
+                original = representative_results[slot.duplicate_of]
+                metrics.incr("duplicates")
+                return slot.story, _reuse_result(slot.story, original, slot.duplicate_of)
+
+            if slot.future is None:
+                submit_chunk()
+            try:
+                result = slot.future.result()
+                if slot.index is not None:
+                    result = result[slot.index]
+            except Exception as e:
+                # Like a failed LLM call: the story is retried next run, and
+                # the stories around it are still yielded
+                metrics.incr("evaluation_errors")
+                print(f"Failed to evaluate {slot.story.get('id')}:", e)
+                result = [], {NOT_EVALUATED: f"Evaluation failed: {e}"}, ""
+            if index is not None:
+                representative_results[str(slot.story.get("id"))] = result
+            return slot.story, result
+
+        for story in stories:
+            duplicate_of = None
+            if index is not None:
+                text = f"{story.get('summary', '')}\n{story.get('description', '')}"
+                duplicate_of = index.add(str(story.get("id")), text)
+
+            result = known(story) if known is not None else None
+            if result is not None:
+                slot = _Slot(story, None)
+                slot.future = _completed(result)
+                window.append(slot)
+            else:
+                slot = _Slot(story, duplicate_of)
+                window.append(slot)
+            if slot.future is None and duplicate_of is None:
+                chunk.append(slot)
+                if len(chunk) >= batch_size:
+                    submit_chunk()
+            else:
+                # Reused results need no evaluation
+                if on_submitted is not None:
+                    on_submitted(1)
+                if on_evaluated is not None:
+                    on_evaluated(1)
+
+            while len(window) > concurrency * 2 * batch_size:
+                yield drain_head()
+
+        submit_chunk()
+        while window:
+            yield drain_head()
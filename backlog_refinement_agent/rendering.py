@@ -0,0 +1,318 @@
+# backlog_refinement_agent/rendering.py
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import settings
+
+if TYPE_CHECKING:
+    from .pipeline import Refinement
+
+COMMENT_TITLE = "Backlog Refinement Summary"
+
+_NO_EXPLANATION = "(no explanation available)"
+
+# Templates are bound once at import; rendering only fills them in
+_TEXT_STORY = "- {id}{reporter}".format
+_TEXT_REPORTER = " (reported by {})".format
+_TEXT_ISSUE = "  - {}".format
+_TEXT_DETAIL = "      {}".format
+_TEXT_CRITERION = "         - {}".format
+
+_ADF_STORY = "{id}{reporter}".format
+
+_SLACK_STORY = "- *{id}*{reporter}".format
+_SLACK_REPORTER = " (reported by @{})".format
+_SLACK_ISSUE = "  • *{}*".format
+_SLACK_DETAIL = "      {}".format
+_SLACK_AC_NOTE = "      _Acceptance criteria suggestion added in Jira ticket's comment._"
+
+_ADF_MENTION_TEXT = {
+    "type": "text",
+    "text": ", Please review the following issues identified during backlog refinement:",
+}
+_ADF_TITLE = {
+    "type": "paragraph",
+    "content": [{"type": "text", "text": COMMENT_TITLE, "marks": [{"type": "strong"}]}],
+}
+_ADF_SUGGESTION_TITLE = {
+    "type": "paragraph",
+    "content": [{"type": "text", "text": "Suggested Acceptance Criteria:", "marks": [{"type": "em"}]}],
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Finding:
+    """
+    One flagged issue on a story, with its explanation split into lines.
+    """
+
+    issue: str
+    explanation: Tuple[str, ...] = ()
+    suggested_criteria: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True, slots=True)
+class Findings:
+    """
+    Everything a refinement comment or Slack entry says about one story.
+
+    Built once per flagged story and rendered to ADF, Slack mrkdwn or plain
+    text. ``key`` hashes the findings alone, so stories with identical
+    findings share cached renders; ``digest`` also covers who is mentioned
+    and is what incremental runs compare to skip re-posting.
+    """
+
+    story_id: str
+    reporter: str
+    account_id: str
+    items: Tuple[Finding, ...]
+    key: str
+    digest: str
+
+
+def _explanation_for(issue: str, explanations: Dict[str, Any]) -> Any:
+    issue_lower = issue.lower()
+
+    # Map issue to explanation keys
+    if issue_lower.startswith("summary"):
+        return explanations.get("summary")
+    if issue_lower.startswith("acceptance"):
+        return explanations.get("description")
+    return explanations.get(issue_lower) or explanations.get(issue)
+
+
+def _explanation_lines(exp: Any) -> Tuple[str, ...]:
+    if not exp:
+        return ()
+    if isinstance(exp, dict):
+        return tuple(f"{k}: {v}" for k, v in exp.items())
+    return tuple(str(exp).splitlines())
+
+
+def _criteria(ac_suggestion: str) -> Tuple[str, ...]:
+    criteria = []
+    for line in str(ac_suggestion).splitlines():
+        line = line.strip()
+        # Skip blanks and headings like "Suggested Acceptance Criteria"
+        if not line or line.lower().startswith("suggested acceptance criteria"):
+            continue
+        criteria.append(line.lstrip("-*• ").strip() or line)
+    return tuple(criteria)
+
+
+def _hash(parts: Iterable[str]) -> str:
+    # Unit and record separators keep ("ab", "c") and ("a", "bc") apart
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _finding_parts(items: Tuple[Finding, ...]) -> Iterator[str]:
+    for item in items:
+        yield item.issue
+        yield "\x1e".join(item.explanation)
+        yield "\x1e".join(item.suggested_criteria)
+
+
+def build_findings(refinement: "Refinement") -> Findings:
+    """
+    Builds the findings model for a refinement.
+    """
+    story = refinement.story
+    criteria = _criteria(refinement.ac_suggestion) if refinement.ac_suggestion else ()
+
+    items = tuple(
+        Finding(
+            issue,
+            _explanation_lines(_explanation_for(issue, refinement.explanations)),
+            # Suggested AC are shown under the acceptance criteria finding only
+            criteria if issue.lower().startswith("acceptance") else (),
+        )
+        for issue in refinement.issues
+    )
+
+    key = _hash(_finding_parts(items))
+    digest = _hash((key, story.reporter or "", story.account_id or ""))
+    return Findings(str(story.id), story.reporter or "", story.account_id or "", items, key, digest)
+
+
+class _RenderCache:
+    """
+    Small thread-safe LRU of rendered bodies keyed by format and findings
+    key. Cached values are shared, so callers must not modify them.
+
+    Most LLM findings are unique to their story, and holding thousands of
+    renders nobody asks for again costs more than rendering them. A body is
+    only kept once its key has been seen before, so the cache fills with
+    findings that actually repeat, such as the rule-based ones.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        # Keys rendered once, remembered so a second render is cached
+        self._seen: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, kind: str, findings: Findings, render: Callable[[Findings], Any]) -> Any:
+        if self.maxsize <= 0:
+            return render(findings)
+
+        cache_key = (kind, findings.key)
+        with self._lock:
+            value = self._entries.get(cache_key)
+            if value is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            admit = self._seen.pop(cache_key, False) is None
+            if not admit:
+                self._seen[cache_key] = None
+                if len(self._seen) > self.maxsize * 4:
+                    self._seen.popitem(last=False)
+
+        value = render(findings)
+        if admit:
+            with self._lock:
+                self._entries[cache_key] = value
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+
+_cache: Optional[_RenderCache] = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> _RenderCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _RenderCache(settings.refinement.render_cache_size)
+    return _cache
+
+
+def render_cache_stats() -> Dict[str, int]:
+    cache = _get_cache()
+    return {"hits": cache.hits, "misses": cache.misses}
+
+
+def _text_body(findings: Findings) -> str:
+    lines: List[str] = []
+    for item in findings.items:
+        lines.append(_TEXT_ISSUE(item.issue))
+        if item.explanation:
+            lines.extend(map(_TEXT_DETAIL, item.explanation))
+        else:
+            lines.append(_TEXT_DETAIL(_NO_EXPLANATION))
+        if item.suggested_criteria:
+            lines.append(_TEXT_DETAIL("Suggested Acceptance Criteria:"))
+            lines.extend(map(_TEXT_CRITERION, item.suggested_criteria))
+        # Blank lines between issues
+        lines.append("")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def render_text(findings: Findings) -> str:
+    """
+    Renders the comment as plain text, e.g. for dry runs.
+    """
+    reporter = _TEXT_REPORTER(findings.reporter) if findings.reporter else ""
+    header = _TEXT_STORY(id=findings.story_id, reporter=reporter)
+    body = _get_cache().get_or_render("text", findings, _text_body)
+    return f"{COMMENT_TITLE}\n{header}\n{body}" if body else f"{COMMENT_TITLE}\n{header}"
+
+
+def _escape_mrkdwn(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _slack_body(findings: Findings) -> str:
+    lines: List[str] = []
+    for item in findings.items:
+        lines.append(_SLACK_ISSUE(_escape_mrkdwn(item.issue)))
+        if item.explanation:
+            lines.extend(_SLACK_DETAIL(_escape_mrkdwn(line)) for line in item.explanation)
+            if item.suggested_criteria:
+                lines.append(_SLACK_AC_NOTE)
+        else:
+            lines.append(_SLACK_DETAIL(_NO_EXPLANATION))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def render_slack(findings: Findings) -> str:
+    """
+    Renders the Slack summary entry as mrkdwn, already escaped.
+    """
+    reporter = _SLACK_REPORTER(_escape_mrkdwn(findings.reporter)) if findings.reporter else ""
+    header = _SLACK_STORY(id=_escape_mrkdwn(findings.story_id), reporter=reporter)
+    body = _get_cache().get_or_render("slack", findings, _slack_body)
+    return f"{header}\n{body}" if body else header
+
+
+def _adf_text(text: str) -> Dict[str, Any]:
+    return {"type": "text", "text": text}
+
+
+def _adf_paragraph(lines: Tuple[str, ...]) -> Dict[str, Any]:
+    # Explanation lines stay in one paragraph, separated by hard breaks
+    content: List[Dict[str, Any]] = []
+    for line in lines:
+        if content:
+            content.append({"type": "hardBreak"})
+        if line:
+            content.append(_adf_text(line))
+    return {"type": "paragraph", "content": content}
+
+
+def _adf_bullet_list(items: List[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    return {"type": "bulletList", "content": [{"type": "listItem", "content": item} for item in items]}
+
+
+def _adf_body(findings: Findings) -> List[Dict[str, Any]]:
+    items = []
+    for item in findings.items:
+        content = [{"type": "paragraph", "content": [{"type": "text", "text": item.issue, "marks": [{"type": "strong"}]}]}]
+        content.append(_adf_paragraph(item.explanation or (_NO_EXPLANATION,)))
+        if item.suggested_criteria:
+            content.append(_ADF_SUGGESTION_TITLE)
+            content.append(_adf_bullet_list([[_adf_paragraph((line,))] for line in item.suggested_criteria]))
+        items.append(content)
+    return [_adf_bullet_list(items)] if items else []
+
+
+def render_adf(findings: Findings) -> Dict[str, Any]:
+    """
+    Renders the Jira comment payload: a mention of the reporter, the
+    refinement title, the story line and one bullet per finding, with
+    suggested acceptance criteria as a nested list.
+    """
+    content: List[Dict[str, Any]] = []
+    if findings.account_id:
+        content.append({
+            "type": "paragraph",
+            "content": [
+                {
+                    "type": "mention",
+                    "attrs": {
+                        "id": findings.account_id,
+                        "text": f"@{findings.reporter}" if findings.reporter else "@reporter",
+                    },
+                },
+                _ADF_MENTION_TEXT,
+            ],
+        })
+
+    reporter = _TEXT_REPORTER(findings.reporter) if findings.reporter else ""
+    content.append(_ADF_TITLE)
+    content.append(_adf_paragraph((_ADF_STORY(id=findings.story_id, reporter=reporter),)))
+    content.extend(_get_cache().get_or_render("adf", findings, _adf_body))
+
+    return {"body": {"type": "doc", "version": 1, "content": content}}
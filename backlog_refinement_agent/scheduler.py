@@ -0,0 +1,260 @@
+# backlog_refinement_agent/scheduler.py
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from .config import settings
+from .metrics import _write_atomically, metrics
+from .state import RefinementState
+from .story import Story
+
+# Fields whose absence makes a story likely to be flagged
+_RANKED_FIELDS = ("summary", "description", "fixVersions", "components")
+
+_PRIORITY_SCORES = {
+    "highest": 4.0,
+    "blocker": 4.0,
+    "high": 3.0,
+    "critical": 3.0,
+    "medium": 2.0,
+    "major": 2.0,
+    "low": 1.0,
+    "minor": 1.0,
+    "lowest": 0.0,
+    "trivial": 0.0,
+}
+_UNKNOWN_PRIORITY = 1.5
+
+# Weights of the ranking signals
+_MISSING_FIELD_WEIGHT = 1.0
+_PRIORITY_WEIGHT = 1.0
+_NEVER_EVALUATED_WEIGHT = 2.0
+_EDITED_WEIGHT = 1.5
+_RECENT_EDIT_WEIGHT = 1.0
+_AGE_WEIGHT = 1.0
+
+# Days over which the recency bonuses halve
+_RECENT_EDIT_DAYS = 7.0
+_AGE_DAYS = 30.0
+
+# Evaluated stories before their average replaces the worst case
+_MIN_EVALUATED_FOR_AVERAGE = 10
+
+# Deferred story ids printed at the end of a run
+_DEFERRED_SHOWN = 10
+
+
+def _parse_time(value: str) -> Optional[float]:
+    """
+    Parses a Jira timestamp such as ``2024-01-01T09:00:00.000+0000``.
+    """
+    if not value:
+        return None
+    for pattern in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z"):
+        try:
+            return datetime.strptime(value, pattern).timestamp()
+        except ValueError:
+            continue
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _decay(seconds: Optional[float], half_life_days: float) -> float:
+    # 1.0 for "just now", 0.5 after one half-life, 0.0 when unknown
+    if seconds is None:
+        return 0.0
+    return math.pow(0.5, max(0.0, seconds) / 86400 / half_life_days)
+
+
+@dataclass
+class ScheduleStats:
+    ranked: int = 0
+    scheduled: int = 0
+    stop_reason: str = ""
+    deferred: List[str] = field(default_factory=list)
+
+
+class Scheduler:
+    """
+    Orders a run's stories by how much refinement is likely to matter and
+    feeds them to evaluation until a wall-clock deadline or an LLM call
+    budget runs out.
+
+    Ranking only uses local signals: missing refined fields, the Jira
+    priority, whether the story was never evaluated or was edited since
+    (from the incremental state, when there is one), how recently it was
+    updated and how recently it was created. The whole backlog is loaded
+    before ranking; stories are small next to the evaluation cost.
+
+    Stopping is clean: no new story is started once the deadline passes,
+    and stories already in flight finish normally. Under a call budget, a
+    story is only started if the calls made, plus those the stories in
+    flight are expected to need, leave room for it; otherwise the
+    scheduler waits for stories being evaluated and stops once none are
+    left. Stories held back in a partial batch are not waited for, since
+    they are only submitted once the scheduler stops. The expectation is
+    the run's average calls per evaluated story (the most a story can need
+    until a few have been evaluated). In case it
+    falls short, ``usage`` refuses completions beyond the budget. The
+    stories not started are reported as deferred.
+    """
+
+    def __init__(
+        self,
+        deadline_seconds: Optional[float] = None,
+        max_llm_calls: Optional[int] = None,
+        state: Optional[RefinementState] = None,
+        calls_used: Optional[Callable[[], int]] = None,
+        deadline_at: Optional[float] = None,
+    ) -> None:
+        """
+        :param deadline_seconds: Seconds from now after which no story is started (0 = none)
+        :param max_llm_calls: Completions this run may make (0 = no limit)
+        :param state: Incremental state telling which stories were evaluated before
+        :param calls_used: Returns the completions made so far (defaults to ``llm_client.usage``)
+        :param deadline_at: Wall-clock time (``time.time()``) after which no story is
+            started, e.g. one deadline shared by every shard; overrides ``deadline_seconds``
+        """
+        refinement = settings.refinement
+        self.deadline_seconds = refinement.deadline_seconds if deadline_seconds is None else deadline_seconds
+        self.max_llm_calls = refinement.max_llm_calls if max_llm_calls is None else max_llm_calls
+        self.state = state
+        self.stats = ScheduleStats()
+
+        if calls_used is None:
+            from .llm_client import usage
+
+            if self.max_llm_calls:
+                usage.limit_calls(self.max_llm_calls)
+
+            calls_used = usage.calls
+
+        self._calls_used = calls_used
+        self._now = time.time()
+        if deadline_at is None and self.deadline_seconds:
+            deadline_at = self._now + self.deadline_seconds
+        self.deadline_at = deadline_at
+        self._submitted = 0
+        self._evaluated = 0
+        self._condition = threading.Condition()
+        # Most completions one story can need: one combined call, or its
+        # share of a summary and a description batch plus an AC suggestion
+        if settings.openai.combined:
+            self._calls_per_story = 1.0
+        else:
+            self._calls_per_story = 1 + 2 / max(1, settings.openai.batch_size)
+
+    def score(self, story: Story) -> float:
+        present = story.present_fields
+        score = _MISSING_FIELD_WEIGHT * sum(1 for name in _RANKED_FIELDS if name not in present)
+        score += _PRIORITY_WEIGHT * _PRIORITY_SCORES.get(story.priority.strip().lower(), _UNKNOWN_PRIORITY)
+
+        if self.state is not None:
+            if str(story.id) not in self.state.stories:
+                score += _NEVER_EVALUATED_WEIGHT
+            elif not self.state.is_unchanged(story):
+                score += _EDITED_WEIGHT
+
+        updated = _parse_time(story.updated)
+        created = _parse_time(story.created)
+        score += _RECENT_EDIT_WEIGHT * _decay(self._now - updated if updated else None, _RECENT_EDIT_DAYS)
+        score += _AGE_WEIGHT * _decay(self._now - created if created else None, _AGE_DAYS)
+        return score
+
+    def schedule(self, stories: Iterable[Story]) -> Iterator[Story]:
+        """
+        Yields the stories best first until the deadline or budget is
+        reached. ``submitted`` must be called as stories are handed to the
+        evaluation workers and ``evaluated`` as their evaluations finish.
+        """
+        with metrics.timer("schedule"):
+            ranked = sorted(stories, key=self.score, reverse=True)
+        self.stats.ranked = len(ranked)
+
+        for position, story in enumerate(ranked):
+            reason = self._stop_reason()
+            if reason:
+                self.stats.stop_reason = reason
+                self.stats.deferred = [str(s.id) for s in ranked[position:]]
+                return
+            self.stats.scheduled += 1
+            yield story
+
+    def submitted(self, count: int = 1) -> None:
+        """
+        Records stories handed to the evaluation workers.
+        """
+        with self._condition:
+            self._submitted += count
+
+    def evaluated(self, count: int = 1) -> None:
+        """
+        Records finished evaluations; safe to call from worker threads.
+        """
+        with self._condition:
+            self._evaluated += count
+            self._condition.notify_all()
+
+    def _deadline_left(self) -> Optional[float]:
+        if self.deadline_at is None:
+            return None
+        return self.deadline_at - time.time()
+
+    def _stop_reason(self) -> str:
+        with self._condition:
+            while True:
+                left = self._deadline_left()
+                if left is not None and left <= 0:
+                    return "deadline"
+                if not self.max_llm_calls or self._fits_budget():
+                    return ""
+                if self._submitted == self._evaluated:
+                    # Nothing is being evaluated; stories held back in a
+                    # partial batch only start once the source ends
+                    return "LLM call budget"
+                # Stories being evaluated may need fewer calls than reserved for them
+                self._condition.wait(left)
+
+    def _fits_budget(self) -> bool:
+        used = self._calls_used()
+        expected = self._calls_per_story
+        if self._evaluated >= _MIN_EVALUATED_FOR_AVERAGE:
+            expected = used / self._evaluated
+        in_flight = self.stats.scheduled - self._evaluated
+        return used + in_flight * expected + self._calls_per_story <= self.max_llm_calls
+
+    def report(self, path: Optional[str] = None) -> None:
+        """
+        Prints what was deferred, records it in the run metrics and writes
+        the deferred story ids, best first, to ``path`` (defaults to
+        REFINEMENT_DEFERRED_FILE).
+        """
+        stats = self.stats
+        metrics.set("scheduled", stats.scheduled)
+        metrics.set("deferred", len(stats.deferred))
+
+        path = settings.refinement.deferred_file if path is None else path
+        if not stats.deferred:
+            print(f"Scheduler: all {stats.ranked} stories evaluated")
+        else:
+            shown = ", ".join(stats.deferred[:_DEFERRED_SHOWN])
+            more = f" and {len(stats.deferred) - _DEFERRED_SHOWN} more" if len(stats.deferred) > _DEFERRED_SHOWN else ""
+            print(
+                f"Scheduler: stopped at the {stats.stop_reason} after {stats.scheduled} of {stats.ranked} "
+                f"stories; deferred to the next run: {shown}{more}"
+            )
+        if path:
+            _write_atomically(path, json.dumps({
+                "stop_reason": stats.stop_reason,
+                "scheduled": stats.scheduled,
+                "deferred": stats.deferred,
+            }, indent=2) + "\n")
@@ -1,17 +1,28 @@
-from typing import Union
-import json
+from typing import Any, Dict, List
 import requests
 from .config import settings
+from .metrics import metrics
+from .transport import get_slack_transport
 
 
 
-def post_summary_to_slack(message: str):
+def post_blocks_to_slack(blocks: List[Dict[str, Any]], text: str) -> bool:
+    """
+    Posts a Block Kit message to the webhook.
+
+    :param blocks: Block Kit blocks (at most 50 per message)
+    :param text: Fallback text shown in notifications
+    """
     payload = {
-        "text": message
+        "text": text,
+        "blocks": blocks,
     }
     try:
-        response = requests.post(settings.slack.webhook_url, json=payload)
+        with metrics.timer("slack_post"):
+            response = get_slack_transport().post(settings.slack.webhook_url, json=payload)
         response.raise_for_status()
-        print("Slack webhook message posted successfully.")
+        return True
     except requests.exceptions.RequestException as e:
+        metrics.incr("slack_errors")
         print(f"Failed to send message to Slack via webhook: {e}")
+        return False
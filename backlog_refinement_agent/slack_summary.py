@@ -0,0 +1,217 @@
+# backlog_refinement_agent/slack_summary.py
+import queue
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+from .metrics import metrics
+from .pipeline import Refinement, render_slack_block
+from .rendering import _escape_mrkdwn
+from .slack_client import post_blocks_to_slack
+
+# Block Kit limits: 50 blocks per message, 3000 characters per section
+_MAX_BLOCKS = 50
+_MAX_SECTION_CHARS = 3000
+
+# Entries listed per digest breakdown before the rest are summed up
+_DIGEST_TOP = 15
+
+_MODES = ("stream", "digest", "auto")
+
+_NO_ISSUES_MESSAGE = "No issues flagged in the backlog refinement run."
+
+
+@dataclass
+class SlackSummaryStats:
+    flagged: int = 0
+    streamed: int = 0
+    messages: int = 0
+    failed: int = 0
+
+
+def _section(text: str) -> Dict[str, Any]:
+    if len(text) > _MAX_SECTION_CHARS:
+        text = text[:_MAX_SECTION_CHARS - 2].rstrip() + " …"
+    return {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+
+
+def _breakdown(title: str, counts: Counter) -> str:
+    lines = [f"*{title}*"]
+    for name, count in counts.most_common(_DIGEST_TOP):
+        lines.append(f"• {_escape_mrkdwn(name)}: {count}")
+    rest = sum(counts.values()) - sum(count for _, count in counts.most_common(_DIGEST_TOP))
+    if len(counts) > _DIGEST_TOP:
+        lines.append(f"• …{len(counts) - _DIGEST_TOP} more: {rest}")
+    return "\n".join(lines)
+
+
+@dataclass
+class DigestCounts:
+    """
+    Flagged-story counts behind the digest. Plain data, so worker
+    processes can return it and the totals can be merged.
+    """
+
+    flagged: int = 0
+    by_issue: Counter = field(default_factory=Counter)
+    by_component: Counter = field(default_factory=Counter)
+    by_reporter: Counter = field(default_factory=Counter)
+    by_project: Counter = field(default_factory=Counter)
+
+    def add(self, refinement: Refinement) -> None:
+        story = refinement.story
+        self.flagged += 1
+        self.by_issue.update(refinement.issues)
+        components = [c.strip() for c in str(story.components).split(",") if c.strip()]
+        self.by_component.update(components or ["(no component)"])
+        self.by_reporter[story.reporter or "(unknown reporter)"] += 1
+        self.by_project[str(story.id).rsplit("-", 1)[0]] += 1
+
+    def merge(self, other: "DigestCounts") -> None:
+        self.flagged += other.flagged
+        self.by_issue.update(other.by_issue)
+        self.by_component.update(other.by_component)
+        self.by_reporter.update(other.by_reporter)
+        self.by_project.update(other.by_project)
+
+
+class SlackSummaryStream:
+    """
+    Delivers the run's Slack summary as size-bounded Block Kit messages.
+
+    In "stream" mode each flagged story becomes a section block, and a
+    message is sent whenever the next block would push it past 50 blocks or
+    SLACK_MAX_MESSAGE_CHARS, so only the unsent chunk is held in memory. In
+    "digest" mode only counts per issue type, component and reporter are
+    kept and sent as one compact message at the end. "auto" streams the
+    first SLACK_DIGEST_THRESHOLD stories and digests the rest.
+
+    Messages are posted by a background thread through the rate-limited
+    Slack transport, so pacing never stalls evaluation until the small send
+    queue fills up.
+    """
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        digest_threshold: Optional[int] = None,
+        max_message_chars: Optional[int] = None,
+        queue_size: int = 10,
+    ) -> None:
+        """
+        :param mode: "stream", "digest" or "auto" (defaults to SLACK_MODE)
+        :param digest_threshold: Stories streamed in "auto" mode (defaults to SLACK_DIGEST_THRESHOLD)
+        :param max_message_chars: Text per message (defaults to SLACK_MAX_MESSAGE_CHARS)
+        :param queue_size: Messages waiting to be sent before ``add`` blocks
+        """
+        self.mode = (mode or settings.slack.mode).lower()
+        if self.mode not in _MODES:
+            raise ValueError(f"Unknown SLACK_MODE {self.mode!r}; expected one of {', '.join(_MODES)}")
+        self.digest_threshold = settings.slack.digest_threshold if digest_threshold is None else digest_threshold
+        self.max_message_chars = max_message_chars or settings.slack.max_message_chars
+        self.stats = SlackSummaryStats()
+
+        self.counts = DigestCounts()
+
+        self._blocks: List[Dict[str, Any]] = []
+        self._chars = 0
+        self._chunks = 0
+        self._queue: "queue.Queue[Optional[Tuple[List[Dict[str, Any]], str]]]" = queue.Queue(maxsize=queue_size)
+        self._sender = threading.Thread(target=self._run, name="slack-summary-sender", daemon=True)
+        self._sender.start()
+
+    def add(self, refinement: Refinement) -> None:
+        """
+        Records a flagged story and sends the current chunk once it is full.
+        """
+        self.stats.flagged += 1
+        self.counts.add(refinement)
+
+        if self._streaming:
+            self.stats.streamed += 1
+            self._append(_section(render_slack_block(refinement)))
+
+    def merge(self, counts: DigestCounts) -> None:
+        """
+        Adds counts gathered elsewhere, e.g. by another worker process, to
+        the closing digest. Merged stories are never listed individually.
+        """
+        self.stats.flagged += counts.flagged
+        self.counts.merge(counts)
+
+    def close(self) -> SlackSummaryStats:
+        """
+        Sends the remaining chunk and the closing summary, then waits for
+        every message to be delivered.
+        """
+        if not self.stats.flagged:
+            self._queue.put(([_section(_NO_ISSUES_MESSAGE)], _NO_ISSUES_MESSAGE))
+        else:
+            closing = self._closing_blocks()
+            if self._blocks and len(self._blocks) + len(closing) < _MAX_BLOCKS:
+                # Small runs still arrive as a single message
+                self._blocks.extend(closing)
+                self._flush()
+            else:
+                self._flush()
+                self._queue.put((closing, f"Flagged Stories: {self.stats.flagged}"))
+        self._queue.put(None)
+        self._sender.join()
+        return self.stats
+
+    @property
+    def _streaming(self) -> bool:
+        if self.mode == "stream":
+            return True
+        return self.mode == "auto" and self.stats.flagged <= self.digest_threshold
+
+    def _append(self, block: Dict[str, Any]) -> None:
+        size = len(block["text"]["text"])
+        if self._blocks and (len(self._blocks) >= _MAX_BLOCKS - 1 or self._chars + size > self.max_message_chars):
+            self._flush()
+        self._blocks.append(block)
+        self._chars += size
+
+    def _flush(self) -> None:
+        if not self._blocks:
+            return
+        blocks = self._blocks
+        if self._chunks == 0:
+            blocks.insert(0, {"type": "header", "text": {"type": "plain_text", "text": "Backlog Refinement Summary"}})
+        self._chunks += 1
+        self._queue.put((blocks, f"Backlog Refinement Summary (part {self._chunks})"))
+        self._blocks = []
+        self._chars = 0
+
+    def _closing_blocks(self) -> List[Dict[str, Any]]:
+        blocks: List[Dict[str, Any]] = []
+        if not self.stats.streamed:
+            blocks.append({"type": "header", "text": {"type": "plain_text", "text": "Backlog Refinement Summary"}})
+
+        headline = f"*Flagged Stories:* {self.stats.flagged}"
+        if self.stats.streamed and self.stats.streamed < self.stats.flagged:
+            headline += f" (the first {self.stats.streamed} are listed above)"
+        blocks.append(_section(headline))
+
+        if self.stats.streamed < self.stats.flagged:
+            blocks.append({"type": "divider"})
+            if len(self.counts.by_project) > 1:
+                blocks.append(_section(_breakdown("By project", self.counts.by_project)))
+            blocks.append(_section(_breakdown("By issue type", self.counts.by_issue)))
+            blocks.append(_section(_breakdown("By component", self.counts.by_component)))
+            blocks.append(_section(_breakdown("By reporter", self.counts.by_reporter)))
+        return blocks
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            blocks, text = item
+            if post_blocks_to_slack(blocks, text):
+                self.stats.messages += 1
+                metrics.incr("slack_messages")
+            else:
+                self.stats.failed += 1
@@ -0,0 +1,175 @@
+# backlog_refinement_agent/sources.py
+import csv
+import json
+import os
+import re
+from typing import Any, Dict, Iterator, TextIO
+
+from .metrics import metrics
+from .refinement import extract_full_description
+from .story import Story
+
+_CHUNK_SIZE = 1 << 16
+# Whitespace and commas between array elements
+_SEPARATOR = re.compile(r"[\s,]*")
+
+# Column headers used by Jira's CSV export, mapped to story fields
+_COLUMN_ALIASES = {
+    "issue key": "id",
+    "key": "id",
+    "summary": "summary",
+    "description": "description",
+    "fix version/s": "fixVersions",
+    "fixversions": "fixVersions",
+    "component/s": "components",
+    "components": "components",
+    "reporter": "reporter",
+    "reporter id": "account_id",
+    "account_id": "account_id",
+    "updated": "updated",
+    "priority": "priority",
+    "created": "created",
+}
+
+_ISSUES_ARRAY = re.compile(r'"issues"\s*:\s*\[')
+
+
+def iter_stories_from_file(path: str) -> Iterator[Story]:
+    """
+    Streams stories from a local backlog export, one record at a time.
+
+    Supported formats, chosen by extension:
+      - .csv: one story per row, with either the story field names or
+        Jira's CSV export headers
+      - .jsonl: one story per line, either a flat record or a raw Jira issue
+      - .json: a Jira search/export document (``{"issues": [...]}``) or a
+        top-level array of issues or records
+
+    Descriptions given as ADF documents are flattened with
+    ``extract_full_description``.
+
+    :param path: Path to the export file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return _iter_csv(path)
+    if extension == ".jsonl":
+        return _iter_jsonl(path)
+    if extension == ".json":
+        return _iter_json(path)
+    raise ValueError(f"Unsupported backlog file format: {path}")
+
+
+def story_from_row(row: Dict[str, Any]) -> Story:
+    """
+    Builds a story from a raw Jira issue or a flat record.
+    """
+    with metrics.timer("parse"):
+        return _story_from_row(row)
+
+
+def _story_from_row(row: Dict[str, Any]) -> Story:
+    if isinstance(row.get("fields"), dict):
+        return Story.from_jira_issue(row)
+
+    record: Dict[str, Any] = {}
+    for column, value in row.items():
+        name = _COLUMN_ALIASES.get(str(column).strip().lower(), column)
+        # Keep the first non-empty value when several columns map to one field
+        if not record.get(name):
+            record[name] = value
+
+    record["description"] = _description_text(record.get("description"))
+    return Story.from_record(record)
+
+
+def _description_text(value: Any) -> str:
+    if isinstance(value, dict):
+        return extract_full_description(value)
+    if isinstance(value, str) and value.lstrip().startswith("{"):
+        try:
+            document = json.loads(value)
+        except ValueError:
+            return value
+        if isinstance(document, dict) and document.get("type") == "doc":
+            return extract_full_description(document)
+    return "" if value is None else str(value)
+
+
+def _iter_csv(path: str) -> Iterator[Story]:
+    # Pasted specifications easily exceed the default 128 KiB field limit
+    csv.field_size_limit(2 ** 31 - 1)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            yield story_from_row(row)
+
+
+def _iter_jsonl(path: str) -> Iterator[Story]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield story_from_row(json.loads(line))
+
+
+def _iter_json(path: str) -> Iterator[Story]:
+    with open(path, "r", encoding="utf-8") as f:
+        for item in _iter_json_array(f):
+            yield story_from_row(item)
+
+
+def _iter_json_array(f: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the elements of the issue array without loading the whole file.
+
+    Handles a top-level array or an object with an ``"issues"`` array, and
+    keeps only the unparsed tail of the file in memory.
+    """
+    decoder = json.JSONDecoder()
+    # Unparsed text starts at buffer[pos]; the consumed part is only dropped
+    # when more is read, so decoding an issue doesn't copy the rest
+    buffer = ""
+    pos = 0
+
+    def read_more(size: int = _CHUNK_SIZE) -> bool:
+        nonlocal buffer, pos
+        chunk = f.read(size)
+        if not chunk:
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    # Find the opening bracket of the array
+    while True:
+        stripped = buffer.lstrip()
+        if stripped.startswith("["):
+            buffer = stripped[1:]
+            break
+        match = _ISSUES_ARRAY.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        if not read_more():
+            raise ValueError("No issue array found in JSON export")
+
+    while True:
+        pos = _SEPARATOR.match(buffer, pos).end()
+        if pos == len(buffer):
+            if not read_more():
+                raise ValueError("Unterminated issue array in JSON export")
+            continue
+        if buffer[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # An issue cut off by the end of the buffer. Reading at least as
+            # much again as is pending keeps re-decoding a large issue linear.
+            if not read_more(max(_CHUNK_SIZE, len(buffer) - pos)):
+                raise
+            continue
+
+        pos = end
+        yield item
@@ -0,0 +1,90 @@
+# backlog_refinement_agent/state.py
+import hashlib
+import json
+import math
+import os
+import time
+from typing import Any, Dict, Optional
+
+
+# Fields whose changes warrant a fresh evaluation
+FINGERPRINT_FIELDS = ("summary", "description", "fixVersions", "components")
+
+
+class RefinementState:
+    """
+    Local record of what the previous runs evaluated, used by incremental mode.
+
+    Keeps a watermark (start time of the last completed run) and, per story,
+    the Jira ``updated`` timestamp, a fingerprint of the refined fields and
+    the digest of the findings last posted.
+    """
+
+    def __init__(self, path: str, watermark: Optional[float] = None,
+                 stories: Optional[Dict[str, Dict[str, str]]] = None) -> None:
+        self.path = path
+        self.watermark = watermark
+        self.stories: Dict[str, Dict[str, str]] = stories or {}
+
+    @classmethod
+    def load(cls, path: str) -> "RefinementState":
+        if not os.path.exists(path):
+            return cls(path)
+
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(path, data.get("watermark"), data.get("stories", {}))
+
+    def save(self, watermark: Optional[float] = None) -> None:
+        """
+        Writes the state atomically, optionally advancing the watermark.
+        """
+        if watermark is not None:
+            self.watermark = watermark
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"watermark": self.watermark, "stories": self.stories}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def fingerprint(story: Dict[str, Any]) -> str:
+        material = json.dumps(
+            [str(story.get(name, "") or "") for name in FINGERPRINT_FIELDS]
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def is_unchanged(self, story: Dict[str, Any]) -> bool:
+        previous = self.stories.get(str(story.get("id")))
+        return previous is not None and previous.get("fingerprint") == self.fingerprint(story)
+
+    def findings_unchanged(self, story: Dict[str, Any], digest: str) -> bool:
+        """
+        True if the comment last posted on the story had the same findings.
+        """
+        previous = self.stories.get(str(story.get("id")))
+        return previous is not None and previous.get("findings") == digest
+
+    def record(self, story: Dict[str, Any], findings: Optional[str] = None) -> None:
+        """
+        :param findings: Digest of the findings posted on the story, if any
+        """
+        entry = {
+            "updated": str(story.get("updated", "") or ""),
+            "fingerprint": self.fingerprint(story),
+        }
+        if findings is not None:
+            entry["findings"] = findings
+        self.stories[str(story.get("id"))] = entry
+
+    def updated_since_minutes(self, overlap_minutes: int = 0) -> Optional[int]:
+        """
+        Minutes elapsed since the watermark, padded by ``overlap_minutes``.
+
+        Returned as a relative duration so the JQL filter does not depend on
+        the Jira user's timezone. None when no run has completed yet.
+        """
+        if self.watermark is None:
+            return None
+        elapsed = max(0.0, time.time() - self.watermark)
+        return math.ceil(elapsed / 60) + overlap_minutes
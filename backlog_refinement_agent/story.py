@@ -0,0 +1,111 @@
+# backlog_refinement_agent/story.py
+from dataclasses import asdict, dataclass, field, fields
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List
+
+if TYPE_CHECKING:
+    import pandas
+
+
+@dataclass(slots=True)
+class Story:
+    """
+    A backlog story as it flows through fetch → evaluate → render → post.
+
+    Attribute names follow the Jira field names used in ``present_fields``
+    so ``story.get("fixVersions")`` and ``"fixVersions" in present_fields``
+    refer to the same thing.
+    """
+
+    id: str
+    summary: str = ""
+    description: str = ""
+    fixVersions: str = ""
+    components: str = ""
+    reporter: str = ""
+    account_id: str = ""
+    updated: str = ""
+    # Used to rank stories, not refined themselves
+    priority: str = ""
+    created: str = ""
+    present_fields: List[str] = field(default_factory=list)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """
+        Dict-style access so code written against row dicts keeps working.
+        """
+        return getattr(self, name, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Story":
+        """
+        Builds a story from a flat record, e.g. a CSV row.
+
+        Missing values become empty strings and ``present_fields`` is derived
+        from the non-empty fields unless the record already lists them.
+        """
+        values: Dict[str, Any] = {}
+        for f in fields(cls):
+            if f.name == "present_fields":
+                continue
+            value = record.get(f.name)
+            values[f.name] = "" if value is None else str(value)
+
+        if not values["id"]:
+            values["id"] = str(record.get("key") or "")
+
+        present_fields = record.get("present_fields")
+        if not isinstance(present_fields, list):
+            present_fields = [k for k, v in values.items() if v not in ("", "nan", "NaN")]
+        return cls(present_fields=present_fields, **values)
+
+    @classmethod
+    def from_jira_issue(cls, issue: Dict[str, Any]) -> "Story":
+        """
+        Flattens a raw Jira issue from the search API into a story.
+        """
+        from .refinement import extract_full_description
+
+        issue_fields = issue.get("fields", {})
+
+        description_block = issue_fields.get("description")
+        description = (
+            extract_full_description(description_block) if description_block else ""
+        )
+
+        fix_versions = issue_fields.get("fixVersions") or []
+        components = issue_fields.get("components") or []
+        reporter = issue_fields.get("reporter") or {}
+        priority = issue_fields.get("priority") or {}
+
+        fix_version_names = [fv.get("name") for fv in fix_versions if fv.get("name")]
+        component_names = [c.get("name") for c in components if c.get("name")]
+
+        story = cls(
+            id=issue.get("key") or "",
+            summary=issue_fields.get("summary", "") or "",
+            description=description,
+            fixVersions=", ".join(fix_version_names),
+            components=", ".join(component_names),
+            reporter=reporter.get("displayName", "") or "",
+            account_id=reporter.get("accountId", "") or "",
+            updated=issue_fields.get("updated", "") or "",
+            priority=priority.get("name", "") or "",
+            created=issue_fields.get("created", "") or "",
+        )
+        story.present_fields = [
+            f.name for f in fields(cls)
+            if f.name != "present_fields" and getattr(story, f.name)
+        ]
+        return story
+
+
+def stories_to_dataframe(stories: Iterable[Story]) -> "pandas.DataFrame":
+    """
+    Exports stories to a DataFrame for analysis. Requires pandas.
+    """
+    import pandas as pd
+
+    return pd.DataFrame([story.to_dict() for story in stories])
@@ -0,0 +1,112 @@
+# backlog_refinement_agent/tokens.py
+import re
+from functools import lru_cache
+from typing import Any, List, Optional
+
+# Rough characters-per-token ratio for English prose when tiktoken is absent
+_CHARS_PER_TOKEN = 4
+
+_AC_HEADING = re.compile(r"acceptance criteria|definition of done|scenario", re.IGNORECASE)
+_AC_LINE = re.compile(r"^\s*(?:[-*•]|\d+[.)]|given\b|when\b|then\b|and\b)", re.IGNORECASE)
+# Markdown headings (how adf_to_text renders ADF headings) and short "Label:" lines;
+# plain capitalised lines are not headings, since most criteria look like that
+_HEADING = re.compile(r"^\s*#{1,6}\s|^\s*[A-Za-z][^.!?:]{0,40}:\s*$")
+
+_OMITTED = "[...]"
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Optional[Any]:
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Counts tokens with tiktoken when it is installed, otherwise estimates
+    from the text length.
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def _marker_change(keep: List[bool], i: int) -> int:
+    # Keeping line i splits its omitted stretch (+1 marker), trims it (0) or
+    # removes it entirely (-1)
+    dropped_before = i > 0 and not keep[i - 1]
+    dropped_after = i + 1 < len(keep) and not keep[i + 1]
+    return dropped_before + dropped_after - 1
+
+
+def truncate_to_budget(text: str, max_tokens: int, model: str = "gpt-3.5-turbo") -> str:
+    """
+    Shortens ``text`` to roughly ``max_tokens`` tokens, keeping the lines
+    most likely to hold acceptance criteria.
+
+    The opening lines are kept for context. The remaining budget goes to
+    acceptance criteria sections, Given/When/Then lines and list items, then
+    to the rest of the text in order. Dropped stretches are marked with
+    ``[...]``. A budget of 0 disables truncation.
+    """
+    if max_tokens <= 0 or count_tokens(text, model) <= max_tokens:
+        return text
+
+    lines = text.splitlines()
+    costs = [count_tokens(line, model) + 1 for line in lines]
+    marker_cost = count_tokens(_OMITTED, model) + 1
+
+    # Lines inside an acceptance criteria section, or shaped like criteria
+    priority: List[bool] = []
+    in_section = False
+    for line in lines:
+        if _AC_HEADING.search(line):
+            in_section = True
+        elif line.strip() and _HEADING.match(line) and not _AC_LINE.match(line):
+            in_section = False
+        priority.append(in_section or bool(_AC_LINE.match(line)))
+
+    keep = [False] * len(lines)
+    # Nothing kept yet: the whole text is one omitted stretch with one marker
+    remaining = max_tokens - marker_cost
+
+    head_budget = max_tokens // 5
+    for i, cost in enumerate(costs):
+        total = cost + _marker_change(keep, i) * marker_cost
+        if cost > head_budget or total > remaining:
+            break
+        keep[i] = True
+        head_budget -= cost
+        remaining -= total
+
+    for wanted in (True, False):
+        for i, cost in enumerate(costs):
+            if keep[i] or priority[i] != wanted:
+                continue
+            total = cost + _marker_change(keep, i) * marker_cost
+            if total > remaining:
+                continue
+            keep[i] = True
+            remaining -= total
+
+    output: List[str] = []
+    omitted = False
+    for line, kept in zip(lines, keep):
+        if kept:
+            output.append(line)
+            omitted = False
+        elif not omitted:
+            output.append(_OMITTED)
+            omitted = True
+
+    if not any(keep):
+        # A single enormous line: fall back to a character cut
+        return text[: max(0, max_tokens - marker_cost) * _CHARS_PER_TOKEN] + "\n" + _OMITTED
+    return "\n".join(output)
@@ -0,0 +1,288 @@
+# backlog_refinement_agent/transport.py
+import email.utils
+import multiprocessing
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.exceptions import ConnectTimeoutError
+
+from .config import settings
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter shared by every thread using a transport.
+
+    Allows bursts of up to ``burst`` requests and refills at ``rate_per_sec``.
+    A rate of 0 disables limiting.
+    """
+
+    # Indexes into ``_state``
+    _TOKENS, _UPDATED, _PAUSED_UNTIL = 0, 1, 2
+
+    def __init__(self, rate_per_sec: float, burst: int = 1) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.capacity = max(1, burst)
+        self._state: Any = [float(self.capacity), time.monotonic(), 0.0]
+        self._lock: Any = threading.Lock()
+
+    def acquire(self) -> None:
+        state = self._state
+        if self.rate_per_sec <= 0 and not state[self._PAUSED_UNTIL]:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < state[self._PAUSED_UNTIL]:
+                    wait = state[self._PAUSED_UNTIL] - now
+                elif self.rate_per_sec <= 0:
+                    return
+                else:
+                    tokens = min(
+                        self.capacity,
+                        state[self._TOKENS] + (now - state[self._UPDATED]) * self.rate_per_sec,
+                    )
+                    state[self._UPDATED] = now
+                    if tokens >= 1:
+                        state[self._TOKENS] = tokens - 1
+                        return
+                    state[self._TOKENS] = tokens
+                    wait = (1 - tokens) / self.rate_per_sec
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Holds back every caller for ``seconds``, e.g. after a 429.
+        """
+        with self._lock:
+            self._state[self._PAUSED_UNTIL] = max(
+                self._state[self._PAUSED_UNTIL], time.monotonic() + seconds
+            )
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    ``TokenBucket`` whose state lives in shared memory, so every worker
+    process draws from one budget. Pass it to workers when they start
+    (e.g. through a pool initializer) and install it with
+    ``install_rate_limiter``.
+    """
+
+    def __init__(self, rate_per_sec: float, burst: int = 1, context: Any = None) -> None:
+        self.rate_per_sec = rate_per_sec
+        self.capacity = max(1, burst)
+        context = context or multiprocessing.get_context()
+        # time.monotonic() is system-wide, so timestamps compare across processes
+        self._state = context.Array("d", [float(self.capacity), time.monotonic(), 0.0])
+        self._lock = self._state.get_lock()
+
+
+# Methods that may be sent twice without changing the result
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def _never_sent(error: Exception) -> bool:
+    """
+    True if the connection failed before the request went out, e.g.
+    connection refused, so the server cannot have acted on it.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the real error;
+    # NewConnectionError (refused, unreachable) is a ConnectTimeoutError
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, "reason", reason), ConnectTimeoutError)
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HttpTransport:
+    """
+    Keep-alive HTTP session with rate limiting and retries.
+
+    Idempotent requests that fail with a connection error, a timeout or
+    one of ``retry_statuses`` are retried with exponential backoff and
+    jitter. Other methods such as POST may have been acted on even though
+    no response arrived, and retrying them would e.g. post a comment twice,
+    so they are only retried on a 429 or when the connection could not be
+    made at all, unless the caller marks them ``idempotent`` (e.g. a search
+    sent as a POST). A ``Retry-After`` header takes precedence over the
+    computed backoff, and a 429 pauses the shared rate limiter so
+    concurrent callers back off together.
+    """
+
+    def __init__(
+        self,
+        auth: Any = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        pool_size: int = 16,
+        timeout: float = 30.0,
+        retry_statuses: Iterable[int] = (429, 500, 502, 503, 504),
+    ) -> None:
+        self.rate_limiter = rate_limiter or TokenBucket(0)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retries = 0
+        self._retries_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        Sends a request, retrying transient failures.
+
+        Returns the last response once it succeeds or retries run out.
+        Connection errors are re-raised after the final attempt.
+
+        :param idempotent: Whether the request may safely be sent twice
+            (defaults to True for GET, HEAD, OPTIONS, PUT and DELETE)
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method.upper() in _IDEMPOTENT_METHODS
+        attempt = 0
+
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries or not (idempotent or _never_sent(e)):
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                status = response.status_code
+                retryable = status in self.retry_statuses and (idempotent or status == 429)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+
+                retry_after = _retry_after_seconds(response)
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if response.status_code == 429:
+                    self.rate_limiter.pause(delay)
+                response.close()
+
+            attempt += 1
+            with self._retries_lock:
+                self.retries += 1
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+
+_transports: Dict[str, HttpTransport] = {}
+_transports_lock = threading.Lock()
+
+# Rate limiters that replace the per-process ones, e.g. shared across workers
+_rate_limiters: Dict[str, TokenBucket] = {}
+
+
+def install_rate_limiter(name: str, rate_limiter: TokenBucket) -> None:
+    """
+    Makes the ``name`` transport ("jira" or "slack") use ``rate_limiter``.
+    Must be called before the transport is first used.
+    """
+    with _transports_lock:
+        _rate_limiters[name] = rate_limiter
+
+
+def _shared_transport(name: str, factory: Callable[[], HttpTransport]) -> HttpTransport:
+    with _transports_lock:
+        if name not in _transports:
+            _transports[name] = factory()
+        return _transports[name]
+
+
+def _new_transport(name: str, auth: Any, rate_per_sec: float, burst: int) -> HttpTransport:
+    return HttpTransport(
+        auth=auth,
+        rate_limiter=_rate_limiters.get(name) or TokenBucket(rate_per_sec, burst),
+        max_retries=settings.http.max_retries,
+        backoff_base=settings.http.backoff_seconds,
+        backoff_max=settings.http.backoff_max_seconds,
+        pool_size=settings.http.pool_size,
+        timeout=settings.http.timeout_seconds,
+    )
+
+
+def retry_counts() -> Dict[str, int]:
+    """
+    Returns the number of retried requests per shared transport.
+    """
+    with _transports_lock:
+        return {name: transport.retries for name, transport in _transports.items()}
+
+
+def get_jira_transport() -> HttpTransport:
+    """
+    Returns the process-wide Jira transport, authenticated with JIRA_EMAIL
+    and JIRA_API_TOKEN.
+    """
+    return _shared_transport(
+        "jira",
+        lambda: _new_transport(
+            "jira",
+            HTTPBasicAuth(settings.jira.email, settings.jira.api_token),
+            settings.jira.rate_limit_per_sec,
+            settings.jira.rate_limit_burst,
+        ),
+    )
+
+
+def get_slack_transport() -> HttpTransport:
+    """
+    Returns the process-wide Slack webhook transport.
+    """
+    return _shared_transport(
+        "slack",
+        lambda: _new_transport("slack", None, settings.slack.rate_limit_per_sec, 1),
+    )
@@ -0,0 +1,118 @@
+"""
+Compares the recursive ADF extractor this package used to ship with
+``adf_to_text`` on large synthetic documents.
+
+    python benchmarks/bench_adf.py --paragraphs 20000
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backlog_refinement_agent.adf import adf_to_text  # noqa: E402
+
+
+def legacy_extract_full_description(description_block):
+    # The previous refinement.extract_full_description, kept for comparison
+    def extract_text_from_node(node):
+        text = ""
+        if "text" in node:
+            text += node["text"]
+        if "content" in node:
+            for child in node["content"]:
+                text += extract_text_from_node(child)
+        return text
+
+    description = ""
+    if isinstance(description_block, dict) and "content" in description_block:
+        for block in description_block["content"]:
+            block_text = extract_text_from_node(block)
+            if block.get("type") == "bulletList":
+                for item in block.get("content", []):
+                    item_text = extract_text_from_node(item).strip()
+                    if item_text:
+                        description += f"- {item_text}\n"
+            else:
+                if block_text.strip():
+                    description += block_text + "\n"
+
+    return description.strip()
+
+
+def _text(value: str) -> Dict[str, Any]:
+    return {"type": "text", "text": value}
+
+
+def _paragraph(value: str) -> Dict[str, Any]:
+    return {"type": "paragraph", "content": [_text(value)]}
+
+
+def wide_document(paragraphs: int) -> Dict[str, Any]:
+    """A long specification: paragraphs, headings and bullet lists."""
+    content: List[Dict[str, Any]] = []
+    for i in range(paragraphs):
+        if i % 50 == 0:
+            content.append({"type": "heading", "attrs": {"level": 2}, "content": [_text(f"Section {i}")]})
+        if i % 10 == 0:
+            content.append({
+                "type": "bulletList",
+                "content": [
+                    {"type": "listItem", "content": [_paragraph(f"Given state {i}.{j} when acting then result")]}
+                    for j in range(5)
+                ],
+            })
+        content.append(_paragraph(f"Paragraph {i} " + "lorem ipsum dolor sit amet " * 8))
+    return {"type": "doc", "content": content}
+
+
+def deep_document(depth: int) -> Dict[str, Any]:
+    """One bullet list nested ``depth`` levels deep."""
+    node: Dict[str, Any] = _paragraph("innermost")
+    for _ in range(depth):
+        node = {"type": "bulletList", "content": [{"type": "listItem", "content": [node]}]}
+    return {"type": "doc", "content": [node]}
+
+
+def _time(func, document, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(document)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--depth", type=int, default=3000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    document = wide_document(args.paragraphs)
+    legacy = _time(legacy_extract_full_description, document, args.repeats)
+    current = _time(adf_to_text, document, args.repeats)
+    size = len(adf_to_text(document))
+    print(f"wide document ({size / 1e6:.1f}M chars of output)")
+    print(f"  legacy recursive:  {legacy * 1000:9.1f} ms")
+    print(f"  adf_to_text:       {current * 1000:9.1f} ms")
+
+    capped = _time(lambda doc: adf_to_text(doc, max_chars=20000), document, args.repeats)
+    print(f"  adf_to_text capped at 20k chars: {capped * 1000:.1f} ms")
+
+    deep = deep_document(args.depth)
+    try:
+        legacy_extract_full_description(deep)
+        legacy_result = "ok"
+    except RecursionError:
+        legacy_result = "RecursionError"
+    print(f"deep document ({args.depth} nested lists)")
+    print(f"  legacy recursive:  {legacy_result}")
+    print(f"  adf_to_text:       {_time(adf_to_text, deep, args.repeats) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures the rule-based pre-filter on a labeled sample set.
+
+Reports the fraction of checks decided without the LLM and how often those
+decisions agree with the labels. Thresholds can be tuned with the same
+HEURISTICS_* variables the agent reads.
+
+    python benchmarks/bench_heuristics.py [--samples path.jsonl]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backlog_refinement_agent.heuristics import (  # noqa: E402
+    prefilter_description,
+    prefilter_summary,
+)
+
+DEFAULT_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "heuristic_samples.jsonl")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES)
+    parser.add_argument("--verbose", action="store_true", help="Print every decided sample")
+    args = parser.parse_args()
+
+    totals = {"summary": [0, 0, 0], "description": [0, 0, 0]}  # samples, decided, correct
+    with open(args.samples, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            sample = json.loads(line)
+            kind = sample["kind"]
+            check = prefilter_summary if kind == "summary" else prefilter_description
+            verdict = check(sample["text"])
+
+            counts = totals[kind]
+            counts[0] += 1
+            if verdict is None:
+                continue
+            counts[1] += 1
+            correct = verdict[0] == sample["flagged"]
+            counts[2] += int(correct)
+            if args.verbose or not correct:
+                mark = "ok " if correct else "BAD"
+                print(f"[{mark}] {kind}: {sample['text'][:60]!r} -> flagged={verdict[0]}")
+
+    all_samples = sum(c[0] for c in totals.values())
+    all_decided = sum(c[1] for c in totals.values())
+    all_correct = sum(c[2] for c in totals.values())
+    for kind, (samples, decided, correct) in totals.items():
+        agreement = correct / decided if decided else 0.0
+        print(f"{kind:<12} {decided:3d}/{samples:<3d} decided locally ({decided / samples:.0%}), "
+              f"{agreement:.0%} agree with labels")
+    print(f"LLM calls avoided: {all_decided}/{all_samples} ({all_decided / all_samples:.0%}), "
+          f"agreement {all_correct / all_decided if all_decided else 0.0:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Times the refinement history: recording results and answering the
+``report`` trend queries over months of synthetic history.
+
+One run per day is recorded for ``--days`` days, each evaluating
+``--stories`` stories; the rows are written straight into their days so
+the history spans the whole period.
+
+    python benchmarks/bench_history.py --days 180 --stories 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backlog_refinement_agent import history  # noqa: E402
+from bench_rendering import synthetic_refinements  # noqa: E402
+
+_COMPONENTS = ["Login", "Checkout", "Search", "Invoice", "Email", "Account", "Order", "Session", "", "Search, Email"]
+
+
+def _populate(path: str, days: int, stories: int) -> float:
+    # Returns the seconds spent recording, not moving rows between days
+    refinements = synthetic_refinements(stories, distinct=stories)
+    for i, refinement in enumerate(refinements):
+        refinement.story.components = _COMPONENTS[i % len(_COMPONENTS)]
+        if i % 4 == 0:
+            # Unflagged stories make the rates differ
+            refinement.issues = []
+            refinement.ac_suggestion = ""
+
+    today = int(time.time() // 86400)
+    recording = 0.0
+    for offset in range(days, 0, -1):
+        store = history.RefinementHistory(path, name="bench")
+        started = time.perf_counter()
+        for refinement in refinements:
+            store.add(refinement)
+        store.flush()
+        recording += time.perf_counter() - started
+        # Move the run's rows back to the day it stands for
+        day = today - offset + 1
+        with store._conn:
+            for table in ("results", "result_components", "result_issues"):
+                store._conn.execute(f"UPDATE {table} SET day = ? WHERE run_id = ?", (day, store.run_id))
+        store.close()
+    return recording
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--stories", type=int, default=2000, help="Stories evaluated per daily run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "history.sqlite")
+        elapsed = _populate(path, args.days, args.stories)
+        total = args.days * args.stories
+        print(
+            f"recorded {total} results in {elapsed:.1f}s ({total / elapsed:.0f} results/s), "
+            f"{os.path.getsize(path) / 1e6:.1f} MB"
+        )
+
+        for by in history.DIMENSIONS:
+            for period, since in (("week", 90), ("month", args.days)):
+                started = time.perf_counter()
+                rows = history.trend(path, by, period, since)
+                elapsed = time.perf_counter() - started
+                print(f"trend by {by:<10} per {period:<5} over {since:>3} days: {elapsed * 1000:7.1f} ms ({len(rows)} rows)")
+
+
+if __name__ == "__main__":
+    main()
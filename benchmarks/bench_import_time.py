@@ -0,0 +1,113 @@
+"""
+Measures start-up cost of the agent.
+
+Each measurement runs in a fresh interpreter:
+  - importing ``backlog_refinement_agent`` (and which heavy libraries that loads)
+  - ``python -m backlog_refinement_agent --help``
+  - a ``--dry-run`` over a small local CSV, with the OpenAI stub server
+    from ``stub_servers`` answering completions
+
+    python benchmarks/bench_import_time.py --repeat 5
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_servers import OpenAIStub, synthetic_backlog  # noqa: E402
+
+_HEAVY_MODULES = ("openai", "requests", "pandas", "dotenv", "tiktoken")
+
+_IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import backlog_refinement_agent\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(json.dumps({'seconds': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+) % (_HEAVY_MODULES,)
+
+
+def _wall(command: List[str], env: Dict[str, str], cwd: str) -> float:
+    started = time.perf_counter()
+    subprocess.run(command, env=env, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def _write_backlog(path: str, count: int) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "summary", "description", "components", "fixVersions", "reporter"])
+        writer.writeheader()
+        for issue in synthetic_backlog(count):
+            fields = issue["fields"]
+            writer.writerow({
+                "id": issue["key"],
+                "summary": fields["summary"],
+                "description": json.dumps(fields["description"]),
+                "components": ", ".join(c["name"] for c in fields["components"]),
+                "fixVersions": ", ".join(v["name"] for v in fields["fixVersions"]),
+                "reporter": fields["reporter"]["displayName"],
+            })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement; the median is reported")
+    parser.add_argument("--stories", type=int, default=20, help="Stories in the dry-run backlog")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+
+    imports = []
+    loaded: List[str] = []
+    for _ in range(args.repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE], env=env, cwd=REPO_ROOT,
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        imports.append(result["seconds"])
+        loaded = result["loaded"]
+
+    help_runs = [
+        _wall([sys.executable, "-m", "backlog_refinement_agent", "--help"], env, REPO_ROOT)
+        for _ in range(args.repeat)
+    ]
+
+    stub = OpenAIStub().start()
+    with tempfile.TemporaryDirectory() as workdir:
+        backlog = os.path.join(workdir, "backlog.csv")
+        _write_backlog(backlog, args.stories)
+        dry_env = dict(env)
+        dry_env.update({
+            "USE_JIRA": "0",
+            "LOCAL_FILE": backlog,
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"{stub.url}/v1",
+            "LLM_CACHE_ENABLED": "0",
+            "RUN_REPORT_PATH": os.path.join(workdir, "run_report.json"),
+        })
+        dry_runs = [
+            _wall([sys.executable, "-m", "backlog_refinement_agent", "--dry-run"], dry_env, workdir)
+            for _ in range(args.repeat)
+        ]
+    stub.stop()
+
+    print(f"import backlog_refinement_agent: {statistics.median(imports) * 1000:8.1f} ms (in-process)")
+    print(f"  heavy modules loaded at import: {', '.join(loaded) or 'none'}")
+    print(f"--help:                          {statistics.median(help_runs) * 1000:8.1f} ms (wall, incl. interpreter)")
+    print(f"--dry-run, {args.stories} stories:         {statistics.median(dry_runs) * 1000:8.1f} ms (wall, incl. interpreter)")
+
+
+if __name__ == "__main__":
+    main()
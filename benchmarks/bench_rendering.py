@@ -0,0 +1,175 @@
+"""
+Compares the line-by-line comment and Slack rendering this package used to
+ship with the findings-based renderers in ``rendering``.
+
+Each story is rendered to a Jira comment payload and a Slack entry.
+``--distinct`` sets how many different explanation texts occur, i.e. how
+often the render cache can reuse a body.
+
+    python benchmarks/bench_rendering.py --stories 10000 --distinct 500
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backlog_refinement_agent import rendering  # noqa: E402
+from backlog_refinement_agent.pipeline import Refinement  # noqa: E402
+from backlog_refinement_agent.story import Story  # noqa: E402
+
+
+def _legacy_explanation_for(issue: str, explanations: Dict[str, Any]) -> Any:
+    issue_lower = issue.lower()
+    if issue_lower.startswith("summary"):
+        return explanations.get("summary")
+    if issue_lower.startswith("acceptance"):
+        return explanations.get("description")
+    return explanations.get(issue_lower) or explanations.get(issue)
+
+
+def _legacy_explanation_lines(exp: Any) -> List[str]:
+    if isinstance(exp, dict):
+        return [f"      {k}: {v}" for k, v in exp.items()]
+    return [f"      {line}" for line in str(exp).splitlines()]
+
+
+def legacy_comment_lines(refinement: Refinement) -> List[str]:
+    # The previous pipeline.render_comment_lines, kept for comparison
+    story = refinement.story
+    comment_lines: List[str] = ["Backlog Refinement Summary"]
+    header_line = f"- {story.id}"
+    if story.reporter:
+        header_line += f" (reported by {story.reporter})"
+    comment_lines.append(header_line)
+
+    for issue in refinement.issues:
+        comment_lines.append(f"  - {issue}")
+        exp = _legacy_explanation_for(issue, refinement.explanations)
+        if exp:
+            comment_lines.extend(_legacy_explanation_lines(exp))
+        else:
+            comment_lines.append("      (no explanation available)")
+        if issue.lower().startswith("acceptance") and refinement.ac_suggestion:
+            comment_lines.append("      Suggested Acceptance Criteria:")
+            for line in str(refinement.ac_suggestion).splitlines():
+                line = line.strip()
+                if not line or line.lower().startswith("suggested acceptance criteria"):
+                    continue
+                if line.startswith("-"):
+                    comment_lines.append(f"         {line}")
+                else:
+                    comment_lines.append(f"         - {line}")
+        comment_lines.append("")
+        comment_lines.append("")
+    return comment_lines
+
+
+def legacy_comment_payload(comment_lines: List[str], reporter_name: str, account_id: str) -> Dict[str, Any]:
+    # The previous jira_client.build_comment_payload: one paragraph per line
+    content_blocks = []
+    if account_id:
+        content_blocks.append({
+            "type": "paragraph",
+            "content": [
+                {"type": "mention", "attrs": {"id": account_id, "text": f"@{reporter_name}"}},
+                {"type": "text", "text": ", Please review the following issues identified during backlog refinement:"},
+            ],
+        })
+    for line in comment_lines:
+        content_blocks.append({"type": "paragraph", "content": [{"type": "text", "text": line}]})
+    return {"body": {"type": "doc", "version": 1, "content": content_blocks}}
+
+
+def legacy_slack_block(refinement: Refinement) -> str:
+    # The previous pipeline.render_slack_block plus slack_summary escaping
+    story = refinement.story
+    slack_lines: List[str] = []
+    first_line = f"- {story.id}"
+    if story.reporter:
+        first_line += f" (reported by @{story.reporter})"
+    slack_lines.append(first_line)
+    for issue in refinement.issues:
+        slack_lines.append(f"  - {issue}")
+        exp = _legacy_explanation_for(issue, refinement.explanations)
+        if exp:
+            slack_lines.extend(_legacy_explanation_lines(exp))
+            if issue.lower().startswith("acceptance") and refinement.ac_suggestion:
+                slack_lines.append("      Acceptance criteria suggestion added in Jira ticket's comment.")
+        else:
+            slack_lines.append("      (no explanation available)")
+        slack_lines.append("")
+    text = "\n".join(slack_lines)
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def synthetic_refinements(count: int, distinct: int) -> List[Refinement]:
+    refinements = []
+    for i in range(count):
+        variant = i % max(1, distinct)
+        issues = ["Summary Analysis", "Acceptance Criteria Analysis"]
+        if i % 2:
+            issues.append("Missing target version")
+        if i % 3:
+            issues.append("Missing Component")
+        refinements.append(Refinement(
+            Story(id=f"BENCH-{i}", reporter=f"Reporter {i % 40}", account_id=f"acct-{i % 40}"),
+            issues,
+            {
+                "summary": f"Classification: Vague\nExplanation: The summary does not say what changes ({variant}).",
+                "description": f"Classification: Incomplete\nExplanation: No testable criteria are given ({variant}).",
+                "Missing Component": "No Jira component is set for this story.",
+            },
+            "Suggested Acceptance Criteria\n\n"
+            f"- The report lists variant {variant}\n"
+            "- Errors are shown with a clear message\n"
+            "- The behaviour is covered by automated tests",
+        ))
+    return refinements
+
+
+def _legacy(refinement: Refinement) -> None:
+    story = refinement.story
+    legacy_comment_payload(legacy_comment_lines(refinement), story.reporter, story.account_id)
+    legacy_slack_block(refinement)
+
+
+def _findings(refinement: Refinement) -> None:
+    findings = rendering.build_findings(refinement)
+    rendering.render_adf(findings)
+    rendering.render_slack(findings)
+
+
+def _run(name: str, refinements: List[Refinement], render: Callable[[Refinement], None]) -> None:
+    start = time.perf_counter()
+    for refinement in refinements:
+        render(refinement)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<28} {len(refinements) / elapsed:10.0f} stories/s "
+        f"({elapsed * 1e6 / len(refinements):6.1f} us/story)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stories", type=int, default=10000)
+    parser.add_argument("--distinct", type=int, default=500, help="Distinct explanation texts")
+    args = parser.parse_args()
+
+    refinements = synthetic_refinements(args.stories, args.distinct)
+    _run("legacy line rendering", refinements, _legacy)
+
+    rendering._cache = rendering._RenderCache(0)
+    _run("findings, no cache", refinements, _findings)
+
+    rendering._cache = rendering._RenderCache(4096)
+    _run("findings, render cache", refinements, _findings)
+    stats = rendering.render_cache_stats()
+    print(f"render cache: {stats['hits']} hits, {stats['misses']} misses")
+
+
+if __name__ == "__main__":
+    main()
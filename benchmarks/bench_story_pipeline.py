@@ -0,0 +1,93 @@
+"""
+Compares the pandas row pipeline with the ``Story`` record pipeline.
+
+Reports the startup cost of importing pandas and the per-story overhead of
+turning raw Jira issues into records and walking them.
+
+    python benchmarks/bench_story_pipeline.py --stories 50000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backlog_refinement_agent.story import Story  # noqa: E402
+
+
+def _synthetic_issues(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "key": f"BENCH-{i}",
+            "fields": {
+                "summary": f"As a user I want feature {i} so that I can do things",
+                "description": {
+                    "type": "doc",
+                    "content": [
+                        {"type": "paragraph", "content": [{"type": "text", "text": f"Details for {i}"}]},
+                    ],
+                },
+                "fixVersions": [{"name": "1.0"}] if i % 2 else [],
+                "components": [{"name": "API"}] if i % 3 else [],
+                "reporter": {"displayName": "Reporter", "accountId": "abc"},
+                "updated": "2024-01-01T00:00:00.000+0000",
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def _time_import(statement: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _pandas_pipeline(issues: List[Dict[str, Any]]) -> int:
+    import pandas as pd
+
+    rows = [Story.from_jira_issue(issue).to_dict() for issue in issues]
+    df = pd.DataFrame(rows)
+    df.fillna("", inplace=True)
+    touched = 0
+    for _, story in df.iterrows():
+        if story.get("summary") and story.get("present_fields"):
+            touched += 1
+    return touched
+
+
+def _story_pipeline(issues: List[Dict[str, Any]]) -> int:
+    touched = 0
+    for story in (Story.from_jira_issue(issue) for issue in issues):
+        if story.summary and story.present_fields:
+            touched += 1
+    return touched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stories", type=int, default=20000)
+    parser.add_argument("--import-repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = _time_import("pass", args.import_repeats)
+    with_pandas = _time_import("import pandas", args.import_repeats)
+    print(f"interpreter startup:      {baseline * 1000:8.1f} ms")
+    print(f"import pandas:            {(with_pandas - baseline) * 1000:8.1f} ms extra")
+
+    issues = _synthetic_issues(args.stories)
+    for name, pipeline in (("pandas iterrows", _pandas_pipeline), ("Story records", _story_pipeline)):
+        start = time.perf_counter()
+        pipeline(issues)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<25} {elapsed * 1e6 / args.stories:8.2f} us/story ({elapsed:.2f}s total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Runs ``cli.main`` end to end against the local stub servers.
+
+Each backlog size runs in a fresh interpreter (settings are resolved once per
+process) with the Jira, OpenAI and Slack stubs from
+``stub_servers`` standing in for the real services. Reports wall time and
+stories per second, and can compare against a saved baseline to catch
+regressions.
+
+    python benchmarks/run_e2e.py --sizes 100,1000,10000
+    python benchmarks/run_e2e.py --save-baseline benchmarks/e2e_baseline.json
+    python benchmarks/run_e2e.py --baseline benchmarks/e2e_baseline.json --tolerance 0.2
+
+Timing covers ``cli.main`` only, not interpreter start-up.
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_servers import Behaviour, StubServers  # noqa: E402
+
+
+def _child(result_path: str) -> None:
+    from backlog_refinement_agent import cli
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        cli.main([])
+    elapsed = time.perf_counter() - started
+
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({"seconds": elapsed}, f)
+
+
+def _run_size(size: int, args: argparse.Namespace, workdir: str) -> Dict[str, Any]:
+    jira = Behaviour(latency=args.jira_latency, error_rate=args.error_rate,
+                     rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after)
+    openai = Behaviour(latency=args.llm_latency, jitter=args.llm_latency / 2, error_rate=args.error_rate,
+                       rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after)
+
+    result_path = os.path.join(workdir, f"result_{size}.json")
+    report_path = os.path.join(workdir, f"report_{size}.json")
+
+    with StubServers(stories=size, jira=jira, openai=openai) as stubs:
+        env = dict(os.environ)
+        env.update(stubs.environ())
+        env.update({
+            "LLM_CACHE_ENABLED": "0",
+            "REFINEMENT_INCREMENTAL": "0",
+            "JIRA_MAX_RESULTS": "100",
+            "JIRA_RATE_LIMIT_PER_SEC": str(args.jira_rate),
+            "SLACK_RATE_LIMIT_PER_SEC": "0",
+            "HTTP_BACKOFF_SECONDS": "0.05",
+            "LLM_BATCH_SIZE": str(args.batch_size),
+            "LLM_CONCURRENCY": str(args.concurrency),
+            "LLM_COMBINED": "1" if args.combined else "0",
+            "RUN_REPORT_PATH": report_path,
+            "PROMETHEUS_TEXTFILE": "",
+        })
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", result_path],
+            env=env,
+            cwd=workdir,
+            check=True,
+        )
+        comments = stubs.jira.comment_count
+        openai_requests = stubs.openai.stats.requests
+        injected = stubs.jira.stats.errors + stubs.jira.stats.rate_limited + \
+            stubs.openai.stats.errors + stubs.openai.stats.rate_limited
+
+    with open(result_path, encoding="utf-8") as f:
+        seconds = json.load(f)["seconds"]
+    with open(report_path, encoding="utf-8") as f:
+        counters = json.load(f)["counters"]
+
+    return {
+        "stories": size,
+        "seconds": seconds,
+        "stories_per_sec": size / seconds if seconds else 0.0,
+        "flagged": counters.get("flagged", 0),
+        "llm_requests": openai_requests,
+        "comments": comments,
+        "injected_failures": injected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma-separated backlog sizes")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="Stub OpenAI latency in seconds")
+    parser.add_argument("--jira-latency", type=float, default=0.005, help="Stub Jira latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of stub requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--jira-rate", type=float, default=0, help="JIRA_RATE_LIMIT_PER_SEC for the run (0 = unlimited)")
+    parser.add_argument("--batch-size", type=int, default=1, help="LLM_BATCH_SIZE for the run")
+    parser.add_argument("--combined", action="store_true", help="Evaluate each story with one JSON completion (LLM_COMBINED)")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM_CONCURRENCY for the run")
+    parser.add_argument("--baseline", help="Fail if stories/s drops below this saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional slowdown against the baseline")
+    parser.add_argument("--save-baseline", help="Write the measured stories/s to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results: List[Dict[str, Any]] = []
+
+    print(f"{'stories':>8} {'wall s':>8} {'stories/s':>10} {'flagged':>8} {'LLM reqs':>9} {'comments':>9} {'injected':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            result = _run_size(size, args, workdir)
+            results.append(result)
+            print(
+                f"{result['stories']:>8} {result['seconds']:>8.2f} {result['stories_per_sec']:>10.1f} "
+                f"{result['flagged']:>8} {result['llm_requests']:>9} {result['comments']:>9} "
+                f"{result['injected_failures']:>9}"
+            )
+
+    measured = {str(result["stories"]): result["stories_per_sec"] for result in results}
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(measured, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = []
+        for size, rate in measured.items():
+            expected = baseline.get(size)
+            if expected and rate < expected * (1 - args.tolerance):
+                regressions.append(f"{size} stories: {rate:.1f}/s vs baseline {expected:.1f}/s")
+        if regressions:
+            print("Regression against baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"Within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
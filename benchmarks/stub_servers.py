@@ -0,0 +1,432 @@
+"""
+Local stand-ins for the Jira, OpenAI and Slack HTTP APIs.
+
+Each stub is a threaded HTTP server on an ephemeral port that implements
+just enough of the real endpoint for ``cli.main`` to run end to end:
+
+  - Jira: ``POST /rest/api/3/search/jql`` (token paging over a synthetic
+    backlog), ``GET /rest/api/3/myself`` and the issue comment endpoints
+  - OpenAI: ``POST /v1/chat/completions`` with canned single and batch
+    classifications, suggestions and token usage
+  - Slack: the incoming webhook
+
+Latency, error rate and 429 behaviour are set per server with ``Behaviour``.
+
+    with StubServers(stories=1000) as stubs:
+        os.environ.update(stubs.environ())
+"""
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+_NOUNS = [
+    "account", "audit log", "billing page", "cart", "checkout", "dashboard",
+    "export", "invoice", "login form", "notification", "order history",
+    "password reset", "payment method", "profile", "report", "search",
+    "session", "settings page", "subscription", "team", "upload", "webhook",
+    "workspace", "API token", "CSV import", "email digest", "role", "filter",
+]
+_VERBS = ["Add", "Allow", "Export", "Show", "Validate", "Sync", "Archive", "Filter", "Notify", "Support"]
+_VAGUE = ["Fix stuff", "Improvements", "Misc changes", "Cleanup", "Update things", "TBD"]
+_ROLES = ["admin", "customer", "support agent", "team lead", "guest"]
+_PRIORITIES = ["Highest", "High", "Medium", "Medium", "Low", "Lowest"]
+
+_AGENT_ACCOUNT_ID = "stub-agent"
+
+
+@dataclass
+class Behaviour:
+    """
+    How a stub server misbehaves.
+
+    :param latency: Seconds added to every response
+    :param jitter: Extra random latency, up to this many seconds
+    :param error_rate: Fraction of requests answered with a 500
+    :param rate_limit_rate: Fraction of requests answered with a 429
+    :param retry_after: ``Retry-After`` seconds sent with a 429
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 0.1
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    by_route: Dict[str, int] = field(default_factory=dict)
+
+
+def synthetic_issue(index: int, rng: random.Random) -> Dict[str, Any]:
+    """
+    Builds one raw Jira issue. Roughly a third have vague summaries or thin
+    descriptions, and a few are near-copies of an earlier issue.
+    """
+    noun = rng.choice(_NOUNS)
+    other = rng.choice(_NOUNS)
+    shape = rng.random()
+
+    if shape < 0.15:
+        summary = rng.choice(_VAGUE)
+    elif shape < 0.6:
+        summary = f"As a {rng.choice(_ROLES)} I want to {rng.choice(_VERBS).lower()} the {noun} #{index}"
+    else:
+        summary = f"{rng.choice(_VERBS)} {noun} for {other} {index}"
+
+    paragraphs: List[Dict[str, Any]] = [
+        {
+            "type": "paragraph",
+            "content": [{
+                "type": "text",
+                "text": f"The {noun} should work together with the {other} (ref {index}).",
+            }],
+        }
+    ]
+    if rng.random() < 0.6:
+        criteria = [
+            f"Given a {rng.choice(_ROLES)} on the {noun}, when they open the {other}, then item {index}.{n} is shown"
+            for n in range(rng.randint(2, 5))
+        ]
+        paragraphs.append({"type": "heading", "attrs": {"level": 3},
+                           "content": [{"type": "text", "text": "Acceptance Criteria"}]})
+        paragraphs.append({
+            "type": "bulletList",
+            "content": [
+                {"type": "listItem", "content": [{"type": "paragraph", "content": [{"type": "text", "text": c}]}]}
+                for c in criteria
+            ],
+        })
+
+    return {
+        "id": str(10000 + index),
+        "key": f"BENCH-{index}",
+        "fields": {
+            "summary": summary,
+            "description": {"type": "doc", "version": 1, "content": paragraphs},
+            "fixVersions": [{"name": "1.0"}] if rng.random() < 0.7 else [],
+            "components": [{"name": noun.split()[0].title()}] if rng.random() < 0.8 else [],
+            "reporter": {"displayName": f"Reporter {index % 17}", "accountId": f"acct-{index % 17}"},
+            "updated": "2024-01-01T00:00:00.000+0000",
+            "created": f"2023-{1 + index % 12:02d}-{1 + index % 28:02d}T09:00:00.000+0000",
+            "priority": {"name": _PRIORITIES[index % len(_PRIORITIES)]},
+            "issuetype": {"name": "Story"},
+        },
+    }
+
+
+def synthetic_backlog(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    issues = [synthetic_issue(i, rng) for i in range(count)]
+    # A few near-duplicates, as real backlogs accumulate
+    for i in range(0, count, 25):
+        if i == 0:
+            continue
+        source = issues[rng.randrange(i)]
+        copy = json.loads(json.dumps(source))
+        copy["id"], copy["key"] = issues[i]["id"], issues[i]["key"]
+        issues[i] = copy
+    return issues
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, handler: type, behaviour: Behaviour, seed: int) -> None:
+        super().__init__(("127.0.0.1", 0), handler)
+        self.behaviour = behaviour
+        self.stats = StubStats()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_StubServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: _StubServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PUT(self) -> None:
+        self._handle("PUT")
+
+    def _handle(self, method: str) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        body = json.loads(raw) if raw else None
+
+        behaviour = self.server.behaviour
+        with self.server.lock:
+            self.server.stats.requests += 1
+            route = f"{method} {re.sub(r'/[A-Z]+-[0-9]+', '/{key}', self.path.split('?')[0])}"
+            self.server.stats.by_route[route] = self.server.stats.by_route.get(route, 0) + 1
+            roll = self.server.rng.random()
+            jitter = self.server.rng.random() * behaviour.jitter
+
+        if behaviour.latency or jitter:
+            time.sleep(behaviour.latency + jitter)
+
+        if roll < behaviour.rate_limit_rate:
+            with self.server.lock:
+                self.server.stats.rate_limited += 1
+            self._send(429, {"error": "rate limited"}, {"Retry-After": f"{behaviour.retry_after:g}"})
+            return
+        if roll < behaviour.rate_limit_rate + behaviour.error_rate:
+            with self.server.lock:
+                self.server.stats.errors += 1
+            self._send(500, {"error": "injected failure"})
+            return
+
+        status, payload = self.route(method, self.path, body)
+        self._send(status, payload)
+
+    def route(self, method: str, path: str, body: Any) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        data = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain" if isinstance(payload, str) else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class JiraHandler(_StubHandler):
+    _COMMENT = re.compile(r"^/rest/api/3/issue/([^/]+)/comment(?:/([^/?]+))?")
+
+    def route(self, method: str, path: str, body: Any) -> Tuple[int, Any]:
+        server: JiraStub = self.server  # type: ignore[assignment]
+        path = path.split("?")[0]
+
+        if path == "/rest/api/3/search/jql" and method == "POST":
+            return 200, server.search(body or {})
+        if path == "/rest/api/3/myself":
+            return 200, {"accountId": _AGENT_ACCOUNT_ID, "displayName": "Refinement Agent"}
+
+        match = self._COMMENT.match(path)
+        if match:
+            issue_key, comment_id = match.groups()
+            if method == "GET":
+                return 200, {"comments": server.comments_for(issue_key)}
+            if method == "POST":
+                return 201, server.add_comment(issue_key, body)
+            if method == "PUT" and comment_id:
+                return 200, server.update_comment(issue_key, comment_id, body)
+        return 404, {"errorMessages": [f"No stub route for {method} {path}"]}
+
+
+class JiraStub(_StubServer):
+    """
+    Serves a synthetic backlog through the token-paged search endpoint and
+    keeps posted comments in memory.
+    """
+
+    def __init__(self, issues: List[Dict[str, Any]], behaviour: Optional[Behaviour] = None, seed: int = 1) -> None:
+        super().__init__(JiraHandler, behaviour or Behaviour(), seed)
+        self.issues = issues
+        self._comments: Dict[str, List[Dict[str, Any]]] = {}
+        self._next_comment_id = 1
+
+    def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        page_size = int(body.get("maxResults") or 50)
+        start = int(body.get("nextPageToken") or 0)
+        page = self.issues[start:start + page_size]
+        end = start + len(page)
+        response: Dict[str, Any] = {"issues": page, "isLast": end >= len(self.issues)}
+        if not response["isLast"]:
+            response["nextPageToken"] = str(end)
+        return response
+
+    def comments_for(self, issue_key: str) -> List[Dict[str, Any]]:
+        with self.lock:
+            return list(self._comments.get(issue_key, []))
+
+    def add_comment(self, issue_key: str, body: Any) -> Dict[str, Any]:
+        with self.lock:
+            comment = {
+                "id": str(self._next_comment_id),
+                "author": {"accountId": _AGENT_ACCOUNT_ID},
+                "body": (body or {}).get("body", {}),
+            }
+            self._next_comment_id += 1
+            self._comments.setdefault(issue_key, []).append(comment)
+        return comment
+
+    def update_comment(self, issue_key: str, comment_id: str, body: Any) -> Dict[str, Any]:
+        with self.lock:
+            for comment in self._comments.get(issue_key, []):
+                if comment["id"] == comment_id:
+                    comment["body"] = (body or {}).get("body", {})
+                    return comment
+        return {"id": comment_id}
+
+    @property
+    def comment_count(self) -> int:
+        with self.lock:
+            return sum(len(comments) for comments in self._comments.values())
+
+
+class OpenAIHandler(_StubHandler):
+    def route(self, method: str, path: str, body: Any) -> Tuple[int, Any]:
+        if method != "POST" or not path.split("?")[0].endswith("/chat/completions"):
+            return 404, {"error": {"message": f"No stub route for {method} {path}"}}
+
+        body = body or {}
+        messages = body.get("messages") or []
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        content = _completion_for(system, user)
+
+        prompt_tokens = (len(system) + len(user)) // 4
+        completion_tokens = len(content) // 4
+        return 200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+def _completion_for(system: str, user: str) -> str:
+    # Deterministic verdicts so repeated runs do the same amount of work
+    if "JSON array" in system:
+        labels = ("Vague", "Clear") if "summary" in system else ("Incomplete", "Complete")
+        try:
+            items = json.loads(user)
+        except ValueError:
+            items = []
+        return json.dumps([
+            {
+                "id": item.get("id"),
+                "classification": labels[len(str(item.get("text", ""))) % 3 != 0],
+                "explanation": "Stub verdict for benchmarking.",
+            }
+            for item in items if isinstance(item, dict)
+        ])
+    if "JSON object" in system:
+        incomplete = len(user) % 3 == 0
+        return json.dumps({
+            "summary": {"classification": "Vague" if len(user) % 4 == 0 else "Clear",
+                        "explanation": "Stub verdict for benchmarking."},
+            "acceptance_criteria": {"classification": "Incomplete" if incomplete else "Complete",
+                                    "explanation": "Stub verdict for benchmarking."},
+            "suggested_acceptance_criteria": [
+                "The change is visible to the affected users",
+                "Errors are reported with a clear message",
+            ] if incomplete else [],
+        })
+    if "Vague or Clear" in system:
+        label = "Vague" if len(user) % 3 == 0 else "Clear"
+        return f"Classification: {label}\nExplanation: Stub verdict for benchmarking."
+    if "Complete or Incomplete" in system:
+        label = "Incomplete" if len(user) % 3 == 0 else "Complete"
+        return f"Classification: {label}\nExplanation: Stub verdict for benchmarking."
+    return (
+        "Suggested Acceptance Criteria\n\n"
+        "- The change is visible to the affected users\n"
+        "- Errors are reported with a clear message\n"
+        "- The behaviour is covered by automated tests"
+    )
+
+
+class OpenAIStub(_StubServer):
+    def __init__(self, behaviour: Optional[Behaviour] = None, seed: int = 2) -> None:
+        super().__init__(OpenAIHandler, behaviour or Behaviour(), seed)
+
+
+class SlackHandler(_StubHandler):
+    def route(self, method: str, path: str, body: Any) -> Tuple[int, Any]:
+        server: SlackStub = self.server  # type: ignore[assignment]
+        if method != "POST":
+            return 404, "no_service"
+        with server.lock:
+            server.messages.append(body or {})
+        return 200, "ok"
+
+
+class SlackStub(_StubServer):
+    def __init__(self, behaviour: Optional[Behaviour] = None, seed: int = 3) -> None:
+        super().__init__(SlackHandler, behaviour or Behaviour(), seed)
+        self.messages: List[Dict[str, Any]] = []
+
+
+class StubServers:
+    """
+    Starts the three stubs together and provides the environment that
+    points the agent at them.
+    """
+
+    def __init__(
+        self,
+        stories: int = 100,
+        jira: Optional[Behaviour] = None,
+        openai: Optional[Behaviour] = None,
+        slack: Optional[Behaviour] = None,
+        seed: int = 7,
+    ) -> None:
+        self.jira = JiraStub(synthetic_backlog(stories, seed), jira)
+        self.openai = OpenAIStub(openai)
+        self.slack = SlackStub(slack)
+
+    def __enter__(self) -> "StubServers":
+        for server in (self.jira, self.openai, self.slack):
+            server.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        for server in (self.jira, self.openai, self.slack):
+            server.stop()
+
+    def environ(self) -> Dict[str, str]:
+        return {
+            "USE_JIRA": "1",
+            "JIRA_BASE_URL": self.jira.url,
+            "JIRA_EMAIL": "bench@example.com",
+            "JIRA_API_TOKEN": "benchmark",
+            "JIRA_PROJECT_KEY": "BENCH",
+            "SLACK_WEBHOOK_URL": f"{self.slack.url}/services/stub",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"{self.openai.url}/v1",
+        }
@@ -0,0 +1,159 @@
+import hashlib
+import hmac
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pytest
+
+from backlog_refinement_agent import daemon as daemon_module
+from backlog_refinement_agent.config import settings
+from backlog_refinement_agent.daemon import Debouncer, RefinementDaemon, WebhookServer
+from backlog_refinement_agent.pipeline import Refinement
+from backlog_refinement_agent.state import RefinementState
+from backlog_refinement_agent.story import Story
+
+_SECRET = "s3cret"
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _story(key: str, summary: str = "") -> Story:
+    return Story(id=key, summary=summary or f"Summary of {key}", description="", present_fields=["summary"])
+
+
+def _wait_for(condition: Callable[[], bool], timeout: float = 2.0) -> bool:
+    # The debouncer thread may hand a story over just before release_due does
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_debouncer_hands_over_the_latest_version_once_quiet() -> None:
+    clock = _Clock()
+    ready: List[Story] = []
+    debouncer = Debouncer(30, ready.append, clock=clock)
+    try:
+        assert not debouncer.offer(_story("P-1", "First draft"))
+        clock.now += 5
+        assert not debouncer.offer(_story("P-2"))
+        clock.now += 5
+        # Edited again: replaces the pending version and restarts its wait
+        assert debouncer.offer(_story("P-1", "Second draft"))
+        assert len(debouncer) == 2
+
+        clock.now += 24
+        assert debouncer.release_due() == 0
+        assert ready == []
+
+        clock.now += 1
+        debouncer.release_due()
+        assert _wait_for(lambda: [s.id for s in ready] == ["P-2"])
+
+        clock.now += 5
+        debouncer.release_due()
+        assert _wait_for(lambda: len(ready) == 2)
+        assert ready[1].id == "P-1"
+        assert ready[1].summary == "Second draft"
+        assert len(debouncer) == 0
+    finally:
+        debouncer.close()
+
+
+def test_debouncer_close_hands_over_what_is_still_pending() -> None:
+    clock = _Clock()
+    ready: List[Story] = []
+    debouncer = Debouncer(30, ready.append, clock=clock)
+    debouncer.offer(_story("P-1"))
+    debouncer.offer(_story("P-2"))
+
+    debouncer.close()
+
+    assert [s.id for s in ready] == ["P-1", "P-2"]
+
+
+def _payload(key: str) -> Dict[str, Any]:
+    return {
+        "webhookEvent": "jira:issue_updated",
+        "issue": {
+            "key": key,
+            "fields": {
+                "summary": f"Summary of {key}",
+                "issuetype": {"name": "Story"},
+                "project": {"key": key.rsplit("-", 1)[0]},
+            },
+        },
+    }
+
+
+def _post(url: str, payload: Dict[str, Any], signature: Optional[str] = None) -> Tuple[int, Dict[str, str]]:
+    body = json.dumps(payload).encode("utf-8")
+    if signature is None:
+        signature = "sha256=" + hmac.new(_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    request = urllib.request.Request(
+        url, data=body, method="POST",
+        headers={"Content-Type": "application/json", "X-Hub-Signature": signature},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, dict(response.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers)
+
+
+@pytest.fixture
+def webhook_url(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> Iterator[str]:
+    monkeypatch.setattr(settings.daemon, "webhook_secret", _SECRET)
+    monkeypatch.setattr(settings.daemon, "issue_types", "Story")
+    monkeypatch.setattr(settings.jira, "project_keys", "")
+    monkeypatch.setattr(settings.jira, "project_key", "")
+    # Stories handed over on close are settled without the LLM
+    monkeypatch.setattr(daemon_module, "refine_story", lambda story, executor=None: Refinement(story, [], {}, ""))
+
+    # A long debounce keeps every accepted issue pending
+    daemon = RefinementDaemon(None, RefinementState(str(tmp_path / "state.json")),
+                              debounce_seconds=60, queue_size=2, workers=1)
+    server = WebhookServer(("127.0.0.1", 0), daemon)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}{settings.daemon.webhook_path}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.close()
+
+
+def test_an_invalid_signature_is_rejected(webhook_url: str) -> None:
+    status, _ = _post(webhook_url, _payload("P-1"), signature="sha256=" + "0" * 64)
+    assert status == 401
+
+    status, _ = _post(webhook_url, _payload("P-1"), signature="")
+    assert status == 401
+
+    status, _ = _post(webhook_url, _payload("P-1"))
+    assert status == 202
+
+
+def test_a_full_queue_answers_503_with_retry_after(webhook_url: str) -> None:
+    assert _post(webhook_url, _payload("P-1"))[0] == 202
+    assert _post(webhook_url, _payload("P-2"))[0] == 202
+
+    status, headers = _post(webhook_url, _payload("P-3"))
+
+    assert status == 503
+    assert headers["Retry-After"] == str(daemon_module._RETRY_AFTER_SECONDS)
+    # A newer version of a pending issue is still accepted
+    assert _post(webhook_url, _payload("P-2"))[0] == 202
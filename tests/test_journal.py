@@ -0,0 +1,161 @@
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import pytest
+
+from backlog_refinement_agent import refinement
+from backlog_refinement_agent.cli import refine_and_post
+from backlog_refinement_agent.config import settings
+from backlog_refinement_agent.journal import RunJournal
+from backlog_refinement_agent.refinement import NOT_EVALUATED
+from backlog_refinement_agent.story import Story
+
+_FLAGGED = (["Summary Analysis"], {"summary": "Too vague."}, "")
+_UNEVALUATED = ([], {NOT_EVALUATED: "LLM evaluation skipped: the LLM budget for this run has been reached."}, "")
+
+
+def _story(i: int, summary: str = "") -> Story:
+    return Story(
+        id=f"S-{i}",
+        summary=summary or f"Story {i}",
+        description=f"Description of story {i}",
+        components="Web",
+        present_fields=["summary", "description", "components"],
+    )
+
+
+def _journal(path: str, resume: bool = False) -> RunJournal:
+    # Write every record straight away, as if each batch had filled up
+    return RunJournal(path, resume=resume, flush_records=1)
+
+
+def test_resume_replays_results_and_posted_comments(tmp_path: Any) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = _journal(path)
+    journal.record_evaluated(_story(1), _FLAGGED)
+    journal.record_posted(_story(1))
+    journal.record_evaluated(_story(2), _FLAGGED)
+    journal.close()
+
+    resumed = _journal(path, resume=True)
+
+    assert resumed.replayed == 2
+    assert resumed.result_for(_story(1)) == _FLAGGED
+    assert resumed.was_posted(_story(1))
+    assert not resumed.was_posted(_story(2))
+    # Already on disk, so not written again
+    assert resumed.record_evaluated(_story(1), _FLAGGED)
+    resumed.close()
+
+
+def test_a_torn_last_line_is_skipped(tmp_path: Any) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = _journal(path)
+    journal.record_evaluated(_story(1), _FLAGGED)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"event": "evaluated", "id": "S-2", "fingerp')
+
+    resumed = _journal(path, resume=True)
+    assert resumed.replayed == 1
+    assert resumed.result_for(_story(2)) is None
+    resumed.record_evaluated(_story(3), _FLAGGED)
+    resumed.close()
+
+    # The record appended after the torn line starts on a line of its own
+    again = _journal(path, resume=True)
+    assert again.replayed == 2
+    assert again.result_for(_story(3)) == _FLAGGED
+    again.close()
+
+
+def test_a_story_edited_since_is_evaluated_and_posted_again(tmp_path: Any) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = _journal(path)
+    journal.record_evaluated(_story(1), _FLAGGED)
+    journal.record_posted(_story(1))
+    journal.close()
+
+    resumed = _journal(path, resume=True)
+    edited = _story(1, summary="Story 1, now with a clearer summary")
+
+    assert resumed.result_for(edited) is None
+    assert not resumed.was_posted(edited)
+    resumed.close()
+
+
+def test_unevaluated_results_are_not_journaled(tmp_path: Any) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    journal = _journal(path)
+
+    assert not journal.record_evaluated(_story(1), _UNEVALUATED)
+    journal.close()
+    assert os.path.getsize(path) == 0
+
+    # Nor replayed, should an older journal contain one
+    with open(path, "w", encoding="utf-8") as f:
+        record = {"event": "evaluated", "id": "S-1", "fingerprint": "x",
+                  "issues": [], "explanations": _UNEVALUATED[1], "ac_suggestion": ""}
+        f.write(json.dumps(record) + "\n")
+    resumed = _journal(path, resume=True)
+    assert resumed.replayed == 0
+    resumed.close()
+
+
+def test_a_completed_run_removes_its_journal(tmp_path: Any) -> None:
+    path = str(tmp_path / "journal.jsonl")
+    _journal(path).close(completed=False)
+    assert os.path.exists(path)
+
+    _journal(path, resume=True).close(completed=True)
+    assert not os.path.exists(path)
+
+
+class _Writer:
+    """Accepts every comment straight away."""
+
+    def __init__(self) -> None:
+        self.posted: List[str] = []
+
+    def submit_payload(self, issue_key: str, payload: Dict[str, Any],
+                       on_done: Optional[Callable[[bool], None]] = None) -> None:
+        self.posted.append(issue_key)
+        if on_done is not None:
+            on_done(True)
+
+
+def test_resumed_run_skips_finished_work(tmp_path: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings.openai, "combined", False)
+    monkeypatch.setattr(settings.openai, "batch_size", 1)
+    monkeypatch.setattr(settings.refinement, "dedup_enabled", False)
+    evaluated: List[str] = []
+    # The budget runs out on S-3 in the first run
+    out_of_budget = {"S-3"}
+
+    def evaluate_story(story: Story, present_fields: List[str], executor: Any = None) -> Any:
+        evaluated.append(story.id)
+        issues, explanations, ac_suggestion = _UNEVALUATED if story.id in out_of_budget else _FLAGGED
+        return list(issues), dict(explanations), ac_suggestion
+
+    monkeypatch.setattr(refinement, "evaluate_story", evaluate_story)
+    path = str(tmp_path / "journal.jsonl")
+    stories = [_story(i) for i in range(1, 5)]
+
+    journal = _journal(path)
+    first = _Writer()
+    assert refine_and_post(stories, first, None, journal=journal) == 1
+    journal.close()
+    assert first.posted == ["S-1", "S-2", "S-4"]
+
+    # S-2 was edited before the run was resumed
+    stories[1] = _story(2, summary="Story 2, edited")
+    out_of_budget.clear()
+    evaluated.clear()
+    journal = _journal(path, resume=True)
+    second = _Writer()
+    assert refine_and_post(stories, second, None, journal=journal) == 0
+    journal.close(completed=True)
+
+    assert sorted(evaluated) == ["S-2", "S-3"]
+    assert second.posted == ["S-2", "S-3"]
@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+from backlog_refinement_agent import llm_client, refinement
+from backlog_refinement_agent.config import settings
+from backlog_refinement_agent.llm_usage import LLMBudgetExceeded
+from backlog_refinement_agent.pipeline import refine_stories
+from backlog_refinement_agent.story import Story
+
+_PRESENT = ["summary", "description"]
+_CONCURRENCY = 3
+
+
+def _story(i: int = 0) -> Dict[str, Any]:
+    return {
+        "id": f"S-{i}",
+        "summary": f"Story {i}",
+        "description": f"Description of story {i}",
+        "present_fields": list(_PRESENT),
+    }
+
+
+def _budget_reached(*args: Any, **kwargs: Any) -> str:
+    raise LLMBudgetExceeded("LLM budget for this run has been reached")
+
+
+class _FakeLLM:
+    """
+    Stands in for the OpenAI client: answers after a random delay, records
+    how many completions overlapped, and fails any prompt containing "fail".
+    """
+
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=self)
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def create(self, messages: List[Dict[str, str]], **kwargs: Any) -> Any:
+        system, user = messages[0]["content"], messages[1]["content"]
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            time.sleep(random.uniform(0, 0.02))
+            if "fail" in user:
+                raise RuntimeError("stub LLM error")
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=self._answer(system, user)))],
+                usage=None,
+            )
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    @staticmethod
+    def _answer(system: str, user: str) -> str:
+        # Stories with an even number are vague and incomplete; the prompt is
+        # echoed so each verdict can be matched to its story
+        number = int(user.split("tory ")[1].split()[0])
+        if "Suggested Acceptance Criteria" in system:
+            return f"Suggested Acceptance Criteria\n- Criteria for story {number}"
+        if user.startswith("Summary:"):
+            label = "Vague" if number % 2 == 0 else "Clear"
+        else:
+            label = "Incomplete" if number % 2 == 0 else "Complete"
+        return f"Classification: {label}\nExplanation: {user}"
+
+
+@pytest.fixture
+def fake_llm(monkeypatch: pytest.MonkeyPatch) -> Iterator[_FakeLLM]:
+    fake = _FakeLLM()
+    monkeypatch.setattr(llm_client, "client", fake)
+    monkeypatch.setattr(llm_client, "get_cache", lambda: None)
+    monkeypatch.setattr(llm_client, "_llm_slots", threading.BoundedSemaphore(_CONCURRENCY))
+    monkeypatch.setattr(llm_client, "_configured", True)
+    monkeypatch.setattr(settings.openai, "combined", False)
+    monkeypatch.setattr(settings.heuristics, "enabled", False)
+    yield fake
+
+
+def _evaluate(stories: List[Dict[str, Any]]) -> List[Any]:
+    return list(refinement.evaluate_stories(stories, concurrency=_CONCURRENCY, batch_size=1, dedup=False))
+
+
+def test_results_come_back_in_input_order(fake_llm: _FakeLLM) -> None:
+    stories = [_story(i) for i in range(40)]
+
+    results = _evaluate(stories)
+
+    assert [story["id"] for story, _ in results] == [story["id"] for story in stories]
+    for i, (_, (issues, explanations, ac_suggestion)) in enumerate(results):
+        if i % 2 == 0:
+            assert issues == ["Summary Analysis", "Acceptance Criteria Analysis"]
+            assert f"Story {i}" in explanations["summary"]
+            assert f"story {i}" in explanations["description"]
+            assert ac_suggestion.endswith(f"Criteria for story {i}")
+        else:
+            assert issues == []
+            assert ac_suggestion == ""
+
+
+def test_completions_in_flight_stay_within_the_limit(fake_llm: _FakeLLM) -> None:
+    _evaluate([_story(i) for i in range(40)])
+
+    # Two checks per story plus a suggestion for every other one
+    assert fake_llm.calls == 100
+    assert 1 < fake_llm.most_in_flight <= _CONCURRENCY
+
+
+def test_a_failed_completion_only_affects_its_story(fake_llm: _FakeLLM) -> None:
+    stories = [_story(i) for i in range(10)]
+    stories[4]["summary"] = "Story 4 fail"
+
+    results = _evaluate(stories)
+
+    assert [story["id"] for story, _ in results] == [story["id"] for story in stories]
+    for i, (_, (_, explanations, _)) in enumerate(results):
+        assert (refinement.NOT_EVALUATED in explanations) == (i == 4)
+
+
+def test_a_story_that_raises_does_not_end_the_stream(
+    fake_llm: _FakeLLM, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def prefilter_summary(summary: str) -> Any:
+        if summary == "Story 6":
+            raise ValueError("bad story")
+        return None
+
+    monkeypatch.setattr(refinement, "prefilter_summary", prefilter_summary)
+    stories = [_story(i) for i in range(10)]
+
+    results = _evaluate(stories)
+
+    assert [story["id"] for story, _ in results] == [story["id"] for story in stories]
+    for i, (_, (_, explanations, _)) in enumerate(results):
+        assert (refinement.NOT_EVALUATED in explanations) == (i == 6)
+
+
+def test_refine_stories_yields_every_story_in_order(
+    fake_llm: _FakeLLM, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings.openai, "max_concurrency", _CONCURRENCY)
+    monkeypatch.setattr(settings.openai, "batch_size", 1)
+    monkeypatch.setattr(settings.refinement, "dedup_enabled", False)
+    stories = [Story.from_record({**_story(i), "components": "Web"}) for i in range(20)]
+    submitted: List[int] = []
+    evaluated: List[int] = []
+
+    refinements = list(refine_stories(stories, on_submitted=submitted.append, on_evaluated=evaluated.append))
+
+    assert [r.story.id for r in refinements] == [s.id for s in stories]
+    assert [r.flagged for r in refinements] == [i % 2 == 0 for i in range(20)]
+    assert all(r.evaluated for r in refinements)
+    assert sum(submitted) == sum(evaluated) == 20
+
+
+@pytest.mark.parametrize("combined", [True, False])
+def test_budget_stop_after_a_rule_based_verdict_is_not_evaluated(
+    monkeypatch: pytest.MonkeyPatch, combined: bool
+) -> None:
+    # The rules settle both checks and flag the description; only the AC
+    # suggestion is left for the LLM, and the budget stops it
+    monkeypatch.setattr(settings.openai, "combined", combined)
+    monkeypatch.setattr(refinement, "prefilter_summary", lambda summary: (False, "Clear summary."))
+    monkeypatch.setattr(refinement, "prefilter_description", lambda description: (True, "No criteria."))
+    monkeypatch.setattr(llm_client, "_complete", _budget_reached)
+
+    issues, explanations, ac_suggestion = refinement.evaluate_story(_story(), _PRESENT)
+
+    assert refinement.NOT_EVALUATED in explanations
+    assert ac_suggestion == ""
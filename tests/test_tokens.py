@@ -0,0 +1,20 @@
+from backlog_refinement_agent.tokens import truncate_to_budget
+
+_FILLER = "Background notes that explain the history of this feature in some detail."
+
+
+def test_plain_criteria_lines_stay_in_the_acceptance_criteria_section() -> None:
+    criteria = [
+        "User can reset the password",
+        "User receives a reset link by email",
+        "Reset link expires after one hour",
+    ]
+    text = "\n".join(
+        ["Intro line"] + [_FILLER] * 20 + ["Acceptance criteria"] + criteria + ["# Notes"] + [_FILLER] * 20
+    )
+
+    truncated = truncate_to_budget(text, 80)
+
+    for line in criteria:
+        assert line in truncated.splitlines()
+
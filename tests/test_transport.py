@@ -0,0 +1,273 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pytest
+import requests
+
+from backlog_refinement_agent.transport import HttpTransport, TokenBucket, _retry_after_seconds
+
+# (status, headers, seconds to wait before answering)
+Reply = Tuple[int, Dict[str, str], float]
+
+
+class _StubServer(ThreadingHTTPServer):
+    """
+    Answers each request with the next scripted reply, then with 200s, and
+    records when every request arrived.
+    """
+
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.replies: List[Reply] = []
+        self.requests: List[Tuple[str, float]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def next_reply(self, method: str) -> Reply:
+        with self.lock:
+            self.requests.append((method, time.monotonic()))
+            return self.replies.pop(0) if self.replies else (200, {}, 0.0)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: _StubServer
+
+    def _answer(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        status, headers, delay = self.server.next_reply(self.command)
+        if delay:
+            time.sleep(delay)
+        body = b"{}"
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            # The client gave up waiting
+            pass
+
+    do_GET = do_POST = do_PUT = _answer
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def server() -> Iterator[_StubServer]:
+    stub = _StubServer()
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+def _transport(rate_limiter: Optional[TokenBucket] = None, **kwargs: object) -> HttpTransport:
+    options = {"max_retries": 3, "backoff_base": 0.01, "backoff_max": 0.05, "timeout": 2.0}
+    options.update(kwargs)
+    return HttpTransport(rate_limiter=rate_limiter, **options)
+
+
+def _closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/"
+
+
+def test_retries_server_errors_with_backoff(server: _StubServer) -> None:
+    server.replies = [(503, {}, 0.0), (502, {}, 0.0)]
+    transport = _transport()
+
+    response = transport.get(server.url)
+
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+    assert transport.retries == 2
+
+
+def test_backoff_grows_exponentially_up_to_the_cap() -> None:
+    transport = _transport(backoff_base=1.0, backoff_max=8.0)
+
+    for attempt, full in enumerate((1.0, 2.0, 4.0, 8.0, 8.0)):
+        # Jitter keeps each delay between half and all of the full backoff
+        assert full / 2 <= transport._backoff(attempt) <= full
+
+
+def test_returns_the_last_response_when_retries_run_out(server: _StubServer) -> None:
+    server.replies = [(500, {}, 0.0)] * 5
+    transport = _transport(max_retries=2)
+
+    response = transport.get(server.url)
+
+    assert response.status_code == 500
+    assert len(server.requests) == 3
+
+
+def test_retry_after_takes_precedence_over_backoff(server: _StubServer) -> None:
+    server.replies = [(503, {"Retry-After": "0.3"}, 0.0)]
+    transport = _transport()
+
+    transport.get(server.url)
+
+    (_, first), (_, second) = server.requests
+    assert second - first >= 0.3
+
+
+def test_retry_after_accepts_an_http_date() -> None:
+    response = requests.Response()
+    response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert _retry_after_seconds(response) == 0.0
+
+    response.headers["Retry-After"] = "not a date"
+    assert _retry_after_seconds(response) is None
+
+
+def test_429_pauses_the_shared_rate_limiter(server: _StubServer) -> None:
+    server.replies = [(429, {"Retry-After": "0.5"}, 0.0)]
+    bucket = TokenBucket(0)
+    transport = _transport(rate_limiter=bucket)
+
+    caller = threading.Thread(target=transport.get, args=(server.url,))
+    caller.start()
+    while not server.requests:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    # Another caller sharing the bucket waits out the pause too
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.2
+    caller.join()
+    assert len(server.requests) == 2
+
+
+def test_post_is_not_retried_on_server_errors(server: _StubServer) -> None:
+    server.replies = [(503, {}, 0.0)]
+    transport = _transport()
+
+    response = transport.post(server.url, json={"body": "comment"})
+
+    assert response.status_code == 503
+    assert len(server.requests) == 1
+
+
+def test_post_is_retried_on_429(server: _StubServer) -> None:
+    server.replies = [(429, {"Retry-After": "0"}, 0.0)]
+    transport = _transport()
+
+    response = transport.post(server.url, json={"body": "comment"})
+
+    assert response.status_code == 200
+    assert [method for method, _ in server.requests] == ["POST", "POST"]
+
+
+def test_idempotent_post_is_retried_on_server_errors(server: _StubServer) -> None:
+    # e.g. the Jira search, which is read-only but sent as a POST
+    server.replies = [(503, {}, 0.0), (502, {}, 0.0)]
+    transport = _transport()
+
+    response = transport.post(server.url, json={"jql": "project = X"}, idempotent=True)
+
+    assert response.status_code == 200
+    assert [method for method, _ in server.requests] == ["POST"] * 3
+
+
+def test_retries_are_counted_across_threads(server: _StubServer) -> None:
+    server.replies = [(503, {}, 0.0)] * 40
+    transport = _transport(max_retries=5)
+
+    callers = [threading.Thread(target=transport.get, args=(server.url,)) for _ in range(8)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+
+    # Every request after a caller's first is a retry
+    assert transport.retries == len(server.requests) - len(callers)
+
+
+def test_post_is_not_retried_after_a_read_timeout(server: _StubServer) -> None:
+    # The server may have created the comment before the client gave up
+    server.replies = [(200, {}, 0.5)]
+    transport = _transport(timeout=0.1)
+
+    with pytest.raises(requests.Timeout):
+        transport.post(server.url, json={"body": "comment"})
+
+    assert len(server.requests) == 1
+    assert transport.retries == 0
+
+
+def test_put_is_retried_after_a_read_timeout(server: _StubServer) -> None:
+    server.replies = [(200, {}, 0.5)]
+    transport = _transport(timeout=0.3)
+
+    response = transport.put(server.url, json={"body": "comment"})
+
+    assert response.status_code == 200
+    assert len(server.requests) == 2
+
+
+def test_post_is_retried_when_the_connection_is_refused() -> None:
+    transport = _transport(max_retries=2)
+
+    with pytest.raises(requests.ConnectionError):
+        transport.post(_closed_port_url(), json={"body": "comment"})
+
+    assert transport.retries == 2
+
+
+def test_token_bucket_limits_the_request_rate() -> None:
+    bucket = TokenBucket(rate_per_sec=20, burst=2)
+
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+
+    # Two requests fit the burst; the other four wait 1/20 s each
+    assert 0.18 <= elapsed < 0.5
+
+
+def test_token_bucket_refills_up_to_its_burst() -> None:
+    bucket = TokenBucket(rate_per_sec=50, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+
+
+def test_token_bucket_without_a_rate_never_waits() -> None:
+    bucket = TokenBucket(0)
+
+    started = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.1
+
+
+def test_token_bucket_pause_holds_back_callers() -> None:
+    bucket = TokenBucket(0)
+    bucket.pause(0.2)
+
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.19